@@ -97,6 +97,7 @@ _Counter = 0  # : Increment by one for every new object, the idea is to keep uni
 _Index = {}  # : Index dictionary, unique id (string) to index (int)
 _Objects = {}  # : Objects dictionary to store all state machines objects
 _StateChangedCallback = None  # : Called when some state were changed
+_EventTrace = None  # : If set, every processed event is recorded there, see ``StartEventTrace()``
 
 #------------------------------------------------------------------------------
 
@@ -271,6 +272,33 @@ def SetGlobalLogTransitions(value=False):
     global _GlobalLogTransitions
     _GlobalLogTransitions = value
 
+
+def StartEventTrace(capacity=None):
+    """
+    Start recording all events of all state machines into a ring buffer,
+    see ``automats.event_trace`` module. Returns False if trace was already started.
+    """
+    global _EventTrace
+    from automats import event_trace
+    if _EventTrace is not None:
+        return False
+    _EventTrace = event_trace.EventTrace(capacity=capacity or event_trace.DEFAULT_CAPACITY)
+    return True
+
+
+def StopEventTrace():
+    """
+    Stop recording events and return the trace object with all recorded events.
+    """
+    global _EventTrace
+    trace = _EventTrace
+    _EventTrace = None
+    return trace
+
+
+def GetEventTrace():
+    return _EventTrace
+
 #------------------------------------------------------------------------------
 
 
@@ -498,6 +526,9 @@ class Automat(object):
         Use ``fast = True`` flag to skip call to reactor.callLater(0, self.event, ...).
         """
         global _StateChangedCallback
+        trace = _EventTrace
+        if trace is not None:
+            started = time.time()
         if _GlobalLogEvents or ( _LogEvents and _Debug and getattr(self, 'log_events', False)):
             if self.log_events or not event_string.startswith('timer-'):
 #                 self.log(max(self.debug_level, _DebugLevel), '%s fired with event "%s", refs=%d' % (
@@ -511,6 +542,8 @@ class Automat(object):
                 if _Debug:
                     self.exc('Exception in {}:{} automat, state is {}, event="{}" : {}'.format(
                         self.id, self.name, self.state, event_string, exc))
+                if trace is not None:
+                    trace.record(started, self.index, self.name, event_string, old_state, self.state, time.time() - started)
                 return self
             self.state = new_state
         else:
@@ -520,6 +553,8 @@ class Automat(object):
                 if _Debug:
                     self.exc('Exception in {}:{} automat, state is {}, event="{}" : {}'.format(
                         self.id, self.name, self.state, event_string, exc))
+                if trace is not None:
+                    trace.record(started, self.index, self.name, event_string, old_state, self.state, time.time() - started)
                 return self
             new_state = self.state
         if old_state != new_state:
@@ -536,6 +571,8 @@ class Automat(object):
         else:
             self.state_not_changed(self.state, event_string, *args, **kwargs)
         self.executeStateChangedCallbacks(old_state, new_state, event_string, *args, **kwargs)
+        if trace is not None:
+            trace.record(started, self.index, self.name, event_string, old_state, new_state, time.time() - started)
         return self
 
     def timerEvent(self, name, interval):
@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# event_trace.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (event_trace.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+"""
+.. module:: event_trace.
+
+Binary trace of the events processed by state machines.
+
+Every call of ``Automat.event()`` is stored as a fixed size record:
+(timestamp, automat index, automat name, event, old state, new state, handler duration).
+Records are written into a preallocated ring buffer, so only the most recent
+``capacity`` events are kept and no memory is allocated while tracing.
+
+All strings are stored only once in the strings table, records keep just a small number.
+
+The trace can be saved into a compact binary file and loaded back to build a report:
+event rates per state machine and the slowest transitions.
+"""
+
+#------------------------------------------------------------------------------
+
+from __future__ import absolute_import
+
+import heapq
+import struct
+
+#------------------------------------------------------------------------------
+
+DEFAULT_CAPACITY = 100000
+
+_FileMagic = b'BDEVTRC1'
+_FileHeader = struct.Struct('<8sII')
+_Record = struct.Struct('<dIHHHHf')
+_MaxStrings = 65535
+
+#------------------------------------------------------------------------------
+
+
+class EventTrace(object):
+    """
+    Ring buffer of state machines events.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffer = bytearray(_Record.size * capacity)
+        self.position = 0
+        self.total = 0
+        # the first string is used when strings table is full
+        self.strings = ['?', ]
+        self.strings_index = {'?': 0, }
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def _string_id(self, s):
+        try:
+            return self.strings_index[s]
+        except KeyError:
+            pass
+        if len(self.strings) >= _MaxStrings:
+            return 0
+        self.strings_index[s] = len(self.strings)
+        self.strings.append(s)
+        return self.strings_index[s]
+
+    def record(self, timestamp, index, name, event, old_state, new_state, duration):
+        _Record.pack_into(
+            self.buffer,
+            self.position * _Record.size,
+            timestamp,
+            index,
+            self._string_id(name),
+            self._string_id(event),
+            self._string_id(old_state),
+            self._string_id(new_state),
+            duration,
+        )
+        self.position += 1
+        if self.position == self.capacity:
+            self.position = 0
+        self.total += 1
+
+    def _slots(self):
+        if self.total < self.capacity:
+            return range(self.total)
+        return list(range(self.position, self.capacity)) + list(range(0, self.position))
+
+    def records(self):
+        """
+        Yields all stored records as tuples, from the oldest to the most recent one:
+        (timestamp, index, name, event, old_state, new_state, duration).
+        """
+        strings = self.strings
+        for slot in self._slots():
+            timestamp, index, name, event, old_state, new_state, duration = _Record.unpack_from(self.buffer, slot * _Record.size)
+            yield (timestamp, index, strings[name], strings[event], strings[old_state], strings[new_state], duration, )
+
+    def dump(self, filename):
+        """
+        Writes all records to a binary file: header, strings table and records from the oldest one.
+        Returns number of written records.
+        """
+        strings_data = '\x00'.join(self.strings).encode('utf-8')
+        count = len(self)
+        with open(filename, 'wb') as fout:
+            fout.write(_FileHeader.pack(_FileMagic, count, len(strings_data)))
+            fout.write(strings_data)
+            if self.total < self.capacity:
+                fout.write(self.buffer[:count * _Record.size])
+            else:
+                fout.write(self.buffer[self.position * _Record.size:])
+                fout.write(self.buffer[:self.position * _Record.size])
+        return count
+
+    def stats(self, top=10):
+        """
+        Returns number of events, event rate and time spent in handlers per state machine name,
+        and also ``top`` slowest transitions.
+        """
+        automats = {}
+        instances = {}
+        first_time = None
+        last_time = None
+        for rec in self.records():
+            timestamp, index, name, _, _, _, duration = rec
+            if first_time is None:
+                first_time = timestamp
+            last_time = timestamp
+            if name not in automats:
+                automats[name] = {
+                    'events': 0,
+                    'total_duration': 0.0,
+                    'max_duration': 0.0,
+                }
+                instances[name] = set()
+            s = automats[name]
+            s['events'] += 1
+            s['total_duration'] += duration
+            if duration > s['max_duration']:
+                s['max_duration'] = duration
+            instances[name].add(index)
+        period = max((last_time - first_time) if first_time is not None else 0.0, 1.0)
+        for name, s in automats.items():
+            s['instances'] = len(instances[name])
+            s['events_per_sec'] = round(s['events'] / period, 3)
+            s['total_duration'] = round(s['total_duration'], 6)
+            s['max_duration'] = round(s['max_duration'], 6)
+        slowest = heapq.nlargest(top, self.records(), key=lambda rec: rec[6])
+        return {
+            'records': len(self),
+            'total': self.total,
+            'capacity': self.capacity,
+            'period': round(period, 3),
+            'automats': automats,
+            'slowest': [{
+                'time': rec[0],
+                'index': rec[1],
+                'name': rec[2],
+                'event': rec[3],
+                'old_state': rec[4],
+                'new_state': rec[5],
+                'duration': round(rec[6], 6),
+            } for rec in slowest],
+        }
+
+#------------------------------------------------------------------------------
+
+
+def load(filename):
+    """
+    Reads a file created by ``EventTrace.dump()`` and returns new ``EventTrace`` object.
+    """
+    with open(filename, 'rb') as fin:
+        data = fin.read()
+    magic, count, strings_size = _FileHeader.unpack_from(data, 0)
+    if magic != _FileMagic:
+        raise ValueError('not an event trace file')
+    pos = _FileHeader.size
+    records_data = data[pos + strings_size:]
+    if len(records_data) != count * _Record.size:
+        raise ValueError('event trace file is truncated')
+    trace = EventTrace(capacity=max(count, 1))
+    trace.strings = data[pos:pos + strings_size].decode('utf-8').split('\x00')
+    trace.strings_index = {s: i for i, s in enumerate(trace.strings)}
+    trace.buffer[:len(records_data)] = records_data
+    trace.total = count
+    trace.position = count % trace.capacity
+    return trace
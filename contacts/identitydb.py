@@ -51,6 +51,8 @@ from system import bpio
 from main import settings
 
 from lib import nameurl
+from lib import strng
+from lib import jsn
 
 from userid import identity
 from userid import id_url
@@ -69,12 +71,21 @@ _IDURL2Contacts = {}
 _IPPort2IDURL = {}
 _LocalIPs = {}
 _IdentityCacheUpdatedCallbacks = []
+# identities found in the cache folder at startup, but not yet read from disk
+_LazyIdentities = {}
+# compact on-disk index of the cache folder: file name -> (idurl, size, mtime, contacts)
+_CacheIndex = {}
+_CacheIndexModified = False
+_CacheIndexVersion = 1
 
 #------------------------------------------------------------------------------
 
 
 def cache():
     global _IdentityCache
+    # all identities must be in memory when the whole cache is requested
+    for idurl in list(_LazyIdentities.keys()):
+        _load_lazy(idurl)
     return _IdentityCache
 
 
@@ -91,15 +102,36 @@ def init():
 
     Check to exist and create a folder to keep all cached identities.
     """
+    global _CacheIndex
+    global _CacheIndexModified
     lg.out(4, "identitydb.init")
     id_cache_dir = settings.IdentityCacheDir()
     if not os.path.exists(id_cache_dir):
         lg.out(8, 'identitydb.init create folder %r' % id_cache_dir)
         bpio._dir_make(id_cache_dir)
-    # make sure to read and cache all known identities at startup
+    # all identities which were not changed since last start are only registered in the indexes here,
+    # files are read and parsed later on first access
+    known_index = load_cache_index()
+    _CacheIndex = {}
+    _CacheIndexModified = False
+    lazy_count = 0
     for id_filename in os.listdir(id_cache_dir):
+        item = known_index.get(id_filename)
+        if item and _is_index_item_actual(item, os.path.join(id_cache_dir, id_filename)):
+            _CacheIndex[id_filename] = item
+            _register_lazy(item)
+            lazy_count += 1
+            continue
         idurl = nameurl.FilenameUrl(id_filename)
-        get_ident(idurl)
+        if get_ident(idurl) is None:
+            continue
+        _CacheIndexModified = True
+    if set(_CacheIndex.keys()) != set(known_index.keys()):
+        _CacheIndexModified = True
+    if _CacheIndexModified:
+        save_cache_index()
+    if _Debug:
+        lg.args(_DebugLevel, loaded=len(_IdentityCache), lazy=lazy_count)
 
 
 def shutdown():
@@ -107,6 +139,156 @@ def shutdown():
     
     """
     lg.out(4, "identitydb.shutdown")
+    if _CacheIndexModified:
+        save_cache_index()
+
+#------------------------------------------------------------------------------
+
+
+def load_cache_index():
+    """
+    Reads index of the identity cache folder from the file and returns a dictionary:
+
+        {file_name: {'idurl': , 'size': , 'mtime': , 'contacts': [], }, }
+
+    Returns empty dictionary if index file not exist or broken,
+    in that case all cached identities will be read from disk.
+    """
+    index_filename = settings.IdentityCacheIndexFilename()
+    if not os.path.isfile(index_filename):
+        return {}
+    result = {}
+    try:
+        json_index = jsn.loads_text(bpio.ReadTextFile(index_filename))
+        if json_index.get('version') != _CacheIndexVersion:
+            raise Exception('unknown version %r' % json_index.get('version'))
+        for id_filename, item in json_index['items'].items():
+            result[id_filename] = {
+                'idurl': strng.to_bin(item['idurl']),
+                'size': int(item['size']),
+                'mtime': float(item['mtime']),
+                'contacts': [strng.to_bin(c) for c in item['contacts']],
+            }
+    except:
+        lg.exc()
+        lg.warn('identity cache index %r is broken and will be rebuilt' % index_filename)
+        return {}
+    return result
+
+
+def save_cache_index():
+    """
+    Writes index of the identity cache folder to the file.
+    """
+    global _CacheIndexModified
+    json_items = {}
+    for id_filename, item in _CacheIndex.items():
+        json_items[id_filename] = {
+            'idurl': strng.to_text(item['idurl']),
+            'size': item['size'],
+            'mtime': item['mtime'],
+            'contacts': [strng.to_text(c) for c in item['contacts']],
+        }
+    index_filename = settings.IdentityCacheIndexFilename()
+    if not os.path.isdir(os.path.dirname(index_filename)):
+        bpio._dirs_make(os.path.dirname(index_filename))
+    if not bpio.WriteTextFile(index_filename, jsn.dumps({
+        'version': _CacheIndexVersion,
+        'items': json_items,
+    })):
+        return False
+    _CacheIndexModified = False
+    return True
+
+
+def _is_index_item_actual(item, filename):
+    try:
+        st = os.stat(filename)
+    except:
+        return False
+    return item['size'] == st.st_size and item['mtime'] == st.st_mtime
+
+
+def _update_index_item(idurl, id_obj):
+    global _CacheIndexModified
+    filename = get_filename(idurl)
+    if not filename:
+        return
+    try:
+        st = os.stat(filename)
+    except:
+        return
+    _CacheIndex[os.path.basename(filename)] = {
+        'idurl': idurl,
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'contacts': list(id_obj.getContacts()),
+    }
+    _CacheIndexModified = True
+
+
+def _remove_index_item(idurl):
+    global _CacheIndexModified
+    filename = get_filename(idurl)
+    if filename and _CacheIndex.pop(os.path.basename(filename), None) is not None:
+        _CacheIndexModified = True
+
+
+def _register_lazy(item):
+    idurl = item['idurl']
+    _LazyIdentities[idurl] = item
+    _IdentityCacheModifiedTime[idurl] = time.time()
+    _index_contacts(idurl, item['contacts'])
+
+
+def _load_lazy(idurl):
+    """
+    Reads identity file which was registered at startup from the index.
+    """
+    item = _LazyIdentities.pop(idurl, None)
+    if item is None:
+        return None
+    id_obj = get_ident(idurl)
+    if id_obj is None:
+        lg.warn('cached identity %r was not loaded, index is not actual' % idurl)
+        _unindex_contacts(idurl, item['contacts'])
+        _IdentityCacheModifiedTime.pop(idurl, None)
+        _remove_index_item(idurl)
+        return None
+    if list(id_obj.getContacts()) != item['contacts']:
+        _update_index_item(idurl, id_obj)
+    return id_obj
+
+
+def _index_contacts(idurl, contacts):
+    for contact in contacts:
+        if contact not in _Contact2IDURL:
+            _Contact2IDURL[contact] = set()
+        # else:
+        #     if len(_Contact2IDURL[contact]) >= 1 and idurl not in _Contact2IDURL[contact]:
+        #         lg.warn('another user have same contact: ' + str(list(_Contact2IDURL[contact])))
+        _Contact2IDURL[contact].add(idurl)
+        if idurl not in _IDURL2Contacts:
+            _IDURL2Contacts[idurl] = set()
+        _IDURL2Contacts[idurl].add(contact)
+        try:
+            proto, host, port, fname = nameurl.UrlParse(contact)
+            ipport = (host, int(port))
+            _IPPort2IDURL[ipport] = idurl
+        except:
+            pass
+
+
+def _unindex_contacts(idurl, contacts):
+    _IDURL2Contacts.pop(idurl, None)
+    for contact in contacts:
+        _Contact2IDURL.pop(contact, None)
+        try:
+            proto, host, port, fname = nameurl.UrlParse(contact)
+            ipport = (host, int(port))
+            _IPPort2IDURL.pop(ipport, None)
+        except:
+            pass
 
 #------------------------------------------------------------------------------
 
@@ -121,8 +303,12 @@ def clear(exclude_list=None):
     global _IdentityCache
     global _IdentityCacheIDs
     global _IdentityCacheModifiedTime
+    global _CacheIndexModified
     lg.out(4, "identitydb.clear")
     _IdentityCache.clear()
+    _LazyIdentities.clear()
+    _CacheIndex.clear()
+    _CacheIndexModified = True
     _IdentityCacheIDs.clear()
     _IdentityCacheModifiedTime.clear()
     _Contact2IDURL.clear()
@@ -150,7 +336,7 @@ def size():
     Return a number of items in the database.
     """
     global _IdentityCache
-    return len(_IdentityCache)
+    return len(_IdentityCache) + len(_LazyIdentities)
 
 
 def has_idurl(idurl):
@@ -158,7 +344,8 @@ def has_idurl(idurl):
     Return True if that IDURL already cached.
     """
     global _IdentityCache
-    return id_url.to_original(idurl) in _IdentityCache
+    idurl = id_url.to_original(idurl)
+    return idurl in _IdentityCache or idurl in _LazyIdentities
 
 
 def has_file(idurl):
@@ -190,28 +377,14 @@ def idset(idurl, id_obj):
         if _Debug:
             lg.out(_DebugLevel, 'identitydb.idset new identity: %r' % idurl)
     _IdentityCache[idurl] = id_obj
+    _LazyIdentities.pop(idurl, None)
     _IdentityCacheModifiedTime[idurl] = time.time()
     identid = _IdentityCacheIDs.get(idurl, None)
     if identid is None:
         identid = _IdentityCacheCounter
         _IdentityCacheCounter += 1
         _IdentityCacheIDs[idurl] = identid
-    for contact in id_obj.getContacts():
-        if contact not in _Contact2IDURL:
-            _Contact2IDURL[contact] = set()
-        # else:
-        #     if len(_Contact2IDURL[contact]) >= 1 and idurl not in _Contact2IDURL[contact]:
-        #         lg.warn('another user have same contact: ' + str(list(_Contact2IDURL[contact])))
-        _Contact2IDURL[contact].add(idurl)
-        if idurl not in _IDURL2Contacts:
-            _IDURL2Contacts[idurl] = set()
-        _IDURL2Contacts[idurl].add(contact)
-        try:
-            proto, host, port, fname = nameurl.UrlParse(contact)
-            ipport = (host, int(port))
-            _IPPort2IDURL[ipport] = idurl
-        except:
-            pass
+    _index_contacts(idurl, id_obj.getContacts())
     # TODO: when identity contacts changed - need to remove old items from _Contact2IDURL
     fire_cache_updated_callbacks(single_item=(identid, idurl, id_obj))
     if _Debug:
@@ -229,6 +402,8 @@ def idget(idurl):
     """
     global _IdentityCache
     idurl = id_url.to_original(idurl)
+    if idurl in _LazyIdentities:
+        return _load_lazy(idurl)
     return _IdentityCache.get(idurl, None)
 
 
@@ -246,18 +421,14 @@ def idremove(idurl):
     global _IPPort2IDURL
     idurl = id_url.to_original(idurl)
     idobj = _IdentityCache.pop(idurl, None)
+    lazy_item = _LazyIdentities.pop(idurl, None)
     identid = _IdentityCacheIDs.pop(idurl, None)
     _IdentityCacheModifiedTime.pop(idurl, None)
     _IDURL2Contacts.pop(idurl, None)
     if idobj is not None:
-        for contact in idobj.getContacts():
-            _Contact2IDURL.pop(contact, None)
-            try:
-                proto, host, port, fname = nameurl.UrlParse(contact)
-                ipport = (host, int(port))
-                _IPPort2IDURL.pop(ipport, None)
-            except:
-                pass
+        _unindex_contacts(idurl, idobj.getContacts())
+    elif lazy_item is not None:
+        _unindex_contacts(idurl, lazy_item['contacts'])
     fire_cache_updated_callbacks(single_item=(identid, None, None))
     return idobj
 
@@ -278,8 +449,8 @@ def get_ident(idurl):
     If not cached in memory but found locally - read it from disk.
     """
     idurl = id_url.to_original(idurl)
-    if has_idurl(idurl):
-        return idget(idurl)
+    if idurl in _IdentityCache:
+        return _IdentityCache[idurl]
     try:
         partfilename = nameurl.UrlFilename(idurl)
     except:
@@ -304,6 +475,8 @@ def get_ident(idurl):
     idurl_orig = idobj.getIDURL()
     if idurl == idurl_orig.original():
         idset(idurl, idobj)
+        if os.path.basename(filename) not in _CacheIndex:
+            _update_index_item(idurl, idobj)
         return idobj
     lg.err("not found identity object idurl=%r idurl_orig=%r" % (idurl, idurl_orig))
     return None
@@ -381,6 +554,7 @@ def update(idurl, xml_src):
     # publickeys match so we can update it
     bpio.WriteTextFile(filename, xml_src)
     idset(idurl, newid)
+    _update_index_item(idurl, newid)
 
     return True
 
@@ -399,6 +573,7 @@ def remove(idurl):
         except:
             lg.exc()
     idremove(idurl)
+    _remove_index_item(idurl)
     return True
 
 
@@ -501,5 +676,7 @@ def RemoveCacheUpdatedCallback(cb):
 
 def fire_cache_updated_callbacks(single_item=None):
     global _IdentityCacheUpdatedCallbacks
+    if not _IdentityCacheUpdatedCallbacks:
+        return
     for cb in _IdentityCacheUpdatedCallbacks:
         cb(cache_ids(), cache(), single_item)
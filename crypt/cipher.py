@@ -26,13 +26,24 @@
 """
 .. module:: cipher.
 
+Session key ciphers, the encrypted data can be stored in two formats:
 
+    + legacy JSON dictionary with base64 encoded IV and ciphertext
+    + binary envelope: one version byte, IV and raw ciphertext
+
+``decrypt_json()`` detects the format automatically, legacy JSON always starts with "{".
+
+Cipher type "AESGCM" is a streaming authenticated encryption: data is encrypted with AES-GCM
+in fixed size chunks while it is written to ``StreamEncryptor``, so only one chunk of plain data
+is kept in memory. Every chunk has own nonce and authentication tag and the last chunk is marked,
+so modified, reordered or truncated data is detected during decryption.
 """
 
 #------------------------------------------------------------------------------
 
 from __future__ import absolute_import
 import base64
+import struct
 
 try:
     from Cryptodome.Cipher import AES
@@ -51,7 +62,41 @@ from lib import serialization
 
 #------------------------------------------------------------------------------
 
-def encrypt_json(raw_data, secret_bytes_key, cipher_type='AES'):
+CIPHER_FORMAT_JSON = 'json'
+CIPHER_FORMAT_BINARY = 'binary'
+CIPHER_FORMAT_STREAM = 'stream'
+
+_BinaryEnvelopeVersion = 1
+_StreamEnvelopeVersion = 2
+_StreamHeader = struct.Struct('>BI8s')
+_StreamTagSize = 16
+_StreamNonce = struct.Struct('>8sI')
+_StreamChunkSize = 64 * 1024
+
+#------------------------------------------------------------------------------
+
+def cipher_format(encrypted_data):
+    """
+    Detects in which format the encrypted data was stored.
+    """
+    if encrypted_data[:1] == b'{':
+        return CIPHER_FORMAT_JSON
+    if encrypted_data[:1] == struct.pack('B', _BinaryEnvelopeVersion):
+        return CIPHER_FORMAT_BINARY
+    if encrypted_data[:1] == struct.pack('B', _StreamEnvelopeVersion):
+        return CIPHER_FORMAT_STREAM
+    return None
+
+
+def encrypt_json(raw_data, secret_bytes_key, cipher_type='AES', cipher_format=None):
+    """
+    By default legacy JSON format is used,
+    pass ``cipher_format=CIPHER_FORMAT_BINARY`` to get binary envelope without base64 encoding.
+    """
+    if cipher_type == 'AESGCM':
+        return encrypt_stream(raw_data, secret_bytes_key)
+    if cipher_format == CIPHER_FORMAT_BINARY:
+        return encrypt_binary(raw_data, secret_bytes_key, cipher_type=cipher_type)
     # TODO: add salt to raw_data
     padded_data = Padding.pad(
         data_to_pad=raw_data,
@@ -79,6 +124,13 @@ def encrypt_json(raw_data, secret_bytes_key, cipher_type='AES'):
 
 
 def decrypt_json(encrypted_data, secret_bytes_key, cipher_type='AES'):
+    """
+    Both legacy JSON format and binary envelope are accepted.
+    """
+    if cipher_type == 'AESGCM':
+        return decrypt_stream(encrypted_data, secret_bytes_key)
+    if cipher_format(encrypted_data) == CIPHER_FORMAT_BINARY:
+        return decrypt_binary(encrypted_data, secret_bytes_key, cipher_type=cipher_type)
     dct = serialization.BytesToDict(
         encrypted_data,
         encoding='utf-8',
@@ -115,11 +167,162 @@ def decrypt_json(encrypted_data, secret_bytes_key, cipher_type='AES'):
     # TODO: remove salt from raw_data
     return raw_data
 
+
+def encrypt_binary(raw_data, secret_bytes_key, cipher_type='AES'):
+    """
+    Returns binary envelope: version byte, IV and raw ciphertext.
+    Only the last incomplete block is padded, so the input data is not copied.
+    """
+    cipher = _new_cipher(cipher_type, secret_bytes_key)
+    block_size = _block_size(cipher_type)
+    tail_size = len(raw_data) % block_size
+    body = memoryview(raw_data)[:len(raw_data) - tail_size]
+    tail = Padding.pad(
+        data_to_pad=bytes(raw_data[len(raw_data) - tail_size:]),
+        block_size=block_size,
+    )
+    return b''.join([
+        struct.pack('B', _BinaryEnvelopeVersion),
+        cipher.iv,
+        cipher.encrypt(body) if len(body) else b'',
+        cipher.encrypt(tail),
+    ])
+
+
+def decrypt_binary(encrypted_data, secret_bytes_key, cipher_type='AES'):
+    """
+    Opposite to ``encrypt_binary()``.
+    """
+    if cipher_format(encrypted_data) != CIPHER_FORMAT_BINARY:
+        raise ValueError('unknown cipher envelope format')
+    block_size = _block_size(cipher_type)
+    encrypted_view = memoryview(encrypted_data)
+    cipher = _new_cipher(cipher_type, secret_bytes_key, iv=bytes(encrypted_view[1:1 + block_size]))
+    padded_data = cipher.decrypt(encrypted_view[1 + block_size:])
+    return Padding.unpad(
+        padded_data=padded_data,
+        block_size=block_size,
+    )
+
+
+def encrypt_stream(raw_data, secret_bytes_key, chunk_size=None):
+    """
+    Encrypt whole input at once with "AESGCM" cipher, see ``StreamEncryptor``.
+    """
+    encryptor = StreamEncryptor(secret_bytes_key, chunk_size=chunk_size)
+    encryptor.write(raw_data)
+    return encryptor.finish()
+
+
+def decrypt_stream(encrypted_data, secret_bytes_key):
+    """
+    Opposite to ``encrypt_stream()``, raises ``ValueError`` if the data was modified or truncated.
+    """
+    if cipher_format(encrypted_data) != CIPHER_FORMAT_STREAM:
+        raise ValueError('unknown cipher envelope format')
+    encrypted_view = memoryview(encrypted_data)
+    header = bytes(encrypted_view[:_StreamHeader.size])
+    _, chunk_size, nonce_prefix = _StreamHeader.unpack(header)
+    if chunk_size <= 0:
+        raise ValueError('invalid chunk size')
+    full_chunk_size = chunk_size + _StreamTagSize
+    raw_parts = []
+    pos = _StreamHeader.size
+    counter = 0
+    while True:
+        last = len(encrypted_view) - pos <= full_chunk_size
+        chunk = encrypted_view[pos:len(encrypted_view) if last else pos + full_chunk_size]
+        if len(chunk) < _StreamTagSize:
+            raise ValueError('encrypted data is truncated')
+        cipher = AES.new(key=secret_bytes_key, mode=AES.MODE_GCM, nonce=_StreamNonce.pack(nonce_prefix, counter))
+        cipher.update(header + (b'\x01' if last else b'\x00'))
+        raw_parts.append(cipher.decrypt_and_verify(chunk[:-_StreamTagSize], chunk[-_StreamTagSize:]))
+        if last:
+            break
+        pos += full_chunk_size
+        counter += 1
+    return b''.join(raw_parts)
+
+
+class StreamEncryptor(object):
+    """
+    Encrypts data with AES-GCM in chunks of fixed size while it is written.
+
+    Only one chunk of plain data is buffered, encrypted chunks are collected and
+    returned together with the header by ``finish()``.
+    """
+
+    def __init__(self, secret_bytes_key, chunk_size=None):
+        self.secret_bytes_key = secret_bytes_key
+        self.chunk_size = chunk_size or _StreamChunkSize
+        self.header = _StreamHeader.pack(_StreamEnvelopeVersion, self.chunk_size, get_random_bytes(8))
+        self.nonce_prefix = self.header[-8:]
+        self.counter = 0
+        self.length = 0
+        self.buffer = bytearray()
+        self.encrypted_parts = [self.header, ]
+
+    def write(self, data):
+        """
+        Append more plain data, full chunks are encrypted immediately.
+        """
+        if self.encrypted_parts is None:
+            raise ValueError('stream is already finished')
+        self.length += len(data)
+        self.buffer.extend(data)
+        # last chunk must be marked, so always keep some data in the buffer until finish() is called
+        while len(self.buffer) > self.chunk_size:
+            self._encrypt_chunk(bytes(self.buffer[:self.chunk_size]), last=False)
+            del self.buffer[:self.chunk_size]
+
+    def finish(self):
+        """
+        Encrypt the last chunk and return all encrypted data.
+        """
+        if self.encrypted_parts is None:
+            raise ValueError('stream is already finished')
+        self._encrypt_chunk(bytes(self.buffer), last=True)
+        self.buffer = bytearray()
+        result = b''.join(self.encrypted_parts)
+        self.encrypted_parts = None
+        return result
+
+    def close(self):
+        self.buffer = bytearray()
+        self.encrypted_parts = None
+
+    def _encrypt_chunk(self, raw_chunk, last):
+        cipher = AES.new(key=self.secret_bytes_key, mode=AES.MODE_GCM, nonce=_StreamNonce.pack(self.nonce_prefix, self.counter))
+        cipher.update(self.header + (b'\x01' if last else b'\x00'))
+        encrypted_chunk, tag = cipher.encrypt_and_digest(raw_chunk)
+        self.encrypted_parts.append(encrypted_chunk)
+        self.encrypted_parts.append(tag)
+        self.counter += 1
+
+
+def _new_cipher(cipher_type, secret_bytes_key, iv=None):
+    kw = {} if iv is None else {'iv': iv, }
+    if cipher_type == 'AES':
+        return AES.new(key=secret_bytes_key, mode=AES.MODE_CBC, **kw)
+    elif cipher_type == 'DES3':
+        return DES3.new(key=secret_bytes_key, mode=DES3.MODE_CBC, **kw)
+    raise Exception('unsupported cipher type')
+
+
+def _block_size(cipher_type):
+    if cipher_type == 'AES':
+        return AES.block_size
+    elif cipher_type == 'DES3':
+        return DES3.block_size
+    raise Exception('unsupported cipher type')
+
 #------------------------------------------------------------------------------
 
 def make_key(cipher_type='AES'):
     if cipher_type == 'AES':
         return get_random_bytes(AES.block_size)
+    elif cipher_type == 'AESGCM':
+        return get_random_bytes(32)
     elif cipher_type == 'DES3':
         return get_random_bytes(DES3.block_size)
     raise Exception('unsupported cipher type')
@@ -53,6 +53,10 @@ RAIDMAKE:
 RAIDREAD:
     It can also rebuild the ``encrypted`` from packets and will
     generate the read requests to get fetch the packets.
+
+Blocks can be serialized in legacy JSON format or in a compact binary container:
+a fixed header with the field lengths, the encrypted session key and the ciphertext as raw bytes.
+``Unserialize()`` accepts both formats.
 """
 
 #------------------------------------------------------------------------------
@@ -68,6 +72,7 @@ _DebugLevel = 10
 #------------------------------------------------------------------------------
 
 import base64
+import struct
 
 #------------------------------------------------------------------------------
 
@@ -83,6 +88,16 @@ from userid import id_url
 
 from crypt import key
 from crypt import my_keys
+from crypt import cipher
+
+#------------------------------------------------------------------------------
+
+BLOCK_FORMAT_JSON = 'json'
+BLOCK_FORMAT_BINARY = 'binary'
+
+_BinaryBlockMagic = b'\x00BDB'
+_BinaryBlockVersion = 1
+_BinaryBlockHeader = struct.Struct('>4sBBQQIIIIIQ')
 
 #------------------------------------------------------------------------------
 
@@ -105,6 +120,9 @@ class Block(object):
     EncryptedSessionKey    encrypted with our public key so only we can read this
     Other                  could be be for professional timestamp company or other future features
     Signature              digital signature by Creator - verifiable by public key in creator identity
+
+    Pass ``CipherFormat=cipher.CIPHER_FORMAT_BINARY`` to store ``EncryptedData`` as raw binary envelope,
+    such block can only be serialized with ``BLOCK_FORMAT_BINARY``. Same for blocks encrypted with "AESGCM" session key type.
     """
 
     def __init__(
@@ -122,6 +140,7 @@ class Block(object):
             EncryptedData=None,
             Length=None,
             Signature=None,
+            CipherFormat=None,
         ):
         self.CreatorID = CreatorID
         if not self.CreatorID:
@@ -150,7 +169,7 @@ class Block(object):
             self.EncryptedData = EncryptedData
         else:
             self.Length = len(Data)
-            self.EncryptedData = key.EncryptWithSessionKey(SessionKey, Data, session_key_type=self.SessionKeyType)
+            self.EncryptedData = key.EncryptWithSessionKey(SessionKey, Data, session_key_type=self.SessionKeyType, cipher_format=CipherFormat)
         if Signature:
             self.Signature = Signature
         else:
@@ -186,23 +205,31 @@ class Block(object):
         Generate a single string with all data fields, used to create a hash
         for that ``encrypted_block``.
         """
-        sep = b'::::'
-        StringToHash = b''
-        StringToHash += self.CreatorID.to_original()
-        StringToHash += sep + strng.to_bin(self.BackupID)
-        StringToHash += sep + strng.to_bin(str(self.BlockNumber))
-        StringToHash += sep + strng.to_bin(self.SessionKeyType)
-        StringToHash += sep + strng.to_bin(self.EncryptedSessionKey)
-        StringToHash += sep + strng.to_bin(str(self.Length))
-        StringToHash += sep + strng.to_bin(str(self.LastBlock))
-        StringToHash += sep + strng.to_bin(self.EncryptedData)
-        return StringToHash
+        return b''.join(self._hash_base_parts())
 
     def GenerateHash(self):
         """
-        Create a hash for that ``encrypted_block`` using ``crypt.key.Hash()``.
+        Create a hash for that ``encrypted_block``, same as ``crypt.key.Hash()`` of ``GenerateHashBase()``,
+        but all fields are passed to the hash object one by one to not copy the ``EncryptedData``.
         """
-        return key.Hash(self.GenerateHashBase())
+        h = key.NewHashObject()
+        for part in self._hash_base_parts():
+            h.update(part)
+        return h.digest()
+
+    def _hash_base_parts(self):
+        sep = b'::::'
+        return [
+            self.CreatorID.to_original(),
+            sep + strng.to_bin(self.BackupID),
+            sep + strng.to_bin(str(self.BlockNumber)),
+            sep + strng.to_bin(self.SessionKeyType),
+            sep + strng.to_bin(self.EncryptedSessionKey),
+            sep + strng.to_bin(str(self.Length)),
+            sep + strng.to_bin(str(self.LastBlock)),
+            sep,
+            strng.to_bin(self.EncryptedData),
+        ]
 
     def Sign(self, signing_key):
         """
@@ -251,11 +278,16 @@ class Block(object):
         ClearLongData = key.DecryptWithSessionKey(SessionKey, self.EncryptedData, session_key_type=self.SessionKeyType)
         return ClearLongData[0:self.Length]    # remove padding
 
-    def Serialize(self):
+    def Serialize(self, block_format=None):
         """
         Create a string that stores all data fields of that ``encrypted.Block``
-        object.
+        object. By default legacy JSON format is used,
+        pass ``block_format=BLOCK_FORMAT_BINARY`` to get a compact binary container.
         """
+        if block_format == BLOCK_FORMAT_BINARY:
+            return self._serialize_binary()
+        if cipher.cipher_format(self.EncryptedData) in (cipher.CIPHER_FORMAT_BINARY, cipher.CIPHER_FORMAT_STREAM, ):
+            raise ValueError('binary encrypted data can not be stored in JSON format')
         dct = {
             'c': self.CreatorID.to_text(),
             'b': self.BackupID,
@@ -271,13 +303,61 @@ class Block(object):
             lg.out(_DebugLevel, 'encrypted.Serialize %s' % repr(dct)[:100])
         return serialization.DictToBytes(dct, encoding='utf-8')
 
+    def SerializeToBuffer(self, length_prefix=False):
+        """
+        Same as ``Serialize(block_format=BLOCK_FORMAT_BINARY)``, but all parts are written directly
+        into one preallocated ``bytearray``, so a ``memoryview`` of it can be passed further without
+        extra copies. With ``length_prefix=True`` the result starts with "<length>:" of the container,
+        this is how the raid code expects the block to be stored.
+        """
+        parts = self._binary_parts()
+        size = sum(len(p) for p in parts)
+        prefix = (strng.to_bin(size) + b':') if length_prefix else b''
+        buf = bytearray(len(prefix) + size)
+        buf[:len(prefix)] = prefix
+        pos = len(prefix)
+        for p in parts:
+            buf[pos:pos + len(p)] = p
+            pos += len(p)
+        return buf
+
+    def _binary_fields(self):
+        return [
+            self.CreatorID.to_original(),
+            strng.to_bin(self.BackupID),
+            strng.to_bin(self.SessionKeyType),
+            strng.to_bin(self.EncryptedSessionKey),
+            strng.to_bin(self.Signature),
+        ]
+
+    def _binary_parts(self):
+        fields = self._binary_fields()
+        encrypted_data = strng.to_bin(self.EncryptedData)
+        header = _BinaryBlockHeader.pack(
+            _BinaryBlockMagic,
+            _BinaryBlockVersion,
+            1 if self.LastBlock else 0,
+            self.BlockNumber,
+            self.Length,
+            *([len(f) for f in fields] + [len(encrypted_data), ])
+        )
+        if _Debug:
+            lg.out(_DebugLevel, 'encrypted.Serialize binary %s' % self)
+        return [header, ] + fields + [encrypted_data, ]
+
+    def _serialize_binary(self):
+        return b''.join(self._binary_parts())
+
 #------------------------------------------------------------------------------
 
 
 def Unserialize(data, decrypt_key=None):
     """
     A method to create a ``encrypted.Block`` instance from input string.
+    Both JSON and binary formats are accepted.
     """
+    if data[:len(_BinaryBlockMagic)] == _BinaryBlockMagic:
+        return _unserialize_binary(data, decrypt_key=decrypt_key)
     dct = serialization.BytesToDict(data, keys_to_text=True, encoding='utf-8')
     if _Debug:
         lg.out(_DebugLevel, 'encrypted.Unserialize %s' % repr(dct)[:100])
@@ -300,3 +380,36 @@ def Unserialize(data, decrypt_key=None):
             lg.out(_DebugLevel, repr(dct))
         return None
     return newobject
+
+
+def _unserialize_binary(data, decrypt_key=None):
+    try:
+        _, version, last_block, block_number, length, lc, lb, lt, lk, ls, lp = _BinaryBlockHeader.unpack_from(data, 0)
+        if version != _BinaryBlockVersion:
+            raise ValueError('unknown binary block version %r' % version)
+        fields = []
+        offset = _BinaryBlockHeader.size
+        for field_length in (lc, lb, lt, lk, ls, lp, ):
+            fields.append(data[offset:offset + field_length])
+            if len(fields[-1]) != field_length:
+                raise ValueError('binary block is truncated')
+            offset += field_length
+        creator_id, backup_id, session_key_type, encrypted_session_key, signature, encrypted_data = fields
+        newobject = Block(
+            CreatorID=id_url.field(creator_id),
+            BackupID=strng.to_text(backup_id),
+            BlockNumber=block_number,
+            LastBlock=bool(last_block),
+            EncryptedSessionKey=encrypted_session_key,
+            SessionKeyType=strng.to_text(session_key_type),
+            Length=length,
+            EncryptedData=encrypted_data,
+            Signature=signature,
+            DecryptKey=decrypt_key,
+        )
+    except:
+        lg.exc()
+        return None
+    if _Debug:
+        lg.out(_DebugLevel, 'encrypted.Unserialize binary %s' % newobject)
+    return newobject
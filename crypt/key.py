@@ -49,6 +49,9 @@ import os
 import sys
 import gc
 import tempfile
+import threading
+
+from collections import OrderedDict
 
 #------------------------------------------------------------------------------
 
@@ -65,6 +68,8 @@ from system import local_fs
 
 from main import settings
 
+from lib import strng
+
 from crypt import rsa_key
 from crypt import hashes
 from crypt import cipher
@@ -73,6 +78,15 @@ from crypt import cipher
 
 _MyKeyObject = None
 
+_PublicKeysCache = OrderedDict()
+_PublicKeysCacheLock = threading.Lock()
+_PublicKeysCacheSize = 1024
+_PublicKeysCacheCounters = {
+    'hits': 0,
+    'misses': 0,
+    'evicted': 0,
+}
+
 #------------------------------------------------------------------------------
 
 
@@ -247,8 +261,9 @@ def VerifySignature(pubkeystring, hashcode, signature):
 
     Return True if signature is correct, otherwise False.
     """
-    pub_key = rsa_key.RSAKey()
-    pub_key.fromString(pubkeystring)
+    pub_key = GetPublicKeyObject(pubkeystring)
+    if not pub_key:
+        return False
     result = pub_key.verify(signature, hashcode)
     return result
 
@@ -266,6 +281,70 @@ def Verify(ConIdentity, hashcode, signature):
 #------------------------------------------------------------------------------
 
 
+def GetPublicKeyObject(pubkeystring):
+    """
+    Return imported ``rsa_key.RSAKey`` object for given public key in openssh format.
+
+    Same remote users are sending us many packets, so already imported keys are kept in a bounded LRU cache.
+    The returned object is shared - it must be used only to verify signatures and encrypt, never modified.
+    Returns None if the key can not be imported.
+    """
+    cache_key = strng.to_bin(pubkeystring)
+    with _PublicKeysCacheLock:
+        pub_key = _PublicKeysCache.pop(cache_key, None)
+        if pub_key is not None:
+            # move it to the end, so most recently used keys are not evicted
+            _PublicKeysCache[cache_key] = pub_key
+            _PublicKeysCacheCounters['hits'] += 1
+            return pub_key
+        _PublicKeysCacheCounters['misses'] += 1
+    pub_key = rsa_key.RSAKey()
+    pub_key.fromString(pubkeystring)
+    if not pub_key.isReady():
+        return None
+    with _PublicKeysCacheLock:
+        _PublicKeysCache[cache_key] = pub_key
+        while len(_PublicKeysCache) > _PublicKeysCacheSize:
+            _PublicKeysCache.popitem(last=False)
+            _PublicKeysCacheCounters['evicted'] += 1
+    return pub_key
+
+
+def SetPublicKeysCacheSize(size):
+    """
+    Change max number of imported public keys kept in memory.
+    """
+    global _PublicKeysCacheSize
+    _PublicKeysCacheSize = max(1, int(size))
+    with _PublicKeysCacheLock:
+        while len(_PublicKeysCache) > _PublicKeysCacheSize:
+            _PublicKeysCache.popitem(last=False)
+            _PublicKeysCacheCounters['evicted'] += 1
+
+
+def ClearPublicKeysCache():
+    """
+    Forget all imported public keys and reset the counters.
+    """
+    with _PublicKeysCacheLock:
+        _PublicKeysCache.clear()
+        for name in _PublicKeysCacheCounters.keys():
+            _PublicKeysCacheCounters[name] = 0
+
+
+def PublicKeysCacheCounters():
+    """
+    Return statistics of the public keys cache.
+    """
+    with _PublicKeysCacheLock:
+        result = dict(_PublicKeysCacheCounters)
+        result['size'] = len(_PublicKeysCache)
+        result['max_size'] = _PublicKeysCacheSize
+    return result
+
+#------------------------------------------------------------------------------
+
+
 def HashMD5(inp, hexdigest=False):
     """
     Use MD5 method to calculate the hash of ``inp`` string.
@@ -297,13 +376,26 @@ def Hash(inp, hexdigest=False):
     """
     return HashSHA(inp, hexdigest=hexdigest)
 
+
+def NewHashObject():
+    """
+    Returns a new hash object of the same type ``Hash()`` is using, so the input
+    can be passed to it in parts via ``update()`` calls.
+    """
+    return hashes.sha1(b'', return_object=True)
+
 #------------------------------------------------------------------------------
 
 
-def SessionKeyType():
+def SessionKeyType(for_backups=False):
     """
     Which crypto is used for session key.
+
+    Backup blocks are stored in binary format only, so they can be encrypted in a
+    streaming mode, see ``settings.getBackupSessionKeyType()``.
     """
+    if for_backups:
+        return settings.getBackupSessionKeyType()
     return 'AES'
 
 
@@ -315,14 +407,15 @@ def NewSessionKey(session_key_type):
 
 #------------------------------------------------------------------------------
 
-def EncryptWithSessionKey(session_key, inp, session_key_type):
+def EncryptWithSessionKey(session_key, inp, session_key_type, cipher_format=None):
     """
     Encrypt input string with Session Key.
 
     :param session_key: randomly generated session key
     :param inp: input string to encrypt
+    :param cipher_format: pass ``cipher.CIPHER_FORMAT_BINARY`` to get raw binary output instead of JSON
     """
-    ret = cipher.encrypt_json(inp, session_key, session_key_type)
+    ret = cipher.encrypt_json(inp, session_key, session_key_type, cipher_format=cipher_format)
     return ret
 
 
@@ -343,8 +436,9 @@ def EncryptOpenSSHPublicKey(pubkeystring, inp):
     """
     Encrypt ``inp`` string with given Public Key.
     """
-    pub_key = rsa_key.RSAKey()
-    pub_key.fromString(pubkeystring)
+    pub_key = GetPublicKeyObject(pubkeystring)
+    if not pub_key:
+        raise ValueError('failed to import public key')
     result = pub_key.encrypt(inp)
     return result
 
@@ -40,6 +40,14 @@ Packet Fields are all strings (no integers, objects, etc)
     - RemoteID : want full IDURL for other party so troublemaker could not
                 use his packets to mess up other nodes by sending it to them
     - Signature : signature on Hash is always by CreatorID
+
+Packets can be serialized in two formats:
+    - json : the legacy format, all fields are stored in a JSON dictionary
+    - binary : magic prefix and version byte, followed by length-prefixed fields and raw Payload bytes
+
+``Unserialize()`` detects the format by the magic prefix.
+Every JSON packet also advertises the binary format, so nodes learn which peers are able to read it.
+Binary packets are sent only to peers who sent us a packet directly and advertised the binary format.
 """
 
 #------------------------------------------------------------------------------
@@ -58,6 +66,7 @@ _LogSignVerify = False
 
 import os
 import sys
+import struct
 
 from twisted.internet import threads
 
@@ -84,6 +93,17 @@ from userid import id_url
 
 #------------------------------------------------------------------------------
 
+PACKET_FORMAT_JSON = 'json'
+PACKET_FORMAT_BINARY = 'binary'
+
+_BinaryPacketMagic = b'\x00BDP'
+_BinaryPacketVersion = 1
+_BinaryPacketHeader = struct.Struct('>4sB10I')
+
+_PeersPacketFormats = {}
+
+#------------------------------------------------------------------------------
+
 
 class Packet(object):
     """
@@ -100,7 +120,7 @@ class Packet(object):
     make all network working.
     """
 
-    def __init__(self, Command, OwnerID, CreatorID, PacketID, Payload, RemoteID, KeyID=None, Date=None, Signature=None, ):
+    def __init__(self, Command, OwnerID, CreatorID, PacketID, Payload, RemoteID, KeyID=None, Date=None, Signature=None, Format=None, ):
         """
         Init all fields and sign the packet.
         """
@@ -123,15 +143,23 @@ class Packet(object):
         self.RemoteID = id_url.field(RemoteID)
         # which private key to use to generate signature
         self.KeyID = strng.to_text(KeyID or my_id.getGlobalID(key_alias='master'))
+        # packet format which the creator is able to read, covered by the signature when present
+        self.Format = strng.to_text(Format or '')
         if Signature:
             self.Signature = Signature
         else:
+            # we are able to read binary packets, tell that to the remote node
+            self.Format = self.Format or PACKET_FORMAT_BINARY
             # signature on Hash is always by CreatorID
             self.Signature = None
             # must be signed to be valid
             self.Sign()
         # stores list of related objects packet_in() or packet_out()
         self.Packets = []
+        # serialized forms of that packet, so same packet is never encoded twice
+        self._serialized = {}
+        # packet format which the creator of that packet is able to read
+        self._supported_format = PACKET_FORMAT_JSON
 
     def __repr__(self):
         args = '%s(%s)' % (str(self.Command), str(self.PacketID))
@@ -149,6 +177,7 @@ class Packet(object):
         Usually just done at packet creation.
         """
         self.Signature = self.GenerateSignature()
+        self._serialized = {}
         return self
 
     def GenerateHashBase(self):
@@ -175,6 +204,9 @@ class Packet(object):
             stufftosum += self.RemoteID.original()
             stufftosum += sep
             stufftosum += strng.to_bin(self.KeyID)
+            if self.Format:
+                stufftosum += sep
+                stufftosum += strng.to_bin(self.Format)
         except Exception as exc:
             lg.exc()
             raise exc
@@ -322,33 +354,66 @@ class Packet(object):
         """
         return packetid.SupplierNumber(self.PacketID)
 
-    def Serialize(self):
+    def Serialize(self, packet_format=None):
         """
         Create a string from packet object.
         This is useful when need to save the packet on disk or send via network.
+        By default legacy JSON format is used, pass ``packet_format=PACKET_FORMAT_BINARY`` to get a binary form.
+        Result is cached, same packet is never encoded twice.
         """
-        dct = {
-            'm': self.Command,
-            'o': self.OwnerID.original(),
-            'c': self.CreatorID.original(),
-            'i': self.PacketID,
-            'd': self.Date,
-            'p': self.Payload,
-            'r': self.RemoteID.original(),
-            'k': self.KeyID,
-            's': self.Signature,
-        }        
-        src = serialization.DictToBytes(dct, encoding='latin1')
+        packet_format = packet_format or PACKET_FORMAT_JSON
+        src = self._serialized.get(packet_format)
+        if src is not None:
+            return src
+        if packet_format == PACKET_FORMAT_BINARY:
+            src = self._serialize_binary()
+        else:
+            dct = {
+                'm': self.Command,
+                'o': self.OwnerID.original(),
+                'c': self.CreatorID.original(),
+                'i': self.PacketID,
+                'd': self.Date,
+                'p': self.Payload,
+                'r': self.RemoteID.original(),
+                'k': self.KeyID,
+                's': self.Signature,
+            }
+            if self.Format:
+                dct['f'] = self.Format
+            src = serialization.DictToBytes(dct, encoding='latin1')
         # if _Debug:
         #     lg.out(_DebugLevel, 'signed.Serialize %d bytes %s(%s) %s/%s/%s KeyID=%s\n%r' % (
         #         len(src), self.Command, self.PacketID, nameurl.GetName(self.OwnerID),
         #         nameurl.GetName(self.CreatorID), nameurl.GetName(self.RemoteID), self.KeyID, dct['s']))
+        self._serialized[packet_format] = src
         return src
 
+    def _serialize_binary(self):
+        fields = [
+            strng.to_bin(self.Command),
+            self.OwnerID.original(),
+            self.CreatorID.original(),
+            strng.to_bin(self.PacketID),
+            strng.to_bin(self.Date),
+            self.RemoteID.original(),
+            strng.to_bin(self.KeyID),
+            strng.to_bin(self.Signature),
+            strng.to_bin(self.Format),
+        ]
+        header = _BinaryPacketHeader.pack(
+            _BinaryPacketMagic,
+            _BinaryPacketVersion,
+            *([len(f) for f in fields] + [len(self.Payload), ])
+        )
+        return b''.join([header, ] + fields + [self.Payload, ])
+
     def __len__(self):
         """
         Return a length of serialized packet .
         """
+        for src in self._serialized.values():
+            return len(src)
         return len(self.Serialize())
 
 
@@ -366,11 +431,20 @@ def Unserialize(data):
     We expect here a string containing a whole packet object in text form.
     Will return a real object in the memory from given string.
     All class fields are loaded, signature can be verified to be sure - it was truly original string.
+    Both JSON and binary formats are accepted, see ``Packet.Serialize()``.
     """
     if data is None:
         return None
 
-    dct = serialization.BytesToDict(data, keys_to_text=True, encoding='latin1')
+    packet_format = PacketFormat(data)
+    try:
+        if packet_format == PACKET_FORMAT_BINARY:
+            dct = _unserialize_binary(data)
+        else:
+            dct = serialization.BytesToDict(data, keys_to_text=True, encoding='latin1')
+    except:
+        lg.exc()
+        return None
 
     # if _Debug:
     #     lg.out(_DebugLevel, 'signed.Unserialize %d bytes : %r' % (len(data), dct['s']))
@@ -385,6 +459,7 @@ def Unserialize(data):
         RemoteID = dct['r']
         KeyID = strng.to_text(dct['k'])
         Signature = dct['s']
+        Format = strng.to_text(dct.get('f', ''))
     except:
         lg.exc()
         return None
@@ -400,6 +475,7 @@ def Unserialize(data):
             RemoteID=RemoteID,
             KeyID=KeyID,
             Signature=Signature,
+            Format=Format,
         )
     except:
         if _Debug:
@@ -413,16 +489,71 @@ def Unserialize(data):
                 RemoteID=RemoteID,
                 KeyID=KeyID,
                 Signature=Signature,
+                Format=Format,
             )
         lg.exc()
         return None
 
+    # keep original bytes, no need to encode that packet again
+    newobject._serialized[packet_format] = strng.to_bin(data)
+    newobject._supported_format = PACKET_FORMAT_BINARY if (
+        packet_format == PACKET_FORMAT_BINARY or newobject.Format == PACKET_FORMAT_BINARY
+    ) else PACKET_FORMAT_JSON
+
     # if _Debug:
     #     lg.args(_DebugLevel, Command=Command, PacketID=PacketID, OwnerID=OwnerID, CreatorID=CreatorID, RemoteID=RemoteID)
 
     return newobject
 
 
+def _unserialize_binary(data):
+    magic, version, lm, lo, lc, li, ld, lr, lk, ls, lf, lp = _BinaryPacketHeader.unpack_from(data, 0)
+    if magic != _BinaryPacketMagic or version != _BinaryPacketVersion:
+        raise ValueError('unknown binary packet version %r' % version)
+    dct = {}
+    offset = _BinaryPacketHeader.size
+    for field, length in (('m', lm), ('o', lo), ('c', lc), ('i', li), ('d', ld), ('r', lr), ('k', lk), ('s', ls), ('f', lf), ('p', lp), ):
+        dct[field] = data[offset:offset + length]
+        if len(dct[field]) != length:
+            raise ValueError('binary packet is truncated')
+        offset += length
+    return dct
+
+
+def PacketFormat(data):
+    """
+    Detects format of the serialized packet by the magic prefix.
+    """
+    if data[:len(_BinaryPacketMagic)] == _BinaryPacketMagic:
+        return PACKET_FORMAT_BINARY
+    return PACKET_FORMAT_JSON
+
+
+def PeerPacketFormat(idurl):
+    """
+    Returns packet format which can be used to send packets to given node.
+    """
+    return _PeersPacketFormats.get(id_url.to_bin(idurl), PACKET_FORMAT_JSON)
+
+
+def RememberPeerPacketFormat(sender_idurl, newpacket):
+    """
+    Called for every incoming packet to learn which packet format the sender is able to read.
+    Only packets received directly from its creator are taken into account: packets routed
+    via proxy nodes are also unserialized by the router who may run an older software.
+    Must be called only after the signature was verified, the format flag is covered by it.
+    """
+    if not sender_idurl:
+        return
+    supported_format = newpacket._supported_format
+    if id_url.to_bin(newpacket.CreatorID) != id_url.to_bin(sender_idurl):
+        supported_format = PACKET_FORMAT_JSON
+    if supported_format == PACKET_FORMAT_JSON:
+        _PeersPacketFormats.pop(id_url.to_bin(newpacket.CreatorID), None)
+    else:
+        _PeersPacketFormats[id_url.to_bin(newpacket.CreatorID)] = supported_format
+
+
 def MakePacket(Command, OwnerID, CreatorID, PacketID, Payload, RemoteID):
     """
     Just calls the constructor of packet class.
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# verifier.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (verifier.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+"""
+..
+
+module:: verifier
+
+Verifies signatures of incoming packets outside of the main thread.
+
+Packets are collected in the queue during one reactor iteration and passed in batches
+to a small pool of worker threads. RSA math is done inside the C code of pycryptodome
+which releases the GIL, so the reactor thread stays responsive while the workers are busy.
+
+Results are delivered back in the main thread via Deferred objects and always in same
+order the packets were added to the queue.
+
+If the verifier is not started, packets are verified immediately in the main thread.
+"""
+
+#------------------------------------------------------------------------------
+
+from __future__ import absolute_import
+
+#------------------------------------------------------------------------------
+
+_Debug = False
+_DebugLevel = 10
+
+#------------------------------------------------------------------------------
+
+from twisted.internet import reactor  # @UnresolvedImport
+from twisted.internet import threads
+from twisted.internet.defer import Deferred
+from twisted.python import threadpool  # @UnresolvedImport
+
+#------------------------------------------------------------------------------
+
+from logs import lg
+
+from p2p import commands
+
+from contacts import contactsdb
+
+from crypt import key
+
+#------------------------------------------------------------------------------
+
+_ThreadPool = None
+_BatchSize = 32
+_Pending = []
+_Batches = []
+_FlushTask = None
+_Counters = {
+    'queued': 0,
+    'verified': 0,
+    'not_valid': 0,
+    'batches': 0,
+    'max_batch': 0,
+}
+
+#------------------------------------------------------------------------------
+
+
+def init(threads_count=2, batch_size=32):
+    """
+    Start worker threads, if ``threads_count`` is 0 packets will be verified in the main thread.
+    """
+    global _ThreadPool
+    global _BatchSize
+    if _ThreadPool:
+        return
+    for name in _Counters.keys():
+        _Counters[name] = 0
+    _BatchSize = max(1, int(batch_size))
+    if threads_count <= 0:
+        if _Debug:
+            lg.out(_DebugLevel, 'verifier.init SKIP, worker threads are disabled')
+        return
+    _ThreadPool = threadpool.ThreadPool(minthreads=1, maxthreads=threads_count, name='verifier')
+    _ThreadPool.start()
+    if _Debug:
+        lg.out(_DebugLevel, 'verifier.init started %d worker threads, batch size is %d' % (threads_count, _BatchSize))
+
+
+def shutdown():
+    """
+    Stop worker threads, packets which are still in the queue are verified in the main thread.
+    """
+    global _ThreadPool
+    global _FlushTask
+    if _FlushTask and _FlushTask.active():
+        _FlushTask.cancel()
+    _FlushTask = None
+    if _ThreadPool:
+        _ThreadPool.stop()
+        _ThreadPool = None
+    pending = list(_Pending)
+    del _Pending[:]
+    if pending:
+        _deliver(pending, _verify_batch([(p, pubkey) for p, pubkey, _ in pending]))
+    if _Debug:
+        lg.out(_DebugLevel, 'verifier.shutdown with %d batches in progress' % len(_Batches))
+
+
+def is_running():
+    return _ThreadPool is not None
+
+
+def counters():
+    """
+    Return current statistics of the verifier.
+    """
+    result = dict(_Counters)
+    result['pending'] = len(_Pending)
+    result['batches_in_progress'] = len(_Batches)
+    result['running'] = is_running()
+    return result
+
+#------------------------------------------------------------------------------
+
+
+def verify_packet(newpacket):
+    """
+    Same checks as ``signed.Packet.Valid()`` do, but signature is verified in a worker thread.
+
+    Returns Deferred object which will be fired with True or False in the main thread.
+    """
+    ret = Deferred()
+    if not newpacket.Ready():
+        if _Debug:
+            lg.out(_DebugLevel, 'verifier.verify_packet packet is not ready yet %r' % newpacket)
+        ret.callback(False)
+        return ret
+    if not commands.IsCommand(newpacket.Command):
+        lg.warn('bad Command %r' % newpacket.Command)
+        ret.callback(False)
+        return ret
+    creator_identity = contactsdb.get_contact_identity(newpacket.CreatorID)
+    if creator_identity is None:
+        lg.err('could not get Identity for %r so returning False' % newpacket.CreatorID)
+        ret.callback(False)
+        return ret
+    _Counters['queued'] += 1
+    _Pending.append((newpacket, creator_identity.publickey, ret, ))
+    if not is_running():
+        _flush()
+    elif len(_Pending) >= _BatchSize:
+        _flush()
+    else:
+        _schedule_flush()
+    return ret
+
+#------------------------------------------------------------------------------
+
+
+def _schedule_flush():
+    global _FlushTask
+    if _FlushTask and _FlushTask.active():
+        return
+    # let the reactor collect more packets received at the same moment
+    _FlushTask = reactor.callLater(0, _flush)  # @UndefinedVariable
+
+
+def _flush():
+    global _FlushTask
+    if _FlushTask and _FlushTask.active():
+        _FlushTask.cancel()
+    _FlushTask = None
+    while _Pending:
+        batch = _Pending[:_BatchSize]
+        del _Pending[:_BatchSize]
+        _Counters['batches'] += 1
+        _Counters['max_batch'] = max(_Counters['max_batch'], len(batch))
+        items = [(p, pubkey) for p, pubkey, _ in batch]
+        if not is_running():
+            _deliver(batch, _verify_batch(items))
+            continue
+        slot = [batch, None, ]
+        _Batches.append(slot)
+        d = threads.deferToThreadPool(reactor, _ThreadPool, _verify_batch, items)
+        d.addCallback(_on_batch_verified, slot)
+        d.addErrback(_on_batch_failed, slot)
+
+
+def _verify_batch(items):
+    """
+    Executed in a worker thread.
+    """
+    results = []
+    for newpacket, pubkey in items:
+        try:
+            result = key.VerifySignature(pubkey, newpacket.GenerateHash(), newpacket.Signature)
+        except:
+            result = False
+        results.append(bool(result))
+    return results
+
+
+def _on_batch_verified(results, slot):
+    slot[1] = results
+    # results are delivered in same order the packets were queued
+    while _Batches and _Batches[0][1] is not None:
+        batch, results = _Batches.pop(0)
+        _deliver(batch, results)
+    return None
+
+
+def _on_batch_failed(err, slot):
+    lg.err('failed verifying batch of %d packets: %r' % (len(slot[0]), err))
+    return _on_batch_verified([False, ] * len(slot[0]), slot)
+
+
+def _deliver(batch, results):
+    for (newpacket, _, ret), result in zip(batch, results):
+        if result:
+            _Counters['verified'] += 1
+        else:
+            _Counters['not_valid'] += 1
+        try:
+            ret.callback(result)
+        except:
+            lg.exc()
@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# dht_cache.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (dht_cache.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+"""
+..
+
+module:: dht_cache
+
+Read-through cache for JSON values received from DHT.
+
+All records of all layers are kept in one LRU ordered dictionary which is limited by
+number of records. Records older than ``MAX_RECORD_AGE`` are dropped, every caller also
+provides its own TTL when reading.
+
+If value was not found in DHT, a "negative" record is stored, so repeated lookups of
+a missing key do not start a new iterative find every time for ``NEGATIVE_CACHE_TTL`` seconds.
+
+Only one DHT request is running for same key at the moment: other callers are waiting
+for the result of the first request.
+
+Cache is stored in a single JSON file and written to disk with a small delay after changes.
+"""
+
+#------------------------------------------------------------------------------
+
+from __future__ import absolute_import
+
+#------------------------------------------------------------------------------
+
+_Debug = False
+_DebugLevel = 10
+
+#------------------------------------------------------------------------------
+
+import os
+
+from collections import OrderedDict
+
+from twisted.internet import reactor  # @UnresolvedImport
+from twisted.internet.defer import Deferred, maybeDeferred
+
+#------------------------------------------------------------------------------
+
+from logs import lg
+
+from system import bpio
+from system import local_fs
+
+from lib import strng
+from lib import utime
+from lib import jsn
+
+#------------------------------------------------------------------------------
+
+MAX_RECORDS = 5000
+MAX_RECORD_AGE = 60 * 60 * 24
+NEGATIVE_CACHE_TTL = 60 * 5
+SAVE_DELAY = 10
+
+_CacheVersion = 1
+
+#------------------------------------------------------------------------------
+
+_CacheFilePath = None
+_MaxRecords = MAX_RECORDS
+_Records = OrderedDict()
+_InFlight = {}
+_Counters = {}
+_SaveTask = None
+
+#------------------------------------------------------------------------------
+
+
+def init(cache_file_path, max_records=MAX_RECORDS, legacy_cache_dir_path=None):
+    """
+    Loads cached records from the file, also records stored by the previous versions
+    (one file per record) are moved from ``legacy_cache_dir_path`` into the new file.
+    """
+    global _CacheFilePath
+    global _MaxRecords
+    _CacheFilePath = cache_file_path
+    _MaxRecords = max_records
+    _Records.clear()
+    _InFlight.clear()
+    _Counters.clear()
+    loaded = load()
+    migrated = 0
+    if legacy_cache_dir_path and os.path.isdir(legacy_cache_dir_path):
+        migrated = migrate_legacy_cache(legacy_cache_dir_path)
+    if _Debug:
+        lg.args(_DebugLevel, cache_file_path=cache_file_path, loaded=loaded, migrated=migrated)
+
+
+def shutdown():
+    global _CacheFilePath
+    if _CacheFilePath:
+        save()
+    if _Debug:
+        lg.args(_DebugLevel, records=len(_Records), counters=counters())
+    _CacheFilePath = None
+    _Records.clear()
+    _InFlight.clear()
+
+#------------------------------------------------------------------------------
+
+
+def load():
+    if not _CacheFilePath or not os.path.isfile(_CacheFilePath):
+        return 0
+    try:
+        json_data = jsn.loads_text(local_fs.ReadTextFile(_CacheFilePath))
+        if json_data['version'] != _CacheVersion:
+            raise ValueError('unknown version: %r' % json_data['version'])
+        records = json_data['records']
+    except:
+        lg.exc()
+        lg.warn('cached DHT records file %r is broken and will be ignored' % _CacheFilePath)
+        return 0
+    now = utime.get_sec1970()
+    for layer_id, hash_key, timestamp, json_value in records:
+        if now - timestamp > MAX_RECORD_AGE:
+            continue
+        _Records[(layer_id, hash_key)] = (json_value, timestamp)
+    _evict()
+    return len(_Records)
+
+
+def save():
+    global _SaveTask
+    if _SaveTask and _SaveTask.active():
+        _SaveTask.cancel()
+    _SaveTask = None
+    if not _CacheFilePath:
+        return False
+    now = utime.get_sec1970()
+    records = []
+    for (layer_id, hash_key), (json_value, timestamp) in _Records.items():
+        if now - timestamp <= MAX_RECORD_AGE:
+            records.append([layer_id, hash_key, timestamp, json_value])
+    if not local_fs.WriteTextFile(_CacheFilePath, jsn.dumps({'version': _CacheVersion, 'records': records, }, separators=(',', ':'))):
+        lg.err('failed to store cached DHT records in %r' % _CacheFilePath)
+        return False
+    if _Debug:
+        lg.args(_DebugLevel, records=len(records), path=_CacheFilePath)
+    return True
+
+
+def migrate_legacy_cache(cache_dir_path):
+    """
+    Previously every cached record was stored in a separate file: ``cache/<layer_id>/<hash_key>``.
+    """
+    total_records = 0
+    for layer_id_str in os.listdir(cache_dir_path):
+        layer_dir_path = os.path.join(cache_dir_path, layer_id_str)
+        try:
+            layer_id = int(layer_id_str)
+        except:
+            continue
+        if not os.path.isdir(layer_dir_path):
+            continue
+        for hash_key in os.listdir(layer_dir_path):
+            try:
+                cached_json_record = jsn.loads_text(local_fs.ReadTextFile(os.path.join(layer_dir_path, hash_key)))
+                store(hash_key, cached_json_record['v'], layer_id=layer_id, timestamp=cached_json_record['t'])
+            except:
+                lg.exc()
+                continue
+            total_records += 1
+    bpio.rmdir_recursive(cache_dir_path, ignore_errors=True)
+    if total_records:
+        save()
+    return total_records
+
+
+def _schedule_save():
+    global _SaveTask
+    if not _CacheFilePath:
+        return
+    if _SaveTask is None or not _SaveTask.active():
+        _SaveTask = reactor.callLater(SAVE_DELAY, save)  # @UndefinedVariable
+
+
+def _evict():
+    evicted = 0
+    while len(_Records) > _MaxRecords:
+        (layer_id, _), _ = _Records.popitem(last=False)
+        _layer_counters(layer_id)['evicted'] += 1
+        evicted += 1
+    return evicted
+
+#------------------------------------------------------------------------------
+
+
+def _layer_counters(layer_id):
+    if layer_id not in _Counters:
+        _Counters[layer_id] = {
+            'hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evicted': 0,
+        }
+    return _Counters[layer_id]
+
+
+def counters():
+    """
+    Return statistics of the cache per layer, ``hit_ratio`` counts both positive and negative hits.
+    """
+    records_per_layer = {}
+    for layer_id, _ in _Records.keys():
+        records_per_layer[layer_id] = records_per_layer.get(layer_id, 0) + 1
+    result = {}
+    for layer_id in set(_Counters.keys()).union(records_per_layer.keys()):
+        layer_counters = dict(_layer_counters(layer_id))
+        total_hits = layer_counters['hits'] + layer_counters['negative_hits']
+        total_reads = total_hits + layer_counters['misses'] + layer_counters['coalesced']
+        layer_counters['hit_ratio'] = round(total_hits / float(total_reads), 3) if total_reads else 0.0
+        layer_counters['records'] = records_per_layer.get(layer_id, 0)
+        result[layer_id] = layer_counters
+    return result
+
+#------------------------------------------------------------------------------
+
+
+def store(hash_key, json_value, layer_id=0, timestamp=None):
+    """
+    Store value received from DHT, ``json_value=None`` means value was not found there.
+    """
+    if not timestamp:
+        timestamp = utime.get_sec1970()
+    hash_key = strng.to_text(hash_key)
+    record_key = (layer_id, hash_key)
+    _Records.pop(record_key, None)
+    _Records[record_key] = (json_value, timestamp)
+    _evict()
+    _schedule_save()
+    if _Debug:
+        lg.args(_DebugLevel, hash_key=hash_key, layer_id=layer_id, negative=(json_value is None), records=len(_Records))
+    return True
+
+
+def forget(hash_key, layer_id=0):
+    if _Records.pop((layer_id, strng.to_text(hash_key)), None) is None:
+        return False
+    _schedule_save()
+    return True
+
+
+def get(hash_key, layer_id=0, cache_ttl=MAX_RECORD_AGE):
+    """
+    Returns cached record as a tuple ``(json_value, timestamp)`` if it is not older than ``cache_ttl``.
+    Negative records are valid only for ``NEGATIVE_CACHE_TTL`` seconds.
+    """
+    record_key = (layer_id, strng.to_text(hash_key))
+    record = _Records.get(record_key)
+    if record is None:
+        return None
+    age = utime.get_sec1970() - record[1]
+    if record[0] is None:
+        cache_ttl = min(cache_ttl, NEGATIVE_CACHE_TTL)
+    if age > cache_ttl:
+        return None
+    # recently used records are moved to the end, so they are evicted last
+    _Records[record_key] = _Records.pop(record_key)
+    return record
+
+#------------------------------------------------------------------------------
+
+
+def read_through(hash_key, layer_id, cache_ttl, request_method, *args, **kwargs):
+    """
+    Returns Deferred object which is fired with the cached value, or if nothing was
+    cached, with a result of ``request_method(*args, **kwargs)`` - that method must return
+    a dict if the value was found in DHT.
+
+    If same key is already requested, no new request will be started. Negative result is
+    stored in the cache and returned as an empty list: closest nodes are not known.
+    """
+    hash_key = strng.to_text(hash_key)
+    layer_counters = _layer_counters(layer_id)
+    record = get(hash_key, layer_id=layer_id, cache_ttl=cache_ttl)
+    ret = Deferred()
+    if record is not None:
+        if record[0] is None:
+            layer_counters['negative_hits'] += 1
+            ret.callback([])
+        else:
+            layer_counters['hits'] += 1
+            ret.callback(record[0])
+        return ret
+    record_key = (layer_id, hash_key)
+    if record_key in _InFlight:
+        layer_counters['coalesced'] += 1
+        _InFlight[record_key].append(ret)
+        if _Debug:
+            lg.args(_DebugLevel, hash_key=hash_key, layer_id=layer_id, waiting=len(_InFlight[record_key]))
+        return ret
+    layer_counters['misses'] += 1
+    _InFlight[record_key] = [ret, ]
+    d = maybeDeferred(request_method, *args, **kwargs)
+    d.addCallback(_on_request_success, record_key)
+    d.addErrback(_on_request_failed, record_key)
+    return ret
+
+
+def _on_request_success(result, record_key):
+    if not isinstance(result, dict):
+        store(record_key[1], None, layer_id=record_key[0])
+    waiters = _InFlight.pop(record_key, [])
+    for result_defer in waiters:
+        result_defer.callback(result)
+    return None
+
+
+def _on_request_failed(err, record_key):
+    waiters = _InFlight.pop(record_key, [])
+    for result_defer in waiters:
+        result_defer.errback(err)
+    return None
@@ -64,7 +64,6 @@ if __name__ == '__main__':
 from logs import lg
 
 from system import bpio
-from system import local_fs
 
 from main import settings
 from main import events
@@ -76,6 +75,7 @@ from lib import jsn
 from userid import id_url
 
 from dht import known_nodes
+from dht import dht_cache
 
 #------------------------------------------------------------------------------
 
@@ -104,7 +104,6 @@ _ActiveLookup = None
 _ActiveLookupLayerID = None
 _Counters = {}
 _ProtocolVersion = 7
-_Cache = {}
 
 #------------------------------------------------------------------------------
 
@@ -134,10 +133,10 @@ def init(udp_port, dht_dir_path=None, open_layers=[]):
     list_layers = []
     if os.path.isdir(dht_dir_path):
         list_layers = os.listdir(dht_dir_path)
-    cache_dir_path = os.path.join(dht_dir_path, 'cache')
-    if not os.path.isdir(cache_dir_path):
-        os.makedirs(cache_dir_path)
-    load_cache(cache_dir_path)
+    dht_cache.init(
+        cache_file_path=os.path.join(dht_dir_path, 'cache.json'),
+        legacy_cache_dir_path=os.path.join(dht_dir_path, 'cache'),
+    )
     if _Debug:
         lg.dbg(_DebugLevel, 'dht_dir_path=%r list_layers=%r network_info=%r' % (
             dht_dir_path, list_layers, nw_info))
@@ -183,6 +182,7 @@ def init(udp_port, dht_dir_path=None, open_layers=[]):
 
 def shutdown():
     global _MyNode
+    dht_cache.shutdown()
     if _MyNode is not None:
         for ds in _MyNode._dataStores.values():
             ds._db.close()
@@ -610,6 +610,7 @@ def set_json_value(key, json_data, age=0, expire=KEY_EXPIRE_MAX_SECONDS, collect
         return fail(Exception('bad input json data'))
     if _Debug:
         lg.out(_DebugLevel, 'dht_service.set_json_value key=[%r] layer_id=%d with %d bytes' % (key, layer_id, len(repr(value))))
+    dht_cache.forget(key_to_hash(key), layer_id=layer_id)
     return set_value(key=key, value=value, age=age, expire=expire, collect_results=collect_results, layer_id=layer_id)
 
 #------------------------------------------------------------------------------
@@ -1107,55 +1108,17 @@ def dump_local_db(value_as_json=False):
 
 #------------------------------------------------------------------------------
 
-def load_cache(cache_dir_path):
-    global _Cache
-    _Cache.clear()
-    total_records = 0
-    records_per_layer = {}
-    for layer_id_str in os.listdir(cache_dir_path):
-        layer_id = int(layer_id_str)
-        if layer_id not in _Cache:
-            _Cache[layer_id] = {}
-        records_per_layer[layer_id] = 0
-        for hash_key in os.listdir(cache_dir_path):
-            _Cache[layer_id][hash_key] = jsn.loads_text(local_fs.ReadTextFile(os.path.join(cache_dir_path, hash_key)))
-            total_records += 1
-            records_per_layer[layer_id] += 1
-    if _Debug:
-        lg.args(_DebugLevel, total_records=total_records, records_per_layer=records_per_layer)
-    return total_records
-
-
 def store_cached_key(hash_key, json_value, layer_id=0, timestamp=None):
-    global _Cache
-    if not timestamp:
-        timestamp = utime.get_sec1970()
-    if layer_id not in _Cache:
-        _Cache[layer_id] = {}
-    cached_json_record = {
-        'v': json_value,
-        't': timestamp,
-    }
-    dht_dir_path = settings.ServiceDir('service_entangled_dht')
-    layer_cache_dir_path = os.path.join(dht_dir_path, 'cache', strng.to_text(layer_id))
-    if not os.path.isdir(layer_cache_dir_path):
-        os.makedirs(layer_cache_dir_path)
-    cached_record_file_path = os.path.join(layer_cache_dir_path, hash_key)
-    if not local_fs.WriteTextFile(cached_record_file_path, jsn.dumps(cached_json_record)):
-        lg.err('failed to store cached dht key %r in layer %d' % (hash_key, layer_id, ))
-        return False
-    _Cache[layer_id][hash_key] = cached_json_record
-    if _Debug:
-        lg.args(_DebugLevel, hash_key=hash_key, layer_id=layer_id, timestamp=timestamp, cached_records=len(_Cache[layer_id]))
-    return True
+    return dht_cache.store(hash_key, json_value, layer_id=layer_id, timestamp=timestamp)
 
 
 def get_cached_value(hash_key, layer_id=0):
-    global _Cache
-    value = _Cache.get(layer_id, {}).get(hash_key)
+    record = dht_cache.get(hash_key, layer_id=layer_id)
     if _Debug:
-        lg.args(_DebugLevel, layer_id=layer_id, hash_key=hash_key, value_exist=(value is not None))
-    return value
+        lg.args(_DebugLevel, layer_id=layer_id, hash_key=hash_key, value_exist=(record is not None))
+    if record is None or record[0] is None:
+        return None
+    return {'v': record[0], 't': record[1], }
 
 
 def on_json_response_to_be_cached(json_value, key, layer_id):
@@ -1167,17 +1130,9 @@ def on_json_response_to_be_cached(json_value, key, layer_id):
 
 
 def get_cached_json_value(key, layer_id=0, cache_ttl=DEFAULT_CACHE_TTL):
-    hash_key = key_to_hash(key)
-    cached_record = get_cached_value(hash_key)
-    if not cached_record:
-        return get_json_value(key, layer_id=layer_id, update_cache=True)
-    if utime.get_sec1970() - int(cached_record['t']) > cache_ttl:
-        return get_json_value(key, layer_id=layer_id, update_cache=True)
     if _Debug:
         lg.out(_DebugLevel, 'dht_service.get_cached_json_value key=[%r] layer_id=%d cache_ttl=%d' % (key, layer_id, cache_ttl, ))
-    ret = Deferred()
-    ret.callback(cached_record['v'])
-    return ret
+    return dht_cache.read_through(key_to_hash(key), layer_id, cache_ttl, get_json_value, key, layer_id=layer_id, update_cache=True)
 
 #------------------------------------------------------------------------------
 
@@ -1223,22 +1178,10 @@ class DHTNode(MultiLayerNode):
     def expire(self):
         now = utime.get_sec1970()
         for layer_id in self._dataStores.keys():
-            expired_keys = []
-            for key in self._dataStores[layer_id].keys():
-                if key == self.nodeStateKey:
-                    continue
-                item_data = self._dataStores[layer_id].getItem(key)
-                if item_data:
-                    originaly_published = item_data.get('originallyPublished')
-                    expireSeconds = item_data.get('expireSeconds')
-                    if expireSeconds and originaly_published:
-                        age = now - originaly_published
-                        if age > expireSeconds:
-                            expired_keys.append(key)
-            for key in expired_keys:
-                if _Debug:
+            expired_keys = self._dataStores[layer_id].expireItems(now, keepKeys=[self.nodeStateKey, ])
+            if _Debug:
+                for key in expired_keys:
                     lg.out(_DebugLevel, 'dht_service.expire   [%s] removed from layer %d' % (key, layer_id))
-                del self._dataStores[layer_id][key]
 
     @rpcmethod
     def store(self, key, value, originalPublisherID=None,
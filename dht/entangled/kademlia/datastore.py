@@ -22,7 +22,6 @@ except ImportError:
     from collections import MutableMapping as DictMixin
 
 import sqlite3
-import os
 import json
 
 from . import constants  # @UnresolvedImport
@@ -119,6 +118,44 @@ class DataStore(DictMixin):
         """
         """
 
+    def getRepublishItems(self, originallyPublishedBefore, lastPublishedBefore):
+        """
+        Return all items (as dictionaries, see C{getItem}) which were originally
+        published before C{originallyPublishedBefore} or were last published
+        before C{lastPublishedBefore}.
+        """
+        items = []
+        for key in self.keys():
+            item = self.getItem(key)
+            if not item:
+                continue
+            if item['originallyPublished'] <= originallyPublishedBefore or item['lastPublished'] <= lastPublishedBefore:
+                items.append(item)
+        return items
+
+    def expireItems(self, now, keepKeys=()):
+        """
+        Remove all items which expiration time passed and return list of their keys.
+        """
+        expired = []
+        for key in self.keys():
+            if key in keepKeys:
+                continue
+            item = self.getItem(key)
+            if not item:
+                continue
+            if item.get('expireSeconds') and item.get('originallyPublished'):
+                if now - item['originallyPublished'] > item['expireSeconds']:
+                    expired.append(key)
+        self.removeItems(expired)
+        return expired
+
+    def removeItems(self, keys):
+        """
+        Delete all of the specified keys.
+        """
+        for key in keys:
+            del self[key]
 
 
 class DictDataStore(DataStore):
@@ -202,6 +239,10 @@ class DictDataStore(DataStore):
 class SQLiteVersionedJsonDataStore(DataStore):
     """
     SQLite database-based datastore.
+
+    Records are unique by key, there is also an index on the expiration time
+    and on publishing times, so expire and republish procedures do not need
+    to scan the whole table.
     """
 
     def __init__(self, dbFile=':memory:'):
@@ -211,22 +252,21 @@ class SQLiteVersionedJsonDataStore(DataStore):
         @type dbFile: str
         """
         self.dbFile = dbFile
-        createDB = not os.path.exists(dbFile)
         if _Debug:
-            print('[DHT DB] dbFile=%r   createDB=%r' % (dbFile, createDB, ))
+            print('[DHT DB] dbFile=%r' % dbFile)
         self._db = sqlite3.connect(dbFile)
         self._db.isolation_level = None
         self._db.text_factory = encoding.to_text
-        if createDB:
-            self.create_table()
-            if _Debug:
-                print('[DHT DB]  Created empty table for DHT records')
+        if dbFile != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
         self._cursor = self._db.cursor()
+        self.create_table()
 
     def _dbQuery(self, key, columnName):
         try:
             self._cursor.execute("SELECT %s FROM data WHERE key=:reqKey" % columnName, {
-                'reqKey': key,
+                'reqKey': encoding.to_text(key),
             })
             row = self._cursor.fetchone()
             value = row[0]
@@ -235,6 +275,26 @@ class SQLiteVersionedJsonDataStore(DataStore):
         else:
             return value
 
+    def _rowToItem(self, row):
+        v = row[1]
+        if isinstance(v, buffer):
+            v = encoding.to_text(v)
+
+        v = json.loads(v)
+
+        # TODO: check / verify v['k'] against key_hex
+        # TODO: check / verify v['v'] against PROTOCOL_VERSION
+
+        return dict(
+            key=row[0],
+            value=v['d'],
+            lastPublished=row[2],
+            originallyPublished=row[3],
+            originalPublisherID=row[4] or None,
+            expireSeconds=row[5],
+            revision=row[6],
+        )
+
     def __getitem__(self, key):
         v = self._dbQuery(key, 'value')
         v = json.loads(v)
@@ -242,11 +302,45 @@ class SQLiteVersionedJsonDataStore(DataStore):
 
     def __delitem__(self, key):
         self._cursor.execute("DELETE FROM data WHERE key=:reqKey", {
-            'reqKey': key,
+            'reqKey': encoding.to_text(key),
+        })
+
+    def __contains__(self, key):
+        self._cursor.execute("SELECT 1 FROM data WHERE key=:reqKey", {
+            'reqKey': encoding.to_text(key),
         })
+        return self._cursor.fetchone() is not None
+
+    def __len__(self):
+        self._cursor.execute("SELECT COUNT(*) FROM data")
+        return self._cursor.fetchone()[0]
 
     def create_table(self):
-        self._db.execute('CREATE TABLE data(key, value, lastPublished, originallyPublished, originalPublisherID, expireSeconds, revision)')
+        """
+        Creates the table and indexes if they are not exist yet and migrates
+        a database created with the old schema, where records were not indexed at all.
+        """
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(data)')]
+        if columns and 'expireTime' in columns:
+            return
+        self._db.execute('BEGIN')
+        try:
+            if columns:
+                self._db.execute('ALTER TABLE data RENAME TO data_old')
+            self._db.execute(_CreateTableSQL)
+            if columns:
+                # if for some reason the key was stored twice, the latest record wins
+                self._db.execute('INSERT OR REPLACE INTO data(%s, expireTime) SELECT %s, %s FROM data_old ORDER BY rowid' % (
+                    _Columns, _Columns, _ExpireTimeSQL, ))
+                self._db.execute('DROP TABLE data_old')
+            for sql in _CreateIndexesSQL:
+                self._db.execute(sql)
+            self._db.execute('COMMIT')
+        except:
+            self._db.execute('ROLLBACK')
+            raise
+        if _Debug:
+            print('[DHT DB] %r created table for DHT records, migrated=%r' % (self.dbFile, bool(columns), ))
 
     def keys(self):
         """
@@ -309,12 +403,11 @@ class SQLiteVersionedJsonDataStore(DataStore):
                 **kwargs):
         key_hex = encoding.to_text(key)
         new_revision = kwargs.get('revision', None)
-        if new_revision is None:
-            new_revision = self.revision(key) + 1
-        self._cursor.execute("select key from data where key=:reqKey", {'reqKey': key_hex})
         opID = originalPublisherID or None
-        if self._cursor.fetchone() is None:
-            self._cursor.execute('INSERT INTO data(key, value, lastPublished, originallyPublished, originalPublisherID, expireSeconds, revision) VALUES (?, ?, ?, ?, ?, ?, ?)', (
+        # single statement: if revision is not given the next one is taken from the existing record
+        self._cursor.execute(
+            'INSERT OR REPLACE INTO data(%s, expireTime) VALUES (?, ?, ?, ?, ?, ?, '
+            'COALESCE(?, (SELECT revision FROM data WHERE key=?) + 1, 1), ?)' % _Columns, (
                 key_hex,
                 json.dumps({'k': key_hex, 'd': value, 'v': PROTOCOL_VERSION, }, ),
                 lastPublished,
@@ -322,92 +415,83 @@ class SQLiteVersionedJsonDataStore(DataStore):
                 opID,
                 expireSeconds,
                 new_revision,
-            ))
-            if _Debug:
-                print('[DHT DB] %r setItem  stored new value for key [%s] with revision %d' % (self.dbFile, key, new_revision))
-        else:
-            self._cursor.execute('UPDATE data SET value=?, lastPublished=?, originallyPublished=?, originalPublisherID=?, expireSeconds=?, revision=? WHERE key=?', (
-                json.dumps({'k': key_hex, 'd': value, 'v': PROTOCOL_VERSION, }, ),
-                lastPublished,
-                originallyPublished,
-                opID,
-                expireSeconds,
-                new_revision,
                 key_hex,
+                (originallyPublished + expireSeconds) if (originallyPublished and expireSeconds) else None,
             ))
-            if _Debug:
-                print('[DHT DB] %r setItem  updated existing value for key [%s] with revision %d' % (self.dbFile, key, new_revision))
+        if _Debug:
+            print('[DHT DB] %r setItem  stored value for key [%s] with revision %r' % (self.dbFile, key, new_revision))
 
     def getItem(self, key):
-        key_hex = key
         key_hex = encoding.to_text(key)
-        self._cursor.execute("SELECT * FROM data WHERE key=:reqKey", {
+        self._cursor.execute("SELECT %s FROM data WHERE key=:reqKey" % _Columns, {
             'reqKey': key_hex,
         })
 
         row = self._cursor.fetchone()
         if not row:
             if _Debug:
-                print('[DHT DB] %r getItem [%s]  return None : did not found key in dataStore' % (self.dbfile, key))
+                print('[DHT DB] %r getItem [%s]  return None : did not found key in dataStore' % (self.dbFile, key))
             return None
 
-        v = row[1]
-        if isinstance(v, buffer):
-            v = encoding.to_text(v)
-
-        v = json.loads(v)
-        
-        # TODO: check / verify v['k'] against key_hex
-        # TODO: check / verify v['v'] against PROTOCOL_VERSION
-
-        value = v['d']
-
-        key_orig = row[0]
-
-        # TODO: check / verify key_orig against key
-
-        opID = row[4] or None
-
-        result = dict(
-            key=key_orig,
-            value=value,
-            lastPublished=row[2],
-            originallyPublished=row[3],
-            originalPublisherID=opID,
-            expireSeconds=row[5],
-            revision=row[6],
-        )
+        result = self._rowToItem(row)
 
         if _Debug:
             print('[DHT DB] %r getItem   found one record for key [%s], revision is %d' % (self.dbFile, key, row[6]))
         return result
 
     def getAllItems(self):
-        self._cursor.execute("SELECT * FROM data")
-        rows = self._cursor.fetchall()
+        self._cursor.execute("SELECT %s FROM data" % _Columns)
         items = []
-        for row in rows:
+        for row in self._cursor.fetchall():
+            item = self._rowToItem(row)
+            item.pop('key')
+            items.append(item)
+        return items
 
-            v = row[1]
-            if isinstance(v, buffer):
-                v = encoding.to_text(v)
+    def getRepublishItems(self, originallyPublishedBefore, lastPublishedBefore):
+        self._cursor.execute("SELECT %s FROM data WHERE originallyPublished<=? OR lastPublished<=?" % _Columns, (
+            originallyPublishedBefore,
+            lastPublishedBefore,
+        ))
+        return [self._rowToItem(row) for row in self._cursor.fetchall()]
 
-            v = json.loads(v)
-            
-            # TODO: check / verify v['k'] against key_hex
-            # TODO: check / verify v['v'] against PROTOCOL_VERSION
-    
-            value = v['d']
+    def expireItems(self, now, keepKeys=()):
+        keep = [encoding.to_text(k) for k in keepKeys]
+        self._db.execute('BEGIN')
+        try:
+            self._cursor.execute("SELECT key FROM data WHERE expireTime<?", (now, ))
+            expired = [row[0] for row in self._cursor.fetchall() if row[0] not in keep]
+            self._cursor.executemany("DELETE FROM data WHERE key=?", [(k, ) for k in expired])
+            self._db.execute('COMMIT')
+        except:
+            self._db.execute('ROLLBACK')
+            raise
+        return expired
+
+    def removeItems(self, keys):
+        if not keys:
+            return
+        self._db.execute('BEGIN')
+        try:
+            self._cursor.executemany("DELETE FROM data WHERE key=?", [(encoding.to_text(k), ) for k in keys])
+            self._db.execute('COMMIT')
+        except:
+            self._db.execute('ROLLBACK')
+            raise
 
-            _k = row[0]
-            _opID = row[4] or None
 
-            items.append(dict(
-                value=value,
-                lastPublished=row[2],
-                originallyPublished=row[3],
-                originalPublisherID=_opID,
-                expireSeconds=row[5],
-                revision=row[6],
-            ))
-        return items
+_Columns = 'key, value, lastPublished, originallyPublished, originalPublisherID, expireSeconds, revision'
+
+_ExpireTimeSQL = 'CASE WHEN originallyPublished AND expireSeconds THEN originallyPublished + expireSeconds ELSE NULL END'
+
+_CreateTableSQL = (
+    'CREATE TABLE data('
+    'key TEXT PRIMARY KEY, value, lastPublished INTEGER, originallyPublished INTEGER, '
+    'originalPublisherID, expireSeconds INTEGER, revision INTEGER, expireTime INTEGER)'
+)
+
+_CreateIndexesSQL = (
+    'CREATE INDEX IF NOT EXISTS data_expire_time ON data(expireTime)',
+    'CREATE INDEX IF NOT EXISTS data_originally_published ON data(originallyPublished)',
+    'CREATE INDEX IF NOT EXISTS data_last_published ON data(lastPublished)',
+)
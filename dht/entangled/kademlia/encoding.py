@@ -156,42 +156,10 @@ class Bencode(Encoding):
         @return: The encoded data
         @rtype: str
         """
-        
-        def _e():
-            if data is None:
-                return b'i0e'  # return 0
-            elif type(data) in six.integer_types:
-                return b'i%de' % data
-            elif isinstance(data, six.text_type):
-                return b'%d:%s' % (len(data), data.encode(encoding=encoding))
-            elif isinstance(data, six.binary_type):
-                return b'%d:%s' % (len(data), data)
-            elif type(data) in (list, tuple):
-                encodedListItems = b''
-                for item in data:
-                    encodedListItems += self.encode(item)
-                return b'l%se' % encodedListItems
-            elif isinstance(data, dict):
-                encodedDictItems = b''
-                _d = {}
-                for k, v in data.items():
-                    e_key = self.encode(k)
-                    _d[e_key] = v
-                # _d = {(k.encode() if k and isinstance(k, six.text_type) else k) : v for k, v in data.items()}
-                keys = sorted(_d.keys())
-                for e_key in keys:
-                    e_data = self.encode(_d[e_key])
-                    encodedDictItems += e_key
-                    encodedDictItems += e_data
-                return b'd%se' % encodedDictItems
-            elif isinstance(data, float):
-                # This (float data type) is a non-standard extension to the original Bencode algorithm
-                return b'f%fe' % data
-            else:
-                raise TypeError("Cannot bencode '%s' object" % type(data))
-
         try:
-            ret = _e()
+            chunks = []
+            _encodeRecursive(data, chunks.append, encoding)
+            ret = b''.join(chunks)
             if _Debug:
                 print('[DHT ENCODING]         encode  %r  into  %d bytes' % (type(data), len(ret), ))
             return ret
@@ -199,8 +167,6 @@ class Bencode(Encoding):
             if _Debug:
                 print('[DHT ENCODING]         encode failed with: %r' % exc)
 
-
-
     def decode(self, data, encoding=None):
         """
         Decoder implementation of the Bencode algorithm.
@@ -215,7 +181,9 @@ class Bencode(Encoding):
         @rtype:  int, list, dict or str
         """
         try:
-            ret, endPos = self._decodeRecursive(data, encoding=encoding)
+            if not isinstance(data, binary_type):
+                data = binary_type(data)
+            ret, endPos = _decodeRecursive(data, 0, encoding)
             if _Debug:
                 print('[DHT ENCODING]         decode %r  endPos=%d' % (type(ret), endPos, ))
             return ret
@@ -223,7 +191,6 @@ class Bencode(Encoding):
             if _Debug:
                 print('[DHT ENCODING]         decode failed with: %r' % exc)
 
-
     @staticmethod
     def _decodeRecursive(data, startIndex=0, encoding=None):
         """
@@ -231,34 +198,92 @@ class Bencode(Encoding):
 
         Do not call this; use C{decode()} instead
         """
-        if data[startIndex:startIndex+1] == b'i':
-            endPos = data[startIndex:].find(b'e') + startIndex
-            return (int(to_text(data[startIndex + 1:endPos]) or '0'), endPos + 1)
-        elif data[startIndex:startIndex+1] == b'l':
-            startIndex += 1
-            decodedList = []
-            while data[startIndex:startIndex+1] != b'e':
-                listData, startIndex = Bencode._decodeRecursive(data, startIndex, encoding=encoding)
-                decodedList.append(listData)
-            return (decodedList, startIndex + 1)
-        elif data[startIndex:startIndex+1] == b'd':
-            startIndex += 1
-            decodedDict = {}
-            while data[startIndex:startIndex+1] != b'e':
-                key, startIndex = Bencode._decodeRecursive(data, startIndex, encoding=encoding)
-                value, startIndex = Bencode._decodeRecursive(data, startIndex, encoding=encoding)
-                decodedDict[key] = value
-            return (decodedDict, startIndex)
-        elif data[startIndex:startIndex+1] == b'f':
-            # This (float data type) is a non-standard extension to the original Bencode algorithm
-            endPos = data[startIndex:].find(b'e') + startIndex
-            return (float(to_text(data[startIndex + 1:endPos]) or '0'), endPos + 1)
-        else:
-            splitPos = data[startIndex:].find(b':') + startIndex
-            length = int(to_text(data[startIndex:splitPos]) or '0')
-            startIndex = splitPos + 1
-            endPos = startIndex + length
-            byts = data[startIndex:endPos]
-            if encoding:
-                byts = byts.decode(encoding=encoding)
-            return (byts, endPos)
+        return _decodeRecursive(data, startIndex, encoding)
+
+
+def _encodeRecursive(data, append, encoding):
+    """
+    Encodes C{data} and passes all pieces to C{append()}, so the result is
+    joined only once at the end instead of being copied on every level.
+    """
+    t = type(data)
+    if t is text_type:
+        byts = data.encode(encoding)
+        append(b'%d:%s' % (len(byts), byts))
+    elif t is binary_type:
+        append(b'%d:%s' % (len(data), data))
+    elif t in six.integer_types:
+        append(b'i%de' % data)
+    elif t is list or t is tuple:
+        append(b'l')
+        for item in data:
+            _encodeRecursive(item, append, encoding)
+        append(b'e')
+    elif isinstance(data, dict):
+        # keys are sorted by their encoded form
+        encodedItems = {}
+        for k, v in data.items():
+            keyChunks = []
+            _encodeRecursive(k, keyChunks.append, encoding)
+            encodedItems[b''.join(keyChunks)] = v
+        append(b'd')
+        for e_key in sorted(encodedItems.keys()):
+            append(e_key)
+            _encodeRecursive(encodedItems[e_key], append, encoding)
+        append(b'e')
+    elif data is None:
+        append(b'i0e')  # encode as 0
+    elif isinstance(data, text_type):
+        byts = data.encode(encoding)
+        append(b'%d:%s' % (len(byts), byts))
+    elif isinstance(data, binary_type):
+        append(b'%d:%s' % (len(data), data))
+    elif isinstance(data, float):
+        # This (float data type) is a non-standard extension to the original Bencode algorithm
+        append(b'f%fe' % data)
+    else:
+        raise TypeError("Cannot bencode '%s' object" % type(data))
+
+
+def _decodeRecursive(data, startIndex, encoding):
+    """
+    Decodes one value starting at C{startIndex} and returns it together with
+    the position right after it. All lookups are done by offset in the
+    original C{data}, so nothing is copied except decoded strings and numbers.
+    """
+    marker = data[startIndex:startIndex + 1]
+    if marker == b'l':
+        startIndex += 1
+        decodedList = []
+        while data[startIndex:startIndex + 1] != b'e':
+            listData, startIndex = _decodeRecursive(data, startIndex, encoding)
+            decodedList.append(listData)
+        return (decodedList, startIndex + 1)
+    if marker == b'd':
+        startIndex += 1
+        decodedDict = {}
+        while data[startIndex:startIndex + 1] != b'e':
+            key, startIndex = _decodeRecursive(data, startIndex, encoding)
+            value, startIndex = _decodeRecursive(data, startIndex, encoding)
+            decodedDict[key] = value
+        return (decodedDict, startIndex + 1)
+    if marker == b'i' or marker == b'f':
+        endPos = data.find(b'e', startIndex + 1)
+        if endPos < 0:
+            raise ValueError('value at position %d is not terminated' % startIndex)
+        byts = data[startIndex + 1:endPos]
+        if marker == b'i':
+            return (int(byts) if byts else 0, endPos + 1)
+        # This (float data type) is a non-standard extension to the original Bencode algorithm
+        return (float(byts) if byts else 0.0, endPos + 1)
+    # end of data is also detected here: there is no ':' anymore
+    splitPos = data.find(b':', startIndex)
+    if splitPos < 0:
+        raise ValueError('string length at position %d is not terminated' % startIndex)
+    endPos = splitPos + 1 + int(data[startIndex:splitPos] or b'0')
+    if endPos <= splitPos or endPos > len(data):
+        raise ValueError('string at position %d is out of range' % startIndex)
+    byts = data[splitPos + 1:endPos]
+    if encoding:
+        byts = byts.decode(encoding)
+    return (byts, endPos)
@@ -987,15 +987,16 @@ class Node(object):
         if _Debug:
             print('[DHT NODE]  SINGLE republishData called, node: %r' % self.id)
         expiredKeys = []
-        for key in self._dataStore.keys():
+        now = int(time.time())
+        # only records which need to be republished or expired are selected here
+        for itemData in self._dataStore.getRepublishItems(now - constants.dataExpireTimeout, now - constants.replicateInterval):
+            key = itemData['key']
             if _Debug:
                 print('[DHT NODE]  SINGLE    %r' % key)
             # Filter internal variables stored in the datastore
             if key == 'nodeState':
                 continue
-            
-            now = int(time.time())
-            itemData = self._dataStore.getItem(key)
+
             originallyPublished = itemData['originallyPublished']
             originalPublisherID = itemData['originalPublisherID']
             lastPublished = itemData['lastPublished']
@@ -1024,13 +1025,12 @@ class Node(object):
                     twisted.internet.reactor.callFromThread(  # @UndefinedVariable
                         self.iterativeStore,
                         key=key,
-                        value=self._dataStore[key],
+                        value=itemData['value'],
                         originalPublisherID=originalPublisherID,
                         age=age,
                         expireSeconds=expireSeconds,
                     )
-        for key in expiredKeys:
-            del self._dataStore[key]
+        self._dataStore.removeItems(expiredKeys)
 
 
 class MultiLayerNode(Node):
@@ -1827,15 +1827,16 @@ class MultiLayerNode(Node):
         if _Debug:
             print('[DHT NODE]    republishData called, node: %r' % self.layers[layerID])
         expiredKeys = []
-        for key in self._dataStores[layerID].keys():
+        now = int(time.time())
+        # only records which need to be republished or expired are selected here
+        for itemData in self._dataStores[layerID].getRepublishItems(now - constants.dataExpireTimeout, now - constants.replicateInterval):
+            key = itemData['key']
             if _Debug:
                 print('[DHT NODE]        %r' % key)
             # Filter internal variables stored in the datastore
             if key == 'nodeState':
                 continue
-            
-            now = int(time.time())
-            itemData = self._dataStores[layerID].getItem(key)
+
             originallyPublished = itemData['originallyPublished']
             originalPublisherID = itemData['originalPublisherID']
             lastPublished = itemData['lastPublished']
@@ -1865,14 +1866,13 @@ class MultiLayerNode(Node):
                     twisted.internet.reactor.callFromThread(  # @UndefinedVariable
                         self.iterativeStore,
                         key=key,
-                        value=self._dataStore[key],
+                        value=itemData['value'],
                         originalPublisherID=originalPublisherID,
                         age=age,
                         expireSeconds=expireSeconds,
                         layerID=layerID,
                     )
-        for key in expiredKeys:
-            del self._dataStores[layerID][key]
+        self._dataStores[layerID].removeItems(expiredKeys)
 
 
 
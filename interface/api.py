@@ -2831,6 +2831,93 @@ def automats_list():
         lg.out(_DebugLevel, 'api.automats_list responded with %d items' % len(result))
     return RESULT(result)
 
+
+def automats_trace_start(capacity=None):
+    """
+    Starts recording of all events processed by state machines into a ring buffer in memory.
+    Only the most recent ``capacity`` events are kept.
+    """
+    from automats import automat
+    if not automat.StartEventTrace(capacity=int(capacity) if capacity else None):
+        return ERROR('events trace already started')
+    return OK(message='events trace started')
+
+
+def automats_trace_stop(dump=True):
+    """
+    Stops recording of state machines events, by default recorded events are saved to a binary file.
+    """
+    from automats import automat
+    from main import settings
+    trace = automat.StopEventTrace()
+    if trace is None:
+        return ERROR('events trace was not started')
+    result = {'records': len(trace), }
+    if dump:
+        result['filename'] = settings.AutomatsEventTraceFilename()
+        trace.dump(result['filename'])
+    return OK(result, message='events trace stopped')
+
+
+def automats_trace_dump(filename=None):
+    """
+    Saves all recorded state machines events to a binary file, recording is not stopped.
+    """
+    from automats import automat
+    from main import settings
+    trace = automat.GetEventTrace()
+    if trace is None:
+        return ERROR('events trace is not started')
+    filename = filename or settings.AutomatsEventTraceFilename()
+    return OK({'records': trace.dump(filename), 'filename': filename, })
+
+
+def automats_trace_stats(top=10, filename=None):
+    """
+    Returns events rates per state machine and the slowest transitions from the running events trace,
+    or from the file if ``filename`` is given.
+
+    Return:
+
+        {'status': 'OK',
+         'result': {
+            'records': 2,
+            'total': 2,
+            'capacity': 100000,
+            'period': 1.0,
+            'automats': {
+                'network_connector': {
+                    'events': 2,
+                    'instances': 1,
+                    'events_per_sec': 2.0,
+                    'total_duration': 0.0012,
+                    'max_duration': 0.001
+                }
+            },
+            'slowest': [{
+                'time': 1600000000.12,
+                'index': 5,
+                'name': 'network_connector',
+                'event': 'reconnect',
+                'old_state': 'CONNECTED',
+                'new_state': 'UPNP',
+                'duration': 0.001
+            }]
+        }}
+    """
+    from automats import automat
+    from automats import event_trace
+    if filename:
+        try:
+            trace = event_trace.load(filename)
+        except Exception as exc:
+            return ERROR(exc)
+    else:
+        trace = automat.GetEventTrace()
+        if trace is None:
+            return ERROR('events trace is not started')
+    return OK(trace.stats(top=int(top)))
+
 #------------------------------------------------------------------------------
 
 
@@ -3031,14 +3118,38 @@ def packets_stats():
                 'total_packets': 0,
                 'unknown_bytes': 0,
                 'unknown_packets': 0
+            },
+            'timeouts': {
+                'pending': 12,
+                'fired': 3,
+                'last_fired': 1,
+                'cancelled': 140,
+                'registered': 155,
+                'max_late': 0.004,
+                'heap_size': 20,
+                'next_deadline': 2.51
+            },
+            'verifier': {
+                'queued': 1520,
+                'verified': 1518,
+                'not_valid': 2,
+                'batches': 97,
+                'max_batch': 32,
+                'pending': 0,
+                'batches_in_progress': 0,
+                'running': True
         }}]}
     """
     if not driver.is_on('service_gateway'):
         return ERROR('service_gateway() is not started')
     from p2p import p2p_stats
+    from transport import timeouts
+    from crypt import verifier
     return OK({
         'in': p2p_stats.counters_in(),
         'out': p2p_stats.counters_out(),
+        'timeouts': timeouts.counters(),
+        'verifier': verifier.counters(),
     })
 
 
@@ -3105,6 +3216,7 @@ def transfers_list():
             'incoming': [],
         }
         q = io_throttle.throttle().GetSupplierQueue(supplier_idurl)
+        r['sending'] = q.GetSendingStats()
         for packet_id in q.ListSendItems():
             i = q.GetSendItem(packet_id)
             if i:
@@ -3134,6 +3246,17 @@ def transfers_list():
         result.append(r)
     return RESULT(result)
 
+
+def raid_stats():
+    """
+    Returns state of the raid tasks queue: number of pending and running tasks
+    and also count, processing and waiting times of finished tasks per command.
+    """
+    from raid import raid_worker
+    if not raid_worker.A():
+        return ERROR('raid_worker() is not started')
+    return OK(raid_worker.counters())
+
 #------------------------------------------------------------------------------
 
 def connections_list(wanted_protos=None):
@@ -4440,4 +4563,15 @@ def dht_local_db_dump():
     from dht import dht_service
     return RESULT(dht_service.dump_local_db(value_as_json=True))
 
+
+def dht_cache_stats():
+    """
+    Returns statistics of the local cache of DHT records per layer:
+    number of records, hits, misses and hit ratio.
+    """
+    if not driver.is_on('service_entangled_dht'):
+        return ERROR('service_entangled_dht() is not started')
+    from dht import dht_cache
+    return OK({strng.to_text(layer_id): stats for layer_id, stats in dht_cache.counters().items()})
+
 #------------------------------------------------------------------------------
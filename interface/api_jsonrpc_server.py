@@ -315,6 +315,18 @@ class BitDustJsonRPCServer(JSONRPCServer):
     def jsonrpc_automats_list(self):
         return api.automats_list()
 
+    def jsonrpc_automats_trace_start(self, capacity=None):
+        return api.automats_trace_start(capacity=capacity)
+
+    def jsonrpc_automats_trace_stop(self, dump=True):
+        return api.automats_trace_stop(dump=dump)
+
+    def jsonrpc_automats_trace_dump(self, filename=None):
+        return api.automats_trace_dump(filename=filename)
+
+    def jsonrpc_automats_trace_stats(self, top=10, filename=None):
+        return api.automats_trace_stats(top=top, filename=filename)
+
     def jsonrpc_services_list(self):
         return api.services_list()
 
@@ -345,6 +357,9 @@ class BitDustJsonRPCServer(JSONRPCServer):
     def jsonrpc_transfers_list(self):
         return api.transfers_list()
 
+    def jsonrpc_raid_stats(self):
+        return api.raid_stats()
+
     def jsonrpc_queue_list(self):
         return api.queue_list()
 
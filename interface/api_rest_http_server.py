@@ -1027,6 +1027,28 @@ class BitDustRESTHTTPServer(JsonAPIResource):
     def automat_list_v1(self, request):
         return api.automats_list()
 
+    @POST('^/automat/trace/start/v1$')
+    def automat_trace_start_v1(self, request):
+        data = _request_data(request)
+        return api.automats_trace_start(capacity=data.get('capacity', None))
+
+    @POST('^/automat/trace/stop/v1$')
+    def automat_trace_stop_v1(self, request):
+        data = _request_data(request)
+        return api.automats_trace_stop(dump=bool(data.get('dump', True)))
+
+    @POST('^/automat/trace/dump/v1$')
+    def automat_trace_dump_v1(self, request):
+        data = _request_data(request)
+        return api.automats_trace_dump(filename=data.get('filename', None))
+
+    @GET('^/automat/trace/stats/v1$')
+    def automat_trace_stats_v1(self, request):
+        return api.automats_trace_stats(
+            top=int(_request_arg(request, 'top', 10)),
+            filename=_request_arg(request, 'filename', None),
+        )
+
     #------------------------------------------------------------------------------
 
     @GET('^/svc/l$')
@@ -1088,6 +1110,12 @@ class BitDustRESTHTTPServer(JsonAPIResource):
     def transfers_list_v1(self, request):
         return api.transfers_list()
 
+    @GET('^/rd/s$')
+    @GET('^/v1/raid/stats$')
+    @GET('^/raid/stats/v1$')
+    def raid_stats_v1(self, request):
+        return api.raid_stats()
+
     #------------------------------------------------------------------------------
 
     @GET('^/con/l$')
@@ -1246,6 +1274,12 @@ class BitDustRESTHTTPServer(JsonAPIResource):
     def dht_db_dump_v1(self, request):
         return api.dht_local_db_dump()
 
+    @GET('^/d/c/s$')
+    @GET('^/v1/dht/cache/stats$')
+    @GET('^/dht/cache/stats/v1$')
+    def dht_cache_stats_v1(self, request):
+        return api.dht_cache_stats()
+
     #------------------------------------------------------------------------------
 
     @ALL('^/*')
@@ -1010,6 +1010,16 @@ def cmd_automats(opts, args, overDict):
         tpl = jsontemplate.Template(templ.TPL_AUTOMATS)
         return call_jsonrpc_method_template_and_stop('automats_list', tpl)
         # return call_rest_http_method_and_stop('/automat/list/v1')
+    if len(args) >= 3 and args[1] == 'trace':
+        tpl = jsontemplate.Template(templ.TPL_RAW)
+        if args[2] == 'start':
+            return call_jsonrpc_method_template_and_stop('automats_trace_start', tpl, *args[3:4])
+        if args[2] == 'stop':
+            return call_jsonrpc_method_template_and_stop('automats_trace_stop', tpl)
+        if args[2] == 'dump':
+            return call_jsonrpc_method_template_and_stop('automats_trace_dump', tpl, *args[3:4])
+        if args[2] == 'stats':
+            return call_jsonrpc_method_template_and_stop('automats_trace_stats', tpl, *args[3:5])
 #     if len(args) == 2 and args[1] in ['log', 'monitor', 'watch',]:\
 #         reactor.
 #         reactor.run()  # @UndefinedVariable
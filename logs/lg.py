@@ -37,7 +37,9 @@ import six
 import os
 import sys
 import time
+import atexit
 import threading
+import collections
 import traceback
 import platform
 from io import open
@@ -65,6 +67,10 @@ _TimePush = 0.0
 _TimeTotalDict = {}
 _TimeDeltaDict = {}
 _TimeCountsDict = {}
+_TimeStringCache = (None, None)
+_LogWriter = None
+_LogWriterLock = threading.Lock()
+_LogFlushInterval = 0.5
 
 #------------------------------------------------------------------------------
 
@@ -100,12 +106,15 @@ def out(level, msg, nl='\n', log_name='main', showtime=False):
     global _UseColors
     global _GlobalDebugLevel
     global _AllLogFiles
-    s = msg
-    s_ = s
     if level < 0:
         level = 0
     if level % 2:
         level -= 1
+    if _GlobalDebugLevel < level and _WebStreamFunc is None:
+        # nothing is going to be printed, return as fast as possible
+        return None
+    s = msg
+    s_ = s
     if level:
         s = ' ' * level + s
     if _IsAndroid is None:
@@ -113,7 +122,7 @@ def out(level, msg, nl='\n', log_name='main', showtime=False):
     # if _IsAndroid and not _InterceptedLogFile:
     #     open_intercepted_log_file('/storage/emulated/0/.bitdust/logs/android_%d.log' % int(time.time()))
     if ( _ShowTime and level > 0 ) or showtime:
-        tm_string = time.strftime('%H:%M:%S')
+        tm_string = _time_string()
         if _LifeBeginsTime != 0:
             dt = time.time() - _LifeBeginsTime
             mn = dt // 60
@@ -134,8 +143,7 @@ def out(level, msg, nl='\n', log_name='main', showtime=False):
         s = s + ' {%s}' % currentThreadName.lower()
     if _InterceptedLogFile:
         if is_debug(level):
-            _InterceptedLogFile.write(log_name + ': ' + s + nl)
-            _InterceptedLogFile.flush()
+            _write(_InterceptedLogFile, log_name + ': ' + s + nl, level)
         return
     if not _LogsEnabled:
         return
@@ -149,8 +157,7 @@ def out(level, msg, nl='\n', log_name='main', showtime=False):
                 else:
                     if not isinstance(o, unicode):  # @UndefinedVariable
                         o = o.decode('utf-8')
-                _LogFile.write(o)
-                _LogFile.flush()
+                _write(_LogFile, o, level)
         else:
             if _LogFileName:
                 if log_name not in _AllLogFiles:
@@ -165,8 +172,7 @@ def out(level, msg, nl='\n', log_name='main', showtime=False):
                 else:
                     if not isinstance(o, unicode):  # @UndefinedVariable
                         o = o.decode('utf-8')
-                _AllLogFiles[log_name].write(o)
-                _AllLogFiles[log_name].flush()
+                _write(_AllLogFiles[log_name], o, level)
         if not _RedirectStdOut and not _NoOutput:
             if log_name == 'main':
                 s = s + nl
@@ -186,7 +192,40 @@ def out(level, msg, nl='\n', log_name='main', showtime=False):
     return None
 
 
+def _is_muted(level):
+    """
+    Same check as ``out()`` does, but it is done before the message is built.
+    """
+    return _WebStreamFunc is None and _GlobalDebugLevel < level - level % 2
+
+
+def _time_string():
+    global _TimeStringCache
+    now = int(time.time())
+    if _TimeStringCache[0] != now:
+        _TimeStringCache = (now, time.strftime('%H:%M:%S', time.localtime(now)))
+    return _TimeStringCache[1]
+
+
+def _write(fileobj, text, level):
+    if _LogWriter is None:
+        fileobj.write(text)
+        fileobj.flush()
+        return
+    _LogWriter.pending.append((fileobj, text, ))
+    if level == 0:
+        # most important messages must not be lost if the process dies
+        _LogWriter.write_pending()
+
+
 def dbg(level, message, *args, **kwargs):
+    """
+    If ``args`` are given the ``message`` is formatted with them, but only if it is going to be printed.
+    """
+    if _is_muted(level):
+        return None
+    if args:
+        message = message % args
     cod = sys._getframe().f_back.f_code
     modul = os.path.basename(cod.co_filename).replace('.py', '')
     caller = cod.co_name
@@ -197,6 +236,8 @@ def dbg(level, message, *args, **kwargs):
 
 
 def args(level, *args, **kwargs):
+    if _is_muted(level):
+        return None
     cod = sys._getframe().f_back.f_code
     modul = os.path.basename(cod.co_filename).replace('.py', '')
     caller = cod.co_name
@@ -578,6 +619,8 @@ def open_log_file(filename, append_mode=False):
     except:
         _LogFile = None
         _LogFileName = None
+        return
+    start_log_writer()
 
 
 def close_log_file():
@@ -588,6 +631,7 @@ def close_log_file():
     global _AllLogFiles
     if not _LogFile:
         return
+    stop_log_writer()
     _LogFile.flush()
     _LogFile.close()
     _LogFile = None
@@ -608,6 +652,8 @@ def open_intercepted_log_file(filename):
 def close_intercepted_log_file():
     global _InterceptedLogFile
     if _InterceptedLogFile:
+        if _LogWriter:
+            _LogWriter.write_pending()
         _InterceptedLogFile.flush()
         _InterceptedLogFile.close()
         _InterceptedLogFile = None
@@ -615,6 +661,32 @@ def close_intercepted_log_file():
     return False
 
 
+def start_log_writer(flush_interval=None):
+    """
+    Starts a thread which writes all lines to the log files and flushes them periodically,
+    instead of writing and flushing every line in the calling thread.
+    """
+    global _LogWriter
+    if _LogWriter is not None:
+        return False
+    _LogWriter = LogWriterThread(flush_interval or _LogFlushInterval)
+    _LogWriter.start()
+    return True
+
+
+def stop_log_writer():
+    """
+    Writes all pending lines and stops the writer thread.
+    """
+    global _LogWriter
+    if _LogWriter is None:
+        return False
+    writer = _LogWriter
+    _LogWriter = None
+    writer.stop()
+    return True
+
+
 def log_file():
     global _LogFile
     return _LogFile
@@ -718,6 +790,49 @@ def set_weblog_func(webstreamfunc):
 #------------------------------------------------------------------------------
 
 
+class LogWriterThread(threading.Thread):
+    """
+    Collects log lines in a queue and writes them to the files in batches.
+    """
+
+    def __init__(self, flush_interval):
+        threading.Thread.__init__(self, name='log_writer')
+        self.daemon = True
+        self.flush_interval = flush_interval
+        self.pending = collections.deque()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.write_pending()
+        self.write_pending()
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(5)
+        self.write_pending()
+
+    def write_pending(self):
+        with _LogWriterLock:
+            chunks = collections.OrderedDict()
+            while self.pending:
+                fileobj, text = self.pending.popleft()
+                chunks.setdefault(fileobj, []).append(text)
+            for fileobj, lines in chunks.items():
+                try:
+                    fileobj.write(''.join(lines))
+                    fileobj.flush()
+                except:
+                    # file was closed already
+                    pass
+
+
+atexit.register(stop_log_writer)
+
+#------------------------------------------------------------------------------
+
+
 class STDOUT_redirected(object):
     """
     Emulate system STDOUT, useful to log any program output.
@@ -89,6 +89,7 @@ def reset(conf_obj):
     conf_obj.setDefaultValue('services/backups/block-size', diskspace.MakeStringFromBytes(settings.DefaultBackupBlockSize()))
     conf_obj.setDefaultValue('services/backups/max-block-size', diskspace.MakeStringFromBytes(settings.DefaultBackupMaxBlockSize()))
     conf_obj.setDefaultValue('services/backups/max-copies', '2')
+    conf_obj.setDefaultValue('services/backups/session-key-type', settings.DefaultBackupSessionKeyType())
     conf_obj.setDefaultValue('services/backups/keep-local-copies-enabled', 'true')
     conf_obj.setDefaultValue('services/backups/wait-suppliers-enabled', 'true')
 
@@ -135,6 +136,8 @@ def reset(conf_obj):
     conf_obj.setDefaultValue('services/employer/candidates', '')
 
     conf_obj.setDefaultValue('services/gateway/enabled', 'true')
+    conf_obj.setDefaultValue('services/gateway/outbox-in-memory-limit', settings.DefaultOutboxInMemoryLimit())
+    conf_obj.setDefaultValue('services/gateway/verify-threads', settings.DefaultVerifyThreads())
 
     conf_obj.setDefaultValue('services/http-connections/enabled', 'false')
     conf_obj.setDefaultValue('services/http-connections/http-port', settings.DefaultHTTPPort())
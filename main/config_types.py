@@ -105,6 +105,7 @@ def defaults():
         'services/backups/keep-local-copies-enabled': TYPE_BOOLEAN,
         'services/backups/max-block-size': TYPE_DISK_SPACE,
         'services/backups/max-copies': TYPE_POSITIVE_INTEGER,
+        'services/backups/session-key-type': TYPE_STRING,
         'services/backups/wait-suppliers-enabled': TYPE_BOOLEAN,
         'services/blockchain/enabled': TYPE_BOOLEAN,
         'services/blockchain/host': TYPE_STRING,
@@ -136,6 +137,8 @@ def defaults():
         'services/employer/enabled': TYPE_BOOLEAN,
         'services/employer/candidates': TYPE_STRING,
         'services/gateway/enabled': TYPE_BOOLEAN,
+        'services/gateway/outbox-in-memory-limit': TYPE_INTEGER,
+        'services/gateway/verify-threads': TYPE_POSITIVE_INTEGER,
         'services/http-connections/enabled': TYPE_BOOLEAN,
         'services/http-connections/http-port': TYPE_PORT_NUMBER,
         'services/http-transport/enabled': TYPE_BOOLEAN,
@@ -79,6 +79,10 @@ Commands:
   customer ping
   storage
   automat list
+  automat trace start [capacity]
+  automat trace stop
+  automat trace dump [file path]
+  automat trace stats [top] [file path]
   service list
   service <service name>
   ping <IDURL>
@@ -226,6 +230,18 @@ Commands:
 
   automat list          list all running state machines and current states
 
+  automat trace start [capacity]
+                        start recording of state machines events in memory
+
+  automat trace stop    stop recording and save events into a binary file
+
+  automat trace dump [file path]
+                        save recorded events into a binary file
+
+  automat trace stats [top] [file path]
+                        print events rates per state machine and slowest
+                        transitions, recorded events can be read from a file
+
   service list          list all registered services
 
   service <service name>
@@ -237,6 +237,13 @@ def AutomatsLog():
     return os.path.join(LogsDir(), 'automats.log')
 
 
+def AutomatsEventTraceFilename():
+    """
+    Binary trace of the events processed by state machines is saved here.
+    """
+    return os.path.join(LogsDir(), 'automats.trace')
+
+
 def TransportLog():
     """
     Every x seconds will log stats about current transfers.
@@ -363,6 +370,22 @@ def MaxPacketsOutstanding():
     return 100
 
 
+def DefaultOutboxInMemoryLimit():
+    """
+    Outgoing packets smaller than that amount of bytes are kept in memory and passed to
+    the transports directly, bigger packets are written to a temporary file in "outbox" folder.
+    """
+    return 256 * 1024
+
+
+def DefaultVerifyThreads():
+    """
+    Number of worker threads used to verify signatures of incoming packets,
+    0 means all packets are verified in the main thread.
+    """
+    return 2
+
+
 def SendingSpeedLimit():
     """
     This is lower limit during file sending in bytes per second.
@@ -554,6 +577,14 @@ def DefaultBackupMaxBlockSize():
     return 16 * 1024 * 1024  # 16 MB is fine
 
 
+def DefaultBackupSessionKeyType():
+    """
+    Backup blocks are encrypted in chunks with AES-GCM while the data is read from the source,
+    "AES" can be set to use same cipher as for all other packets.
+    """
+    return 'AESGCM'
+
+
 def MinimumBandwidthInLimitKBSec():
     """
     Not used, idea was to limit the minimum bandwidth given to BitDust.
@@ -969,6 +1000,22 @@ def LocalIdentityFilename():
     return os.path.join(MetaDataDir(), "localidentity")
 
 
+def IdentityHistoryIndexFilename():
+    """
+    Compact index of all identities stored in the ``IdentityHistoryDir()``,
+    see ``userid.id_url`` module.
+    """
+    return os.path.join(MetaDataDir(), "identityhistory")
+
+
+def IdentityCacheIndexFilename():
+    """
+    Compact index of all identities stored in the ``IdentityCacheDir()``,
+    see ``contacts.identitydb`` module.
+    """
+    return os.path.join(MetaDataDir(), "identitycache")
+
+
 def LocalIPFilename():
     """
     File contains string like "192.168.12.34" - local IP of that machine.
@@ -2307,6 +2354,13 @@ def getBackupMaxBlockSize():
     return diskspace.GetBytesFromString(getBackupMaxBlockSizeStr())
 
 
+def getBackupSessionKeyType():
+    """
+    Which crypto is used for session keys of backup blocks.
+    """
+    return config.conf().getData('services/backups/session-key-type', DefaultBackupSessionKeyType()).strip() or DefaultBackupSessionKeyType()
+
+
 def setBackupBlockSize(block_size):
     """
     Set current backup block size in the memory to have fast access.
@@ -59,7 +59,6 @@ _Debug = False
 
 import os
 import sys
-import copy
 import array
 
 #------------------------------------------------------------------------------
@@ -152,27 +151,50 @@ def do_in_memory(filename, eccmapname, version, blockNumber, targetDir, threshol
         myeccmap = raid.eccmap.eccmap(eccmapname)
         # any padding at end and block.Length fixes
         RoundupFile(filename, myeccmap.datasegments * INTSIZE)
-        wholefile = ReadBinaryFileAsArray(filename)
-        length = len(wholefile)
-        length = length * 4
-        seglength = (length + myeccmap.datasegments - 1) / myeccmap.datasegments
-
-        # dict of data segments
-        sds = {}
-        for seg_num, chunk in enumerate(raid.raidutils.chunks(wholefile, int(seglength / 4))):
-            FileName = targetDir + '/' + str(blockNumber) + '-' + str(seg_num) + '-Data'
-            with open(FileName, mode='wb') as f:
-                chunk_to_write = copy.copy(chunk)
-                chunk_to_write.byteswap()
-                sds[seg_num] = iter(chunk)
-                f.write(chunk_to_write)
+        wholefile = ReadBinaryFile(filename)
+        return do_in_memory_buffer(filename, wholefile, eccmapname, version, blockNumber, targetDir, threshold_control=threshold_control)
+
+    except:
+        logs.lg.exc()
+        return -1, -1
+
+
+def do_in_memory_buffer(task_key, data, eccmapname, version, blockNumber, targetDir, threshold_control=None):
+    """
+    Same as ``do_in_memory()``, but takes the whole block as a bytes-like object instead of a file name.
 
-        psds_list = raid.raidutils.build_parity(
+    Data segments are just slices of the given buffer, only the tail segments are copied when the padding is required.
+    Both Data and Parity segments are written in one pass. The ``task_key`` is only used to identify the task.
+    """
+    try:
+        if _Debug:
+            with open('/tmp/raid.log', 'a') as logfile:
+                logfile.write(u'make task_key=%s eccmapname=%s blockNumber=%s\n' % (repr(task_key), eccmapname, blockNumber))
+        INTSIZE = 4
+        myeccmap = raid.eccmap.eccmap(eccmapname)
+        view = memoryview(data)
+        # any padding at end and block.Length fixes, same as RoundupFile() does
+        length = len(view)
+        stepsize = myeccmap.datasegments * INTSIZE
+        if length % stepsize:
+            length += stepsize - (length % stepsize)
+        seglength = int(length / myeccmap.datasegments)
+
+        # list of data segments, all of them are just slices of the same buffer
+        sds = []
+        if seglength:
+            for seg_num in range(myeccmap.datasegments):
+                chunk = view[seg_num * seglength:(seg_num + 1) * seglength]
+                if len(chunk) < seglength:
+                    chunk = chunk.tobytes() + b' ' * (seglength - len(chunk))
+                FileName = targetDir + '/' + str(blockNumber) + '-' + str(seg_num) + '-Data'
+                with open(FileName, mode='wb') as f:
+                    f.write(chunk)
+                sds.append(chunk)
+
+        psds_list = raid.raidutils.build_parity_segments(
             sds,
-            int(seglength / INTSIZE),
-            myeccmap.datasegments,
             myeccmap,
-            myeccmap.paritysegments,
             threshold_control=threshold_control,
         )
 
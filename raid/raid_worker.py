@@ -113,11 +113,24 @@ _MODULES = (
 )
 
 _VALID_TASKS = {
-    'make': (make.do_in_memory, (make.RoundupFile, make.ReadBinaryFile, make.WriteFile, make.ReadBinaryFileAsArray, )),
+    'make': (make.do_in_memory, (make.do_in_memory_buffer, make.RoundupFile, make.ReadBinaryFile, make.WriteFile, make.ReadBinaryFileAsArray, )),
+    'make-buffer': (make.do_in_memory_buffer, ()),
     'read': (read.raidread, (read.RebuildOne, read.ReadBinaryFile, )),
     'rebuild': (rebuild.rebuild, ()),
 }
 
+# restore reads are always started first, background rebuilds go last
+_TASK_PRIORITIES = {
+    'read': 0,
+    'make': 1,
+    'make-buffer': 1,
+    'rebuild': 2,
+}
+
+#------------------------------------------------------------------------------
+
+_ThresholdReportBytes = 1024 * 1024
+
 #------------------------------------------------------------------------------
 
 _RaidWorker = None
@@ -131,6 +144,17 @@ def add_task(cmd, params, callback):
     A('new-task', (cmd, params, callback))
 
 
+def in_memory_tasks_enabled():
+    """
+    The ``make-buffer`` task takes the block as a bytes-like object, so it can be executed only
+    by threads of the main process or by the pool of worker processes from ``raid.worker``,
+    but not by ``parallelp`` child processes.
+    """
+    if bpio.Android():
+        return True
+    return not config.conf().getBool('services/rebuilding/child-processes-enabled')
+
+
 def cancel_task(cmd, first_parameter):
     if not A():
         if _Debug:
@@ -141,7 +165,10 @@ def cancel_task(cmd, first_parameter):
     for t_id, t_cmd, t_params in A().tasks:
         if cmd == t_cmd and first_parameter == t_params[0]:
             try:
-                A().tasks.remove(t_id, t_cmd, t_params)
+                A().tasks.remove((t_id, t_cmd, t_params))
+                A().queued.pop(t_id, None)
+                cb = A().callbacks.pop(t_id)
+                reactor.callLater(0, cb, t_cmd, t_params, None)  # @UndefinedVariable
                 if _Debug:
                     lg.out(_DebugLevel, 'raid_worker.cancel_task found pending task %r, canceling %r' % (t_id, first_parameter))
             except:
@@ -168,6 +195,20 @@ def cancel_task(cmd, first_parameter):
         return False
     return True
 
+
+def counters():
+    """
+    Returns current queue depth and timings of finished tasks per command.
+    """
+    if not A():
+        return {}
+    return {
+        'queued': len(A().tasks),
+        'active': len(A().activetasks),
+        'max_active': A().processor.get_ncpus() if A().processor else 0,
+        'tasks': {cmd: dict(stats) for cmd, stats in A().stats.items()},
+    }
+
 #------------------------------------------------------------------------------
 
 
@@ -213,6 +254,9 @@ class RaidWorker(automat.Automat):
         self.activetasks = {}
         self.processor = None
         self.callbacks = {}
+        self.queued = {}
+        self.started = {}
+        self.stats = {}
 
     def A(self, event, *args, **kwargs):
         #---AT_STARTUP---
@@ -293,6 +337,29 @@ class RaidWorker(automat.Automat):
         """
         task_id, cmd, params, result = args[0]
         self.activetasks.pop(task_id)
+        queued_time = self.queued.pop(task_id, None)
+        started_time = self.started.pop(task_id, None)
+        if started_time is None:
+            return
+        process_time = time.time() - started_time
+        wait_time = (started_time - queued_time) if queued_time else 0.0
+        if cmd not in self.stats:
+            self.stats[cmd] = {
+                'count': 0,
+                'failed': 0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+                'last_time': 0.0,
+                'total_wait_time': 0.0,
+            }
+        cmd_stats = self.stats[cmd]
+        cmd_stats['count'] += 1
+        if result is None or result == (-1, -1):
+            cmd_stats['failed'] += 1
+        cmd_stats['total_time'] += process_time
+        cmd_stats['max_time'] = max(cmd_stats['max_time'], process_time)
+        cmd_stats['last_time'] = process_time
+        cmd_stats['total_wait_time'] += wait_time
 
     def doInit(self, *args, **kwargs):
         """
@@ -304,7 +371,8 @@ class RaidWorker(automat.Automat):
         """
         Action method.
         """
-        ncpus = bpio.detect_number_of_cpu_cores()
+        cores = bpio.detect_number_of_cpu_cores()
+        ncpus = cores
         if ncpus > 1:
             # do not use all CPU cors at once
             # need to keep at least one for all other operations
@@ -312,8 +380,14 @@ class RaidWorker(automat.Automat):
             # TODO: make an option in the software settings
             ncpus = int(ncpus / 2.0)
 
-        if bpio.Android() or not config.conf().getBool('services/rebuilding/child-processes-enabled'):
-            self.processor = ThreadedRaidProcessor()
+        if in_memory_tasks_enabled():
+            if cores > 1 and not bpio.Android():
+                # tasks and blocks are passed to the pool of worker processes directly, without temporary files
+                from raid import worker
+                self.processor = worker.Manager(ncpus=ncpus)
+            else:
+                # with only one CPU core worker processes will not make it faster, tasks are running in threads
+                self.processor = ThreadedRaidProcessor(ncpus=ncpus)
         else:
             os.environ['PYTHONUNBUFFERED'] = '1'
             from parallelp import pp
@@ -323,9 +397,6 @@ class RaidWorker(automat.Automat):
                 loglevel=lg.get_loging_level(_DebugLevel),
                 logfile=settings.ParallelPLogFilename(),
             )
-        # else:
-        #     from raid import worker
-        #     self.processor = worker.Manager(ncpus=ncpus)
 
         self.automat('process-started')
 
@@ -343,8 +414,14 @@ class RaidWorker(automat.Automat):
         """
         cmd, params, callback = args[0]
         self.task_id += 1
-        self.tasks.append((self.task_id, cmd, params))
+        priority = _TASK_PRIORITIES.get(cmd, 1)
+        # keep tasks sorted by priority, tasks with same priority are started in FIFO order
+        pos = len(self.tasks)
+        while pos > 0 and _TASK_PRIORITIES.get(self.tasks[pos - 1][1], 1) > priority:
+            pos -= 1
+        self.tasks.insert(pos, (self.task_id, cmd, params))
         self.callbacks[self.task_id] = callback
+        self.queued[self.task_id] = time.time()
 
     def doStartTask(self, *args, **kwargs):
         """
@@ -375,6 +452,7 @@ class RaidWorker(automat.Automat):
         )
 
         self.activetasks[task_id] = (proc, cmd, params)
+        self.started[task_id] = time.time()
         if _Debug:
             lg.out(_DebugLevel, 'raid_worker.doStartTask job_id=%r active=%d cpus=%d %s' % (
                 task_id, len(self.activetasks), self.processor.get_ncpus(), threading.currentThread().getName()))
@@ -450,17 +528,19 @@ class RaidTask(object):
         self._worker_args = worker_args or ()
         self._stopped = False
         self._bytes_processed = 0
+        self._bytes_reported = 0
         self._started = None
 
     def threshold_control(self, more_bytes):
         if self._stopped:
             return False
         self._bytes_processed += more_bytes
-        time_running = time.time() - self._started
-        if self._bytes_processed % 10000 == 0:
+        if self._bytes_processed - self._bytes_reported >= _ThresholdReportBytes:
+            self._bytes_reported = self._bytes_processed
             if _Debug:
-                lg.args(_DebugLevel, bytes_processed=self._bytes_processed, time_running=time_running)
-            time.sleep(0.01)
+                lg.args(_DebugLevel, bytes_processed=self._bytes_processed, time_running=time.time() - self._started)
+            # let the main thread breathe between large chunks
+            time.sleep(0.001)
         return True
 
     def run(self):
@@ -491,16 +571,19 @@ class RaidTaskInfo(object):
 
 class ThreadedRaidProcessor(object):
 
-    def __init__(self):
+    def __init__(self, ncpus=1):
         self.latest_task_id = 0
         self.tasks = {}
         self.active_tasks = {}
-        self.max_simultaneous_tasks = 1
+        self.max_simultaneous_tasks = max(1, ncpus)
 
     def cancel(self, task_id):
-        if task_id not in self.active_tasks:
-            raise Exception('active task not found')
-        self.active_tasks[task_id].stop()
+        # task could be submitted, but not started yet
+        ts = self.active_tasks.get(task_id) or self.tasks.get(task_id)
+        if not ts:
+            return False
+        ts.stop()
+        return True
 
     def destroy(self):
         for ts in self.active_tasks.values():
@@ -511,6 +594,9 @@ class ThreadedRaidProcessor(object):
 
     def on_success(self, task_id, result, callback):
         ts = self.active_tasks.pop(task_id)
+        if ts._stopped:
+            # task was cancelled, but the last chunk was already processed: report it as failed anyway
+            result = None
         if _Debug:
             lg.args(_DebugLevel, task_id=task_id, result=result, bytes_processed=ts._bytes_processed, active_tasks=list(self.active_tasks.keys()))
         reactor.callLater(0, callback, result)  # @UndefinedVariable
@@ -526,14 +612,11 @@ class ThreadedRaidProcessor(object):
         return None
 
     def process(self):
-        if len(self.active_tasks) >= self.max_simultaneous_tasks:
-            return False
-        if not self.tasks:
-            return False
-        next_task_id = list(self.tasks.keys())[0]
-        ts = self.tasks.pop(next_task_id)
-        self.active_tasks[next_task_id] = ts
-        ts.start()
+        while self.tasks and len(self.active_tasks) < self.max_simultaneous_tasks:
+            next_task_id = min(self.tasks.keys())
+            ts = self.tasks.pop(next_task_id)
+            self.active_tasks[next_task_id] = ts
+            ts.start()
 
     def submit(self, func, args=None, depfuncs=None, modules=None, callback=None):
         task_id = self.latest_task_id + 1
@@ -30,6 +30,34 @@
 """
 
 import array
+import binascii
+
+#------------------------------------------------------------------------------
+
+PARITY_CHUNK_SIZE = 256 * 1024
+REBUILD_CHUNK_SIZE = 1024 * 1024
+
+#------------------------------------------------------------------------------
+
+if hasattr(int, 'from_bytes'):
+
+    def bytes_to_int(data):
+        return int.from_bytes(data, 'big')
+
+    def int_to_bytes(value, length):
+        return value.to_bytes(length, 'big')
+
+else:
+
+    def bytes_to_int(data):
+        if not len(data):
+            return 0
+        return int(binascii.hexlify(data), 16)
+
+    def int_to_bytes(value, length):
+        return binascii.unhexlify('%0*x' % (length * 2, value))
+
+#------------------------------------------------------------------------------
 
 
 def build_parity(sds, iters, datasegments, myeccmap, paritysegments, threshold_control=None):
@@ -61,6 +89,40 @@ def build_parity(sds, iters, datasegments, myeccmap, paritysegments, threshold_c
     return psds_list
 
 
+def build_parity_segments(data_segments, myeccmap, threshold_control=None, chunk_size=PARITY_CHUNK_SIZE):
+    """
+    Calculates all parity segments at once from the given list of data segments.
+
+    Every data segment must be a bytes-like object of the same length.
+    Instead of walking the segments word by word, whole spans of ``chunk_size`` bytes
+    are converted to a single big integer and XOR-ed with the parities listed in ``myeccmap.DataToParity``.
+    The result is byte-identical to ``build_parity()``, returns a dictionary of parity segments as ``bytes``.
+
+    Progress is reported to ``threshold_control`` once per processed span, in bytes.
+    """
+    seglength = len(data_segments[0]) if data_segments else 0
+    parity_chunks = {seg_num: [] for seg_num in range(myeccmap.paritysegments)}
+    for offset in range(0, seglength, chunk_size):
+        span = min(chunk_size, seglength - offset)
+        parities = [0, ] * myeccmap.paritysegments
+        for DSegNum in range(len(data_segments)):
+            Map = myeccmap.DataToParity[DSegNum]
+            if not Map:
+                continue
+            b = bytes_to_int(data_segments[DSegNum][offset:offset + span])
+            for PSegNum in Map:
+                if PSegNum > myeccmap.paritysegments:
+                    myeccmap.check()
+                    raise Exception('eccmap error')
+                parities[PSegNum] ^= b
+            if threshold_control:
+                if not threshold_control(span):
+                    raise Exception('task cancelled')
+        for PSegNum in range(myeccmap.paritysegments):
+            parity_chunks[PSegNum].append(int_to_bytes(parities[PSegNum], span))
+    return {PSegNum: b''.join(parity_chunks[PSegNum]) for PSegNum in parity_chunks}
+
+
 def chunks(l, n):
     """Yield successive n-sized chunks from l."""
     for i in range(0, len(l), n):
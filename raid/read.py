@@ -56,7 +56,6 @@
 
 from __future__ import absolute_import
 from __future__ import print_function
-import six
 from io import open
 from six.moves import range
 
@@ -81,6 +80,7 @@ if __name__ == '__main__':
 import logs.lg
 
 import raid.eccmap
+import raid.raidutils
 
 #------------------------------------------------------------------------------
 
@@ -98,12 +98,16 @@ def ReadBinaryFile(filename):
 
 
 def RebuildOne(inlist, listlen, outfilename, threshold_control=None):
-    readsize = 1  # vary from 1 byte to 4 bytes
-    raidfiles = [''] * listlen  # just need a list of this size
-    raidreads = [''] * listlen
+    """
+    Reconstructs one segment by XOR-ing together all of the given segments.
+
+    Files are read in large aligned chunks, every chunk is converted to a single big integer
+    and the result is written to ``outfilename`` once per chunk.
+    """
+    raidfiles = []
     for filenum in range(listlen):
         try:
-            raidfiles[filenum] = open(inlist[filenum], "rb")
+            raidfiles.append(open(inlist[filenum], "rb"))
         except:
             logs.lg.exc()
             for f in raidfiles:
@@ -113,34 +117,29 @@ def RebuildOne(inlist, listlen, outfilename, threshold_control=None):
                     pass
             return False
 
-    rebuildfile = open(outfilename, "wb")
     progress = 0
-    while True:
-        for k in range(listlen):
-            raidreads[k] = raidfiles[k].read(2048)
-        if not raidreads[0]:
-            break
-        i = 0
-        while i < len(raidreads[0]):
-            xor = 0
-            for j in range(listlen):
-                b1 = ord(raidreads[j][i:i+1])
-                xor = xor ^ b1
-            if six.PY3:
-                out_byte = bytes([xor, ])
-            else:
-                out_byte = chr(xor)
-            rebuildfile.write(out_byte)
-            i += readsize
-            progress += 1
-
-            if threshold_control:
-                if not threshold_control(readsize):
-                    raise Exception('task cancelled')
-
-    for filenum in range(listlen):
-        raidfiles[filenum].close()
-    rebuildfile.close()
+    try:
+        with open(outfilename, "wb") as rebuildfile:
+            while True:
+                raidread = raidfiles[0].read(raid.raidutils.REBUILD_CHUNK_SIZE)
+                if not raidread:
+                    break
+                readsize = len(raidread)
+                xor = raid.raidutils.bytes_to_int(raidread)
+                for f in raidfiles[1:]:
+                    raidread = f.read(readsize)
+                    if len(raidread) < readsize:
+                        raidread = raidread.ljust(readsize, b'\x00')
+                    xor ^= raid.raidutils.bytes_to_int(raidread)
+                rebuildfile.write(raid.raidutils.int_to_bytes(xor, readsize))
+                progress += readsize
+
+                if threshold_control:
+                    if not threshold_control(readsize):
+                        raise Exception('task cancelled')
+    finally:
+        for f in raidfiles:
+            f.close()
 
     if _Debug:
         with open('/tmp/raid.log', 'a') as logfile:
@@ -1,9 +1,9 @@
-    #!/usr/bin/env python
-# rebuild.py
+#!/usr/bin/env python
+# worker.py
 #
 # Copyright (C) 2008 Stanislav Evseev, Veselin Penev  https://bitdust.io
 #
-# This file (rebuild.py) is part of BitDust Software.
+# This file (worker.py) is part of BitDust Software.
 #
 # BitDust is free software: you can redistribute it and/or modify
 # it under the terms of the GNU Affero General Public License as published by
@@ -20,26 +20,36 @@
 #
 # Please contact us if you have any questions at bitdust.io@gmail.com
 
+"""
+.. module:: worker.
+
+Pool of worker processes to execute raid tasks on all CPU cores.
+
+Tasks are passed to the processes together with their arguments, blocks are sent
+as bytes so ``make-buffer`` tasks do not need temporary files.
+Every finished task is reported from the pool result thread to the main thread
+with ``reactor.callFromThread()``, nothing is polled.
+
+Each running task owns a slot in a shared array of flags, the task is checking its flag
+in ``threshold_control()`` between processed chunks and stops when it was cancelled.
+"""
+
 #------------------------------------------------------------------------------
 
 from __future__ import absolute_import
-import six
 
 #------------------------------------------------------------------------------
 
-_Debug = True
+_Debug = False
 _DebugLevel = 6
 
 #------------------------------------------------------------------------------
 
 import os
-import time
 import traceback
 import multiprocessing
 
-from collections import OrderedDict
-
-from threading import Thread, Lock
+from twisted.internet import reactor  # @UnresolvedImport
 
 #------------------------------------------------------------------------------
 
@@ -47,67 +57,31 @@ from logs import lg
 
 #------------------------------------------------------------------------------
 
-_WorkerQueue = multiprocessing.Queue()
-_WorkerLock = Lock()
+_CancelFlags = None
 
 #------------------------------------------------------------------------------
 
-class my_decorator_class(object):
-
-    def __init__(self, target):
-        self.target = target
-
-    def __call__(self, *args, **kwargs):
-        task_id = args[-1]
-        args = args[:-1]
-        res = None
-
-        try:
-            res = self.target(*args)
-        except Exception as e:
-            traceback.print_exc()
-            res = e
-        finally:
-            try:
-                _WorkerQueue.put(1)
-            except Exception:
-                print('worker got Exception in queue -- exiting')
-
-        return res
-
-
-def func_thread(tasks, pool):
-    while True:
-        try:
-            _WorkerQueue.get()
-        except (EOFError, OSError, IOError):
-            print('publisher got EOFError or OSError or IOError -- exiting')
-            break
-
-        with _WorkerLock:
-            try:
-                task = tasks.popitem(last=False)
-            except KeyError:
-                task = None
-
-        if task:
-            func, params, callback, error_callback, task_id = task[1]
-            if _Debug:
-                lg.out(_DebugLevel, 'raid.worker.func_thread is going to apply task %s' % task_id)
-            if six.PY3:
-                pool.apply_async(func=func, args=params + (task_id,), callback=callback, error_callback=error_callback)
-            else:
-                pool.apply_async(func=func, args=params + (task_id,), callback=callback)
-        else:
-            try:
-                _WorkerQueue.put(1)
-            except Exception:
-                print('publisher got Exception with queue -- exiting')
-                break
-
-            time.sleep(0.1)
-
-    pool.terminate()
+
+def _init_worker_process(cancel_flags):
+    global _CancelFlags
+    _CancelFlags = cancel_flags
+
+
+def _run_task(func, params, slot):
+    """
+    Executed inside of the worker process.
+    """
+
+    def _threshold_control(more_bytes):
+        return not _CancelFlags[slot]
+
+    try:
+        return func(*(tuple(params) + (_threshold_control, )))
+    except:
+        traceback.print_exc()
+        return None
+
+#------------------------------------------------------------------------------
 
 
 class Task(object):
@@ -123,60 +97,79 @@ class Task(object):
 
 
 class Manager(object):
+    """
+    Same interface as ``raid_worker.ThreadedRaidProcessor`` and ``parallelp.pp.Server`` have.
+    Caller must not submit more than ``get_ncpus()`` tasks at once.
+    """
 
     def __init__(self, ncpus):
-        self._ncpus = ncpus
-
-        if six.PY34:
-            try:
-                multiprocessing.set_start_method('spawn')
-            except RuntimeError:
-                pass
-
-        multiprocessing.util.log_to_stderr(multiprocessing.util.SUBDEBUG)
-
+        self._ncpus = max(1, ncpus)
+        # new processes are not forked from the main process which is running the reactor and many threads
+        self.context = multiprocessing.get_context('spawn')
         from system import bpio
         if bpio.Windows():
             from system import deploy
             deploy.init_base_dir()
             venv_python_path = os.path.join(deploy.current_base_dir(), 'venv', 'Scripts', 'BitDustNode.exe')
             lg.info('will use %s as multiprocessing executable' % venv_python_path)
-            multiprocessing.set_executable(venv_python_path)
-
-        self.processor = multiprocessing.Pool(ncpus)
-
-        #: implement queue per Manager instance
-        # self.queue = multiprocessing.Queue()
-
-        self.tasks = OrderedDict({})
+            self.context.set_executable(venv_python_path)
+        self.cancel_flags = self.context.Array('b', self._ncpus, lock=False)
+        self.free_slots = list(range(self._ncpus))
+        self.tasks = {}
         self.task_id = 0
-
-        self.thread = Thread(target=func_thread, args=(self.tasks, self.processor))
-        self.thread.daemon = True
-        self.thread.start()
-
-        self._propagate_queue()
-
-    def _propagate_queue(self):
-        for i in range(self.ncpus):
-            _WorkerQueue.put(1)
-
-    def submit(self, func, params, callback, error_callback=None):
-        with _WorkerLock:
-            self.task_id += 1
-            self.tasks[self.task_id] = (my_decorator_class(target=func), params, callback, error_callback, self.task_id)
-        return Task(self.task_id)
-
-    @property
-    def ncpus(self):
+        self.destroyed = False
+        self.processor = self.context.Pool(
+            self._ncpus,
+            initializer=_init_worker_process,
+            initargs=(self.cancel_flags, ),
+        )
+
+    def get_ncpus(self):
         return self._ncpus
 
-    def terminate(self):
-        self.processor.terminate()
+    def submit(self, func, args=None, depfuncs=None, modules=None, callback=None):
+        if not self.free_slots:
+            raise Exception('all worker processes are busy')
+        slot = self.free_slots.pop(0)
+        self.cancel_flags[slot] = 0
+        self.task_id += 1
+        task_id = self.task_id
+        self.tasks[task_id] = slot
+        # memoryview can not be pickled, the block is copied only once here
+        params = tuple((bytes(a) if isinstance(a, memoryview) else a) for a in (args or ()))
+        self.processor.apply_async(
+            _run_task,
+            (func, params, slot, ),
+            callback=lambda result: reactor.callFromThread(self._on_task_finished, task_id, result, callback),  # @UndefinedVariable
+            error_callback=lambda err: reactor.callFromThread(self._on_task_finished, task_id, None, callback),  # @UndefinedVariable
+        )
+        if _Debug:
+            lg.args(_DebugLevel, task_id=task_id, func=func, slot=slot, running=len(self.tasks))
+        return Task(task_id)
 
     def cancel(self, task_id):
-        with _WorkerLock:
-            try:
-                del self.tasks[task_id]
-            except KeyError:
-                pass
+        if task_id not in self.tasks:
+            return False
+        self.cancel_flags[self.tasks[task_id]] = 1
+        return True
+
+    def destroy(self):
+        self.destroyed = True
+        for slot in self.tasks.values():
+            self.cancel_flags[slot] = 1
+        self.tasks.clear()
+        self.processor.terminate()
+
+    def _on_task_finished(self, task_id, result, callback):
+        if self.destroyed:
+            return
+        slot = self.tasks.pop(task_id, None)
+        if slot is None:
+            return
+        if self.cancel_flags[slot]:
+            result = None
+        self.free_slots.append(slot)
+        if _Debug:
+            lg.args(_DebugLevel, task_id=task_id, result=result, running=len(self.tasks))
+        if callback:
+            callback(result)
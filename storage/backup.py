@@ -110,7 +110,6 @@ if __name__ == "__main__":
 from logs import lg
 
 from lib import packetid
-from lib import strng
 
 from userid import my_id
 from userid import global_id
@@ -128,6 +127,7 @@ from raid import raid_worker
 
 from crypt import encrypted
 from crypt import key
+from crypt import cipher
 
 #-------------------------------------------------------------------------------
 
@@ -174,6 +174,8 @@ class backup(automat.Automat):
         self.closed = False
         self.currentBlockData = BytesIO()
         self.currentBlockSize = 0
+        self.currentSessionKey = None
+        self.currentSessionKeyType = None
         self.workBlocks = {}
         self.blockNumber = 0
         self.dataSent = 0
@@ -368,16 +370,31 @@ class backup(automat.Automat):
         """
         def _doBlock():
             dt = time.time()
+            if isinstance(self.currentBlockData, cipher.StreamEncryptor):
+                # data was already encrypted chunk by chunk while reading from the pipe
+                block = encrypted.Block(
+                    CreatorID=self.creatorIDURL,
+                    BackupID=self.backupID,
+                    BlockNumber=self.blockNumber,
+                    SessionKey=self.currentSessionKey,
+                    SessionKeyType=self.currentSessionKeyType,
+                    LastBlock=self.stateEOF,
+                    EncryptedData=self.currentBlockData.finish(),
+                    Length=self.currentBlockSize,
+                    EncryptKey=self.keyID,
+                )
+                return block
             raw_bytes = self.currentBlockData.getvalue()
             block = encrypted.Block(
                 CreatorID=self.creatorIDURL,
                 BackupID=self.backupID,
                 BlockNumber=self.blockNumber,
-                SessionKey=key.NewSessionKey(session_key_type=key.SessionKeyType()),
-                SessionKeyType=key.SessionKeyType(),
+                SessionKey=self.currentSessionKey,
+                SessionKeyType=self.currentSessionKeyType,
                 LastBlock=self.stateEOF,
                 Data=raw_bytes,
                 EncryptKey=self.keyID,
+                CipherFormat=cipher.CIPHER_FORMAT_BINARY,
             )
             del raw_bytes
             if _Debug:
@@ -406,30 +423,39 @@ class backup(automat.Automat):
             if _Debug:
                 lg.out(_DebugLevel, 'backup.doBlockPushAndRaid SKIP, terminating=True')
             return
-        fileno, filename = tmpfile.make('raid', extension='.raid')
-        serializedblock = newblock.Serialize()
-        blocklen = len(serializedblock)
-        os.write(fileno, strng.to_bin(blocklen) + b":" + serializedblock)
-        os.close(fileno)
-        self.workBlocks[newblock.BlockNumber] = filename
-        dt = time.time()
+        # length prefix and the block are written into a single preallocated buffer
+        serializedblock = newblock.SerializeToBuffer(length_prefix=True)
+        blockNumber = newblock.BlockNumber
         outputpath = os.path.join(
             settings.getLocalBackupsDir(), self.customerGlobalID, self.pathID, self.version)
-        task_params = (filename, self.eccmap.name, self.version, newblock.BlockNumber, outputpath)
-        raid_worker.add_task('make', task_params, lambda cmd, params, result: self._raidmakeCallback(params, result, dt))
-        self.automat('block-raid-started', newblock)
+        if raid_worker.in_memory_tasks_enabled():
+            # block is passed to the raid worker directly, no need to write it to a temporary file
+            cmd = 'make-buffer'
+            task_key = '%s/%d' % (self.backupID, blockNumber)
+            task_params = (task_key, memoryview(serializedblock), self.eccmap.name, self.version, blockNumber, outputpath)
+        else:
+            cmd = 'make'
+            fileno, task_key = tmpfile.make('raid', extension='.raid')
+            os.write(fileno, serializedblock)
+            os.close(fileno)
+            task_params = (task_key, self.eccmap.name, self.version, blockNumber, outputpath)
         del serializedblock
+        self.workBlocks[blockNumber] = (cmd, task_key)
+        dt = time.time()
+        raid_worker.add_task(cmd, task_params, lambda cmd, params, result: self._raidmakeCallback(blockNumber, result, dt))
+        self.automat('block-raid-started', newblock)
         if _Debug:
             lg.out(_DebugLevel, 'backup.doBlockPushAndRaid %s : start process data from %s to %s, %d' % (
-                newblock.BlockNumber, filename, outputpath, id(self.terminating)))
+                blockNumber, task_key, outputpath, id(self.terminating)))
 
     def doPopBlock(self, *args, **kwargs):
         """
         Action method.
         """
         blockNumber, _ = args[0]
-        filename = self.workBlocks.pop(blockNumber)
-        tmpfile.throw_out(filename, 'block raid done')
+        cmd, task_key = self.workBlocks.pop(blockNumber)
+        if cmd == 'make':
+            tmpfile.throw_out(task_key, 'block raid done')
 
     def doFirstBlock(self, *args, **kwargs):
         """
@@ -439,7 +465,7 @@ class backup(automat.Automat):
         self.blocksSent = 0
         self.blockNumber = 0
         self.currentBlockSize = 0
-        self.currentBlockData = BytesIO()
+        self._start_block()
 
     def doNextBlock(self, *args, **kwargs):
         """
@@ -450,7 +476,7 @@ class backup(automat.Automat):
         self.blockNumber += 1
         self.currentBlockSize = 0
         self.currentBlockData.close()
-        self.currentBlockData = BytesIO()
+        self._start_block()
 
     def doBlockReport(self, *args, **kwargs):
         """
@@ -472,8 +498,9 @@ class backup(automat.Automat):
         Action method.
         """
         self.closed = True
-        for filename in self.workBlocks.values():
-            tmpfile.throw_out(filename, 'backup aborted')
+        for cmd, task_key in self.workBlocks.values():
+            if cmd == 'make':
+                tmpfile.throw_out(task_key, 'backup aborted')
 
     def doReport(self, *args, **kwargs):
         """
@@ -520,9 +547,10 @@ class backup(automat.Automat):
         if _Debug:
             lg.out(_DebugLevel, 'backup.abort id %s, %d' % (str(self.backupID), id(self.ask4abort)))
         self.terminating = True
-        for blockNumber, filename in self.workBlocks.items():
-            lg.warn('aborting raid make worker for block %d in %s' % (blockNumber, filename))
-            raid_worker.cancel_task('make', filename)
+        for blockNumber, work_block in self.workBlocks.items():
+            cmd, task_key = work_block
+            lg.warn('aborting raid make worker for block %d in %s' % (blockNumber, task_key))
+            raid_worker.cancel_task(cmd, task_key)
         lg.warn('killing backup pipe')
         self.ask4abort = True
         self._kill_pipe()
@@ -535,8 +563,7 @@ class backup(automat.Automat):
         percent = min(100.0, 100.0 * self.dataSent / self.totalSize)
         return percent
 
-    def _raidmakeCallback(self, params, result, dt):
-        _, _, _, blockNumber, _ = params
+    def _raidmakeCallback(self, blockNumber, result, dt):
         if result is None:
             if _Debug:
                 lg.out(_DebugLevel, 'backup._raidmakeCallback WARNING - result is None :  %r eof=%s dt=%s' % (
@@ -559,6 +586,15 @@ class backup(automat.Automat):
             except:
                 lg.exc()
 
+    def _start_block(self):
+        self.currentSessionKeyType = key.SessionKeyType(for_backups=True)
+        self.currentSessionKey = key.NewSessionKey(session_key_type=self.currentSessionKeyType)
+        if self.currentSessionKeyType == 'AESGCM':
+            # raw data is encrypted chunk by chunk while reading from the pipe
+            self.currentBlockData = cipher.StreamEncryptor(self.currentSessionKey)
+        else:
+            self.currentBlockData = BytesIO()
+
 #------------------------------------------------------------------------------
 
 
@@ -64,7 +64,9 @@ _DebugLevel = 8
 #------------------------------------------------------------------------------
 
 import os
+import re
 import sys
+import binascii
 
 try:
     from twisted.internet import reactor  # @UnresolvedImport
@@ -109,6 +111,9 @@ _UpdatedBackupIDs = set()
 _RepaintingTask = None
 _RepaintingTaskDelay = 2.0
 _ListFilesQueryCallbacks = {}
+_RemoteColumns = {}
+_LocalColumns = {}
+_NonZeroByte = re.compile(b'[^\\x00]')
 
 #------------------------------------------------------------------------------
 
@@ -159,6 +164,9 @@ def remote_files():
     - blockNumber - a number of block started from 0, look at ``p2p.backup``
     - dataORparity - can be 'D' for Data packet or 'P' for Parity packets
     - supplierNumber - who should keep that piece?
+
+    Values must be modified only via methods of that module, the scans are
+    using a columnar copy of that matrix which is updated at same moment.
     """
     global _RemoteFiles
     return _RemoteFiles
@@ -546,6 +554,7 @@ def process_line_version(line, supplier_num, current_key_alias=None, customer_id
             bit = -1 if str(blockNum) in missingBlocksSet[dataORparity] else 1
             remote_files()[backupID][blockNum][dataORparity[0]][supplier_num] = bit
             newfiles += int((bit + 1) / 2)  # this should switch -1 or 1 to 0 or 1
+        _columns_changed(backupID, blockNum, remote=True)
     # save max block number for this backup
     if backupID not in remote_max_block_numbers():
         remote_max_block_numbers()[backupID] = -1
@@ -746,6 +755,7 @@ def ReadLocalFiles():
     local_files().clear()
     local_max_block_numbers().clear()
     local_backup_size().clear()
+    _LocalColumns.clear()
     _counter = [0, ]
 
     def visit(key_id, realpath, subpath, name):
@@ -842,6 +852,7 @@ def RemoteFileReport(backupID, blockNum, supplierNum, dataORparity, result):
         remote_files()[backupID][blockNum]['P'][supplierNum] = flag
     else:
         lg.warn('incorrect backup ID: %s' % backupID)
+    _columns_changed(backupID, blockNum, remote=True)
     # if we know only 5 blocks stored on remote machine
     # but we have backed up 6th block - remember this
     remote_max_block_numbers()[backupID] = max(remote_max_block_numbers().get(backupID, -1), blockNum)
@@ -893,8 +904,10 @@ def LocalFileReport(packetID=None, backupID=None, blockNum=None, supplierNum=Non
             'P': [0] * contactsdb.num_suppliers(customer_idurl=customer_idurl), }
     if not os.path.isfile(localDest):
         local_files()[backupID][blockNum][dataORparity[0]][supplierNum] = 0
+        _columns_changed(backupID, blockNum, remote=False)
         return
     local_files()[backupID][blockNum][dataORparity[0]][supplierNum] = 1
+    _columns_changed(backupID, blockNum, remote=False)
     if backupID not in local_max_block_numbers():
         local_max_block_numbers()[backupID] = -1
     if local_max_block_numbers()[backupID] < blockNum:
@@ -961,6 +974,7 @@ def LocalBlockReport(backupID, blockNumber, result):
             if _Debug:
                 lg.out(_DebugLevel, '    OK, local backup size is %s and max block num is %s' % (
                     local_backup_size()[backupID], local_max_block_numbers()[backupID]))
+    _columns_changed(backupID, blockNum, remote=False)
     if backupID not in local_max_block_numbers():
         local_max_block_numbers()[backupID] = -1
     if local_max_block_numbers()[backupID] < blockNum:
@@ -971,6 +985,146 @@ def LocalBlockReport(backupID, blockNumber, result):
 #------------------------------------------------------------------------------
 
 
+class BlockColumns(object):
+    """
+    Columnar copy of a single backup from "remote" or "local" matrix, used to quickly scan all blocks at once.
+
+    For every supplier and for both Data and Parity surfaces a bytearray is stored with one byte per block:
+
+      0 : no info about that block or supplier position
+      2 : supplier position is known, but the piece is missing or no info yet
+      3 : the piece exist
+
+    So the scans are done with bitwise operations on the whole column converted to a single integer.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.rows_count = 0
+        self.rows = bytearray()
+        self.columns = {'D': [], 'P': [], }
+        for blockNum, row in source.items():
+            self.set_row(blockNum, row)
+
+    def width(self, dp):
+        return len(self.columns[dp])
+
+    def set_row(self, blockNum, row):
+        if blockNum >= len(self.rows):
+            grow = blockNum + 1 - len(self.rows)
+            self.rows.extend(bytearray(grow))
+            for dp in ('D', 'P', ):
+                for column in self.columns[dp]:
+                    column.extend(bytearray(grow))
+        if not self.rows[blockNum]:
+            self.rows[blockNum] = 1
+            self.rows_count += 1
+        for dp in ('D', 'P', ):
+            values = row[dp]
+            columns = self.columns[dp]
+            while len(columns) < len(values):
+                columns.append(bytearray(len(self.rows)))
+            for supplierNum, value in enumerate(values):
+                columns[supplierNum][blockNum] = 3 if value == 1 else 2
+            for supplierNum in range(len(values), len(columns)):
+                columns[supplierNum][blockNum] = 0
+
+    def rows_mask(self, count):
+        return _bytes_to_int(self._head(self.rows, count)) & _ones(count)
+
+    def pieces(self, dp, supplierNum, count):
+        """
+        Blocks where given supplier got that piece.
+        """
+        if supplierNum >= len(self.columns[dp]):
+            return 0
+        return _bytes_to_int(self._head(self.columns[dp][supplierNum], count)) & _ones(count)
+
+    def positions(self, dp, supplierNum, count):
+        """
+        Blocks where given supplier position is known.
+        """
+        if supplierNum >= len(self.columns[dp]):
+            return 0
+        return (_bytes_to_int(self._head(self.columns[dp][supplierNum], count)) >> 1) & _ones(count)
+
+    def _head(self, column, count):
+        if len(column) >= count:
+            return column[:count]
+        return column + bytearray(count - len(column))
+
+
+if hasattr(int, 'from_bytes'):
+
+    def _bytes_to_int(data):
+        return int.from_bytes(data, 'big')
+
+    def _int_to_bytes(value, length):
+        return value.to_bytes(length, 'big')
+
+else:
+
+    def _bytes_to_int(data):
+        if not len(data):
+            return 0
+        return int(binascii.hexlify(data), 16)
+
+    def _int_to_bytes(value, length):
+        return binascii.unhexlify('%0*x' % (length * 2, value))
+
+
+def _ones(count):
+    """
+    Integer with every byte set to 1, one byte per block.
+    """
+    return _bytes_to_int(b'\x01' * count)
+
+
+def _block_numbers(mask, count):
+    """
+    Return sorted list of block numbers selected in the mask.
+    """
+    if not mask or count <= 0:
+        return []
+    return [m.start() for m in _NonZeroByte.finditer(_int_to_bytes(mask, count))]
+
+
+def _columns(backupID, remote=True):
+    """
+    Returns up to date columnar copy of given backup, it is re-created if the matrix was modified from outside.
+    """
+    files = remote_files() if remote else local_files()
+    cache = _RemoteColumns if remote else _LocalColumns
+    blocks = files.get(backupID)
+    if blocks is None:
+        cache.pop(backupID, None)
+        return None
+    columns = cache.get(backupID)
+    if columns is None or columns.source is not blocks or columns.rows_count != len(blocks):
+        columns = BlockColumns(blocks)
+        cache[backupID] = columns
+    return columns
+
+
+def _columns_changed(backupID, blockNum, remote=True):
+    """
+    Must be called every time a single block info was modified in the matrix.
+    """
+    cache = _RemoteColumns if remote else _LocalColumns
+    columns = cache.get(backupID)
+    if columns is None:
+        return
+    blocks = (remote_files() if remote else local_files()).get(backupID)
+    if blocks is None or columns.source is not blocks:
+        cache.pop(backupID, None)
+        return
+    row = blocks.get(blockNum)
+    if row is not None:
+        columns.set_row(blockNum, row)
+
+#------------------------------------------------------------------------------
+
+
 def ScanMissingBlocks(backupID):
     """
     Finally here is some real logic.
@@ -982,13 +1136,17 @@ def ScanMissingBlocks(backupID):
     if _Debug:
         lg.out(_DebugLevel, 'backup_matrix.ScanMissingBlocks for %s' % backupID)
     customer_idurl = packetid.CustomerIDURL(backupID)
-    missingBlocks = set()
+    missingBlocks = []
     localMaxBlockNum = local_max_block_numbers().get(backupID, -1)
     remoteMaxBlockNum = remote_max_block_numbers().get(backupID, -1)
     supplierActiveArray = GetActiveArray(customer_idurl=customer_idurl)
-
-    if backupID not in remote_files():
-        if backupID not in local_files():
+    # if supplier is not alive we can not send to him
+    # so no need to scan for missing blocks
+    activeSuppliers = [supplierNum for supplierNum, active in enumerate(supplierActiveArray) if active == 1]
+    remoteColumns = _columns(backupID, remote=True)
+    if remoteColumns is None:
+        localColumns = _columns(backupID, remote=False)
+        if localColumns is None:
             # we have no local and no remote info for this backup
             # no chance to do some rebuilds...
             # TODO: but how we get here ?!
@@ -1000,19 +1158,13 @@ def ScanMissingBlocks(backupID):
             # need to scan all block numbers
             if _Debug:
                 lg.out(_DebugLevel, '    no remote info but found local info, maxBlockNum=%d' % localMaxBlockNum)
-            for blockNum in range(localMaxBlockNum + 1):
+            count = localMaxBlockNum + 1
+            found = 0
+            for supplierNum in activeSuppliers:
                 # we check for Data and Parity packets
-                localData = GetLocalDataArray(backupID, blockNum)
-                localParity = GetLocalParityArray(backupID, blockNum)
-                for supplierNum in range(len(supplierActiveArray)):
-                    # if supplier is not alive we can not send to him
-                    # so no need to scan for missing blocks
-                    if supplierActiveArray[supplierNum] != 1:
-                        continue
-                    if localData[supplierNum] == 1:
-                        missingBlocks.add(blockNum)
-                    if localParity[supplierNum] == 1:
-                        missingBlocks.add(blockNum)
+                found |= localColumns.pieces('D', supplierNum, count)
+                found |= localColumns.pieces('P', supplierNum, count)
+            missingBlocks = _block_numbers(found, count)
     else:
         # now we have some remote info
         # we take max block number from local and remote
@@ -1020,31 +1172,17 @@ def ScanMissingBlocks(backupID):
         if _Debug:
             lg.out(_DebugLevel, '    found remote info, maxBlockNum=%d' % maxBlockNum)
         # and increase by one because range(3) give us [0, 1, 2], but we want [0, 1, 2, 3]
-        for blockNum in range(maxBlockNum + 1):
-            # if we have few remote files, but many locals - we want to send all missed
-            if blockNum not in remote_files()[backupID]:
-                missingBlocks.add(blockNum)
-                continue
-            # take remote info for this block
-            remoteData = GetRemoteDataArray(backupID, blockNum)
-            remoteParity = GetRemoteParityArray(backupID, blockNum)
-            # now check every our supplier for every block
-            for supplierNum in range(len(supplierActiveArray)):
-                # if supplier is not alive we can not send to him
-                # so no need to scan for missing blocks
-                if supplierActiveArray[supplierNum] != 1:
-                    continue
-                if supplierNum >= len(remoteData) or supplierNum >= len(remoteParity):
-                    missingBlocks.add(blockNum)
-                    continue
-                if remoteData[supplierNum] != 1:    # -1 means missing
-                    missingBlocks.add(blockNum)     # 0 - no info yet
-                if remoteParity[supplierNum] != 1:  # 1 - file exist on remote supplier
-                    missingBlocks.add(blockNum)
-
+        count = maxBlockNum + 1
+        ones = _ones(count)
+        # if we have few remote files, but many locals - we want to send all missed
+        found = ones ^ remoteColumns.rows_mask(count)
+        for supplierNum in activeSuppliers:
+            # -1 means missing, 0 - no info yet, 1 - file exist on remote supplier
+            found |= ones ^ (remoteColumns.pieces('D', supplierNum, count) & remoteColumns.pieces('P', supplierNum, count))
+        missingBlocks = _block_numbers(found, count)
     if _Debug:
         lg.out(_DebugLevel, '    missingBlocks=%s' % missingBlocks)
-    return list(missingBlocks)
+    return missingBlocks
 
 
 def ScanBlocksToRemove(backupID, check_all_suppliers=True):
@@ -1064,41 +1202,38 @@ def ScanBlocksToRemove(backupID, check_all_suppliers=True):
     if backupID not in remote_files() or backupID not in local_files():
         # no info about this backup yet - skip
         return packets
-    for blockNum in range(localMaxBlockNum + 1):
-        localArray = {'Data': GetLocalDataArray(backupID, blockNum),
-                      'Parity': GetLocalParityArray(backupID, blockNum)}
-        remoteArray = {'Data': GetRemoteDataArray(backupID, blockNum),
-                       'Parity': GetRemoteParityArray(backupID, blockNum)}
-        if (0 in remoteArray['Data']) or (0 in remoteArray['Parity']):
-            # if some supplier do not have some data for that block - do not remove any local files for that block!
-            # we do remove the local files only when we sure all suppliers got the all data pieces
+    remoteColumns = _columns(backupID, remote=True)
+    localColumns = _columns(backupID, remote=False)
+    count = localMaxBlockNum + 1
+    ones = _ones(count)
+    # we do remove the local files only when we sure all suppliers got the all data pieces
+    # if some supplier do not have some data for that block - do not remove any local files for that block!
+    # also if we do not have any info about this block for some supplier do not remove other local pieces
+    completed = remoteColumns.rows_mask(count)
+    for dp in ('D', 'P', ):
+        for supplierNum in range(remoteColumns.width(dp)):
+            completed &= ones ^ (remoteColumns.positions(dp, supplierNum, count) & (ones ^ remoteColumns.pieces(dp, supplierNum, count)))
+    if not completed:
+        return packets
+    candidates = []
+    suppliers = {}
+    for supplierNum in range(contactsdb.num_suppliers(customer_idurl=customer_idurl)):
+        supplierIDURL = contactsdb.supplier(supplierNum, customer_idurl=customer_idurl)
+        if not supplierIDURL:
+            # supplier is unknown - skip
             continue
-        if (-1 in remoteArray['Data']) or (-1 in remoteArray['Parity']):
-            # also if we do not have any info about this block for some supplier do not remove other local pieces
+        suppliers[supplierNum] = supplierIDURL
+        for dataORparity in ('Data', 'Parity', ):
+            for blockNum in _block_numbers(completed & localColumns.pieces(dataORparity[0], supplierNum, count), count):
+                candidates.append((blockNum, supplierNum, dataORparity, ))
+    # packet IDs are only created for the pieces which are going to be removed
+    candidates.sort()
+    for blockNum, supplierNum, dataORparity in candidates:
+        packetID = packetid.MakePacketID(backupID, blockNum, supplierNum, dataORparity)
+        if io_throttle.HasPacketInSendQueue(suppliers[supplierNum], packetID):
+            # if we do sending the packet at the moment - skip
             continue
-        for supplierNum in range(contactsdb.num_suppliers(customer_idurl=customer_idurl)):
-            supplierIDURL = contactsdb.supplier(supplierNum, customer_idurl=customer_idurl)
-            if not supplierIDURL:
-                # supplier is unknown - skip
-                continue
-            for dataORparity in ['Data', 'Parity']:
-                packetID = packetid.MakePacketID(backupID, blockNum, supplierNum, dataORparity)
-                if io_throttle.HasPacketInSendQueue(supplierIDURL, packetID):
-                    # if we do sending the packet at the moment - skip
-                    continue
-                if supplierNum >= len(localArray[dataORparity]):
-                    lg.warn('wrong supplier %r position %d for customer %r' %(
-                        supplierIDURL, supplierNum, customer_idurl))
-                    continue
-                if localArray[dataORparity][supplierNum] == 1:
-                    packets.append(packetID)
-                    # lg.out(10, '    mark to remove %s, blockNum:%d remote:%s local:%s' % (packetID, blockNum, str(remoteArray), str(localArray)))
-#                if check_all_suppliers:
-#                    if localArray[dataORparity][supplierNum] == 1:
-#                        packets.append(packetID)
-#                else:
-#                    if remoteArray[dataORparity][supplierNum] == 1 and localArray[dataORparity][supplierNum] == 1:
-#                        packets.append(packetID)
+        packets.append(packetID)
     return packets
 
 
@@ -1115,44 +1250,41 @@ def ScanBlocksToSend(backupID, limit_per_supplier=None):
     bySupplier = {}
     for supplierNum in range(len(supplierActiveArray)):
         bySupplier[supplierNum] = set()
-    if backupID not in remote_files():
-        if _Debug:
+    localColumns = _columns(backupID, remote=False)
+    if localColumns is None:
+        return bySupplier
+    remoteColumns = _columns(backupID, remote=True)
+    if _Debug:
+        if remoteColumns is None:
             lg.out(_DebugLevel, 'backup_matrix.ScanBlocksToSend  backupID %r not found in remote files' % backupID)
-        for blockNum in range(localMaxBlockNum + 1):
-            localData = GetLocalDataArray(backupID, blockNum)
-            localParity = GetLocalParityArray(backupID, blockNum)
-            for supplierNum in range(len(supplierActiveArray)):
-                if supplierActiveArray[supplierNum] != 1:
-                    continue
-                if supplierNum >= len(localData) or supplierNum >= len(localParity):
-                    continue
-                if localData[supplierNum] == 1:
-                    bySupplier[supplierNum].add(packetid.MakePacketID(backupID, blockNum, supplierNum, 'Data'))
-                if localParity[supplierNum] == 1:
-                    bySupplier[supplierNum].add(packetid.MakePacketID(backupID, blockNum, supplierNum, 'Parity'))
-                if limit_per_supplier:
-                    if len(bySupplier[supplierNum]) > limit_per_supplier:
-                        break
-    else:
-        if _Debug:
+        else:
             lg.out(_DebugLevel, 'backup_matrix.ScanBlocksToSend  backupID %r was found in remote files' % backupID)
-        for blockNum in range(localMaxBlockNum + 1):
-            remoteData = GetRemoteDataArray(backupID, blockNum)
-            remoteParity = GetRemoteParityArray(backupID, blockNum)
-            localData = GetLocalDataArray(backupID, blockNum)
-            localParity = GetLocalParityArray(backupID, blockNum)
-            for supplierNum in range(len(supplierActiveArray)):
-                if supplierActiveArray[supplierNum] != 1:
-                    continue
-                if supplierNum >= len(remoteData) or supplierNum >= len(remoteParity):
-                    continue
-                if remoteData[supplierNum] != 1 and localData[supplierNum] == 1:
-                    bySupplier[supplierNum].add(packetid.MakePacketID(backupID, blockNum, supplierNum, 'Data'))
-                if remoteParity[supplierNum] != 1 and localParity[supplierNum] == 1:
-                    bySupplier[supplierNum].add(packetid.MakePacketID(backupID, blockNum, supplierNum, 'Parity'))
-                if limit_per_supplier:
-                    if len(bySupplier[supplierNum]) > limit_per_supplier:
-                        break
+    count = localMaxBlockNum + 1
+    ones = _ones(count)
+    for supplierNum in range(len(supplierActiveArray)):
+        if supplierActiveArray[supplierNum] != 1:
+            continue
+        localData = localColumns.pieces('D', supplierNum, count)
+        localParity = localColumns.pieces('P', supplierNum, count)
+        if remoteColumns is None:
+            allowed = localColumns.positions('D', supplierNum, count) & localColumns.positions('P', supplierNum, count)
+            sendData = localData & allowed
+            sendParity = localParity & allowed
+        else:
+            # blocks without any remote info are not delivered yet to anyone
+            allowed = (ones ^ remoteColumns.rows_mask(count)) | (
+                remoteColumns.positions('D', supplierNum, count) & remoteColumns.positions('P', supplierNum, count))
+            sendData = localData & allowed & (ones ^ remoteColumns.pieces('D', supplierNum, count))
+            sendParity = localParity & allowed & (ones ^ remoteColumns.pieces('P', supplierNum, count))
+        pieces = [(blockNum, 'Data', ) for blockNum in _block_numbers(sendData, count)]
+        pieces.extend([(blockNum, 'Parity', ) for blockNum in _block_numbers(sendParity, count)])
+        pieces.sort()
+        # packet IDs are only created for the pieces which are going to be sent
+        for blockNum, dataORparity in pieces:
+            bySupplier[supplierNum].add(packetid.MakePacketID(backupID, blockNum, supplierNum, dataORparity))
+            if limit_per_supplier:
+                if len(bySupplier[supplierNum]) > limit_per_supplier:
+                    break
     return bySupplier
 
 #------------------------------------------------------------------------------
@@ -1204,6 +1336,7 @@ def EraseBackupRemoteInfo(backupID):
     """
     if backupID in remote_files():
         del remote_files()[backupID]  # remote_files().pop(backupID)
+    _RemoteColumns.pop(backupID, None)
     if backupID in remote_max_block_numbers():
         del remote_max_block_numbers()[backupID]
 
@@ -1214,6 +1347,7 @@ def EraseBackupLocalInfo(backupID):
     """
     if backupID in local_files():
         del local_files()[backupID]  # local_files().pop(backupID)
+    _LocalColumns.pop(backupID, None)
     if backupID in local_max_block_numbers():
         del local_max_block_numbers()[backupID]
     if backupID in local_backup_size():
@@ -1229,6 +1363,7 @@ def ClearLocalInfo():
     local_files().clear()
     local_max_block_numbers().clear()
     local_backup_size().clear()
+    _LocalColumns.clear()
 
 
 def ClearRemoteInfo():
@@ -1237,6 +1372,7 @@ def ClearRemoteInfo():
     """
     remote_files().clear()
     remote_max_block_numbers().clear()
+    _RemoteColumns.clear()
 
 
 def ClearSupplierRemoteInfo(supplierNum, customer_idurl=None):
@@ -1263,6 +1399,7 @@ def ClearSupplierRemoteInfo(supplierNum, customer_idurl=None):
                         remote_files()[backupID][blockNum]['P'][supplierNum] = 0
                 except:
                     pass
+                _columns_changed(backupID, blockNum, remote=True)
     return files
 
 #------------------------------------------------------------------------------
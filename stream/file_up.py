@@ -302,6 +302,7 @@ class FileUp(automat.Automat):
         """
         self.ackTime = time.time()
         self.parent.uploadingTimeoutCount = 0
+        self.parent.OnSendItemFinished(self, 'ack-received')
         if self.callOnAck:
             newpacket = args[0]
             reactor.callLater(0, self.callOnAck, newpacket, newpacket.OwnerID, self.packetID)  # @UndefinedVariable
@@ -310,6 +311,7 @@ class FileUp(automat.Automat):
         """
         Action method.
         """
+        self.parent.OnSendItemFinished(self, 'stop')
         if self.callOnFail:
             reactor.callLater(0, self.callOnFail, self.remoteID, self.packetID, 'failed')  # @UndefinedVariable
 
@@ -317,6 +319,7 @@ class FileUp(automat.Automat):
         """
         Action method.
         """
+        self.parent.OnSendItemFinished(self, event)
         if event == 'fail-received':
             if self.callOnFail:
                 reactor.callLater(0, self.callOnFail, self.remoteID, self.packetID, 'failed')  # @UndefinedVariable
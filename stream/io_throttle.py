@@ -39,6 +39,11 @@ I check to see how much stuff I have waiting.
 
 Keep track of every supplier, store packets send/request in many queues.
 
+Outgoing files are started when something happens with the queue: new file was added,
+Ack() or Fail() received, or sending failed. Number of files sent to one supplier at
+the same time is limited by the ``SendWindow``, it is calculated from measured ack latency
+and delivery rate (bandwidth-delay product) of that supplier.
+
 TODO:
 We probably want to be able to send not only to suppliers but to any contacts.
 In future we can use that to do "overlay" communications to hide users.
@@ -59,6 +64,7 @@ _DebugLevel = 12
 import os
 import sys
 import time
+import math
 
 #------------------------------------------------------------------------------
 
@@ -88,12 +94,18 @@ from p2p import online_status
 from crypt import signed
 
 from transport import callback
+from transport import timeouts
 
 #------------------------------------------------------------------------------
 
 _IOThrottle = None
 _PacketReportCallbackFunc = None
 
+_MinSendWindow = 1
+_MaxSendWindow = 64
+_SendWindowGain = 2.0
+_SendWindowSamples = 10
+
 #------------------------------------------------------------------------------
 
 
@@ -263,6 +275,80 @@ def GetSendQueueLength(supplierIDURL):
 def GetRequestQueueLength(supplierIDURL):
     return throttle().GetRequestQueueLength(supplierIDURL)
 
+
+def GetSendingStats():
+    return throttle().GetSendingStats()
+
+#------------------------------------------------------------------------------
+
+
+class SendWindow(object):
+    """
+    Number of files which can be sent to a supplier at the same time.
+
+    On every Ack() the round trip time and the delivery rate are measured: delivery rate is
+    amount of bytes acknowledged by that supplier between sending and acknowledging the file.
+    Window is set to the bandwidth-delay product (max recent delivery rate * min recent round
+    trip time) multiplied by ``_SendWindowGain`` and converted to a number of files. Window grows
+    by one file per Ack() and is cut in half when sending fails or times out.
+    """
+
+    def __init__(self, initial_size, min_size=None, max_size=None):
+        self.min_size = min_size or _MinSendWindow
+        self.max_size = max_size or _MaxSendWindow
+        self.size = max(self.min_size, min(self.max_size, initial_size))
+        self.delivered = 0
+        self.acked = 0
+        self.failed = 0
+        self.srtt = None
+        self.avg_packet_size = None
+        self.rtt_samples = []
+        self.bandwidth_samples = []
+
+    def min_rtt(self):
+        return min(self.rtt_samples) if self.rtt_samples else None
+
+    def bandwidth(self):
+        return max(self.bandwidth_samples) if self.bandwidth_samples else None
+
+    def target_size(self):
+        bandwidth = self.bandwidth()
+        min_rtt = self.min_rtt()
+        if not bandwidth or not min_rtt or not self.avg_packet_size:
+            return None
+        bdp = bandwidth * min_rtt
+        return max(self.min_size, min(self.max_size, int(math.ceil(_SendWindowGain * bdp / self.avg_packet_size))))
+
+    def on_acked(self, size, rtt, delivered_before):
+        """
+        Must be called when Ack() received, ``delivered_before`` is value of ``delivered`` when the file was sent.
+        """
+        rtt = max(rtt, 0.001)
+        self.acked += 1
+        self.delivered += size
+        self.srtt = rtt if self.srtt is None else (0.875 * self.srtt + 0.125 * rtt)
+        self.avg_packet_size = size if self.avg_packet_size is None else (0.875 * self.avg_packet_size + 0.125 * size)
+        self.avg_packet_size = max(self.avg_packet_size, 1)
+        self.rtt_samples.append(rtt)
+        self.bandwidth_samples.append((self.delivered - delivered_before) / rtt)
+        del self.rtt_samples[:-_SendWindowSamples]
+        del self.bandwidth_samples[:-_SendWindowSamples]
+        target = self.target_size()
+        if target is None:
+            return self.size
+        if target > self.size:
+            self.size += 1
+        else:
+            self.size = target
+        return self.size
+
+    def on_failed(self):
+        self.failed += 1
+        self.size = max(self.min_size, self.size // 2)
+        # delivery rate must be measured again
+        self.bandwidth_samples = []
+        return self.size
+
 #------------------------------------------------------------------------------
 
 
@@ -278,8 +364,11 @@ class SupplierQueue:
 
         # all sends we'll hold on to, only several will be active,
         # but will hold onto the next ones to be sent
-        # active files
+        # active files, this is initial size of the sending window
         self.fileSendMaxLength = config.conf().getInt('services/data-motion/supplier-sending-queue-size', 8)
+        self.sendWindow = SendWindow(self.fileSendMaxLength)
+        # files which are currently sending: packetID -> (f_up, delivered bytes counter when started, )
+        self.sendInFlight = {}
         # an array of packetId, preserving first in first out,
         # of which the first maxLength are the "active" sends
         self.fileSendQueue = []
@@ -306,7 +395,6 @@ class SupplierQueue:
 
         self._runSend = False
         self.sendTask = None
-        self.sendTaskDelay = 0.1
         self.requestTask = None
         self.requestTaskDelay = 0.1
 
@@ -421,87 +509,84 @@ class SupplierQueue:
                 str(newpacket), self.remoteName, len(self.fileSendQueue)))
 
     def RunSend(self):
+        """
+        Start files from the beginning of the queue while the sending window is not full.
+        """
+        self.sendTask = None
+        if self.shutdown:
+            self.StopAllSindings()
+            return 0
         if self._runSend:
-            return
+            return 0
         self._runSend = True
         if _Debug:
-            lg.out(_DebugLevel * 2, 'io_throttle.RunSend  fileSendQueue=%d' % len(self.fileSendQueue))
-        packetsToBeFailed = {}
-        packetsToRemove = set()
-        packetsSent = 0
-        # let's check only beginning of the queue and try to process it.
-        # once we finish and remove some items from the queue we can take more items
-        for i in range(0, min(self.fileSendMaxLength, len(self.fileSendQueue))):
-            try:
-                packetID = self.fileSendQueue[i]
-            except:
-                lg.warn("item at position %d not exist in send queue" % i)
-                continue
-
-            f_up = self.fileSendDict[packetID]
-
-            if f_up.state != 'IN_QUEUE':
+            lg.out(_DebugLevel * 2, 'io_throttle.RunSend  fileSendQueue=%d in flight=%d window=%d' % (
+                len(self.fileSendQueue), len(self.sendInFlight), self.sendWindow.size))
+        packetsStarted = 0
+        for packetID in list(self.fileSendQueue):
+            if len(self.sendInFlight) >= self.sendWindow.size:
+                break
+            f_up = self.fileSendDict.get(packetID)
+            if not f_up or f_up.state != 'IN_QUEUE':
                 # we are sending that file at the moment
-                packetsSent += 1
-                # and we got ack
-                if f_up.ackTime is None:
-                    # if we did not get an ack yet we do not want to wait to long
-                    if time.time() - f_up.sendTime > f_up.sendTimeout:
-                        # so this packet is failed because no response for too long
-                        packetsToBeFailed[packetID] = 'timeout'
-                        lg.warn('uploading %r failed because of timeout %d src' % (packetID, f_up.sendTimeout, ))
-                # this packet already in progress - check next one
                 continue
-
             # the data file to send no longer exists - it is failed situation
             if not os.path.exists(f_up.fileName):
                 lg.warn("file %s not exist" % (f_up.fileName))
-                packetsToBeFailed[packetID] = 'not exist'
+                f_up.event('file-not-exist')
                 continue
-
+            self.sendInFlight[packetID] = (f_up, self.sendWindow.delivered, )
             # item is in the queue, but not started yet
             f_up.event('start')
-
-        # process failed packets
-        for packetID, why in packetsToBeFailed.items():
-            f_up = self.fileSendDict[packetID]
-            if why == 'timeout':
-                f_up.event('timeout')
-            elif why == 'not exist':
-                f_up.event('file-not-exist')
-            else:
-                raise Exception('unknown result %r for %r' % (why, packetID))
-        # remember results
-        result = max(len(packetsToRemove), packetsSent)
-        # erase temp lists
-        del packetsToBeFailed
-        del packetsToRemove
+            if packetID in self.sendInFlight:
+                timeouts.register(('io_throttle', id(self), packetID, ), f_up.sendTimeout, self._on_send_timeout, packetID, f_up)
+                packetsStarted += 1
         self._runSend = False
-        return result
+        return packetsStarted
 
-    def SendingTask(self):
-        if self.shutdown:
-            self.StopAllSindings()
+    def DoSend(self):
+        if self.sendTask and self.sendTask.active():
             return
-        sends = self.RunSend()
-        self.sendTaskDelay = misc.LoopAttenuation(
-            self.sendTaskDelay,
-            sends > 0,
-            settings.MinimumSendingDelay(),
-            settings.MaximumSendingDelay())
-        # attenuation
-        self.sendTask = reactor.callLater(self.sendTaskDelay, self.SendingTask)  # @UndefinedVariable
+        self.sendTask = reactor.callLater(0, self.RunSend)  # @UndefinedVariable
 
-    def DoSend(self):
-        if self.sendTask is None:
-            self.SendingTask()
+    def OnSendItemFinished(self, f_up, event):
+        """
+        Called from ``file_up()`` when the file was delivered, failed or stopped.
+        """
+        started = self.sendInFlight.pop(f_up.packetID, None)
+        if not started or started[0] is not f_up:
             return
-        if self._runSend:
+        timeouts.unregister(('io_throttle', id(self), f_up.packetID, ))
+        if event == 'ack-received':
+            self.sendWindow.on_acked(f_up.fileSize or 0, time.time() - (f_up.sendTime or time.time()), started[1])
+        elif event in ('timeout', 'sending-failed', ):
+            self.sendWindow.on_failed()
+        if _Debug:
+            lg.args(_DebugLevel, packetID=f_up.packetID, event=event, window=self.sendWindow.size, in_flight=len(self.sendInFlight))
+
+    def GetSendingStats(self):
+        in_flight_bytes = 0
+        for f_up, _ in self.sendInFlight.values():
+            in_flight_bytes += f_up.fileSize or 0
+        return {
+            'window': self.sendWindow.size,
+            'queued': len(self.fileSendQueue),
+            'in_flight': len(self.sendInFlight),
+            'in_flight_bytes': in_flight_bytes,
+            'srtt': self.sendWindow.srtt,
+            'min_rtt': self.sendWindow.min_rtt(),
+            'bandwidth': self.sendWindow.bandwidth(),
+            'delivered_bytes': self.sendWindow.delivered,
+            'acked': self.sendWindow.acked,
+            'failed': self.sendWindow.failed,
+        }
+
+    def _on_send_timeout(self, packetID, f_up):
+        if self.fileSendDict.get(packetID) is not f_up or f_up.ackTime is not None:
             return
-        if self.sendTaskDelay > 1.0:
-            self.sendTask.cancel()
-            self.sendTask = None
-            reactor.callLater(0, self.SendingTask)  # @UndefinedVariable
+        # so this packet is failed because no response for too long
+        lg.warn('uploading %r failed because of timeout %d sec' % (packetID, f_up.sendTimeout, ))
+        f_up.event('timeout')
 
     #------------------------------------------------------------------------------
 
@@ -712,6 +797,9 @@ class SupplierQueue:
             lg.out(_DebugLevel, 'io_throttle.RemoveSupplierWork for %r' % self.remoteID)
         self.DeleteBackupSendings(backupName=None)
         self.DeleteBackupRequests(backupName=None)
+        if self.sendTask and self.sendTask.active():
+            self.sendTask.cancel()
+        self.sendTask = None
 
     #------------------------------------------------------------------------------
 
@@ -734,7 +822,8 @@ class SupplierQueue:
         return len(self.fileRequestQueue) > 0
 
     def OkToSend(self):
-        return len(self.fileSendQueue) < self.fileSendMaxLength
+        # keep next files ready to be started when the window opens
+        return len(self.fileSendQueue) < max(self.fileSendMaxLength, 2 * self.sendWindow.size)
 
     def OkToRequest(self):
         return len(self.fileRequestQueue) < self.fileRequestMaxLength
@@ -956,6 +1045,12 @@ class IOThrottle:
             return 0
         return self.supplierQueues[supplierIDURL].GetRequestQueueLength()
 
+    def GetSendingStats(self):
+        """
+        Return sending window, files in flight and measured round trip time for every supplier.
+        """
+        return {supplierIDURL: q.GetSendingStats() for supplierIDURL, q in self.supplierQueues.items()}
+
     def GetSendQueueLength(self, supplierIDURL):
         """
         Return number of packets sent to this guy.
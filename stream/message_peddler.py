@@ -99,6 +99,7 @@ from storage import archive_writer
 from stream import p2p_queue
 from stream import queue_keeper
 from stream import message
+from stream import queue_log
 
 from userid import global_id
 from userid import id_url
@@ -424,12 +425,48 @@ def increment_sequence_id(queue_id):
 
 #------------------------------------------------------------------------------
 
-def store_message(queue_id, sequence_id, producer_id, payload, created, processed=None):
+def queue_log_dir(queue_id):
+    service_dir = settings.ServiceDir('service_message_broker')
+    queues_dir = os.path.join(service_dir, 'queues')
+    queue_dir = os.path.join(queues_dir, queue_id)
+    return os.path.join(queue_dir, 'log')
+
+
+def open_queue_log(queue_id):
+    return queue_log.open_log(queue_id, queue_log_dir(queue_id))
+
+
+def migrate_queue_messages(queue_id):
+    """
+    One time migration from the old layout where every message was stored in a separate file.
+    """
     service_dir = settings.ServiceDir('service_message_broker')
     queues_dir = os.path.join(service_dir, 'queues')
     queue_dir = os.path.join(queues_dir, queue_id)
     messages_dir = os.path.join(queue_dir, 'messages')
-    message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
+    if not os.path.isdir(messages_dir):
+        return 0
+    qlog = open_queue_log(queue_id)
+    all_stored_queue_messages = [i for i in os.listdir(messages_dir) if i.isdigit()]
+    all_stored_queue_messages.sort(key=lambda i: int(i))
+    migrated = 0
+    for sequence_id in all_stored_queue_messages:
+        if int(sequence_id) in qlog.messages:
+            # migration was interrupted before, this message was already copied
+            continue
+        stored_json_message = jsn.loads_text(local_fs.ReadTextFile(os.path.join(messages_dir, sequence_id)))
+        if not stored_json_message:
+            lg.err('failed reading message %s from %r' % (sequence_id, queue_id, ))
+            continue
+        qlog.append_message(stored_json_message)
+        migrated += 1
+    qlog.sync()
+    bpio.rmdir_recursive(messages_dir, ignore_errors=True)
+    lg.info('migrated %d messages of %r to the queue log' % (migrated, queue_id, ))
+    return migrated
+
+
+def store_message(queue_id, sequence_id, producer_id, payload, created, processed=None):
     stored_json_message = {
         'sequence_id': sequence_id,
         'created': created,
@@ -446,7 +483,10 @@ def store_message(queue_id, sequence_id, producer_id, payload, created, processe
             'failed_consumers': [],
         })
         stored_json_message['processed'] = processed
-    if not local_fs.WriteTextFile(message_path, jsn.dumps(stored_json_message)):
+    try:
+        open_queue_log(queue_id).append_message(stored_json_message)
+    except:
+        lg.exc()
         return None
     return stored_json_message
 
@@ -454,80 +494,39 @@ def store_message(queue_id, sequence_id, producer_id, payload, created, processe
 def update_processed_message(queue_id, sequence_id):
     if _Debug:
         lg.args(_DebugLevel, queue_id=queue_id, sequence_id=sequence_id)
-    service_dir = settings.ServiceDir('service_message_broker')
-    queues_dir = os.path.join(service_dir, 'queues')
-    queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
-    message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
-    stored_json_message = jsn.loads_text(local_fs.ReadTextFile(message_path))
-    if not stored_json_message:
+    qlog = open_queue_log(queue_id)
+    stored_state = qlog.get_state(sequence_id)
+    if not stored_state:
         lg.err('failed reading message %d from %r' % (sequence_id, queue_id, ))
         return False
-    stored_json_message['processed'] = utime.get_sec1970()
-    if not local_fs.WriteTextFile(message_path, jsn.dumps(stored_json_message)):
-        return False
-    return True
+    stored_state['processed'] = utime.get_sec1970()
+    return qlog.set_state(sequence_id, stored_state)
 
 
 def erase_message(queue_id, sequence_id):
     if _Debug:
         lg.args(_DebugLevel, queue_id=queue_id, sequence_id=sequence_id)
-    service_dir = settings.ServiceDir('service_message_broker')
-    queues_dir = os.path.join(service_dir, 'queues')
-    queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
-    message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
     try:
-        os.remove(message_path)
+        return open_queue_log(queue_id).erase(sequence_id)
     except:
         lg.exc()
         return False
-    return True
 
 
 def read_messages(queue_id, sequence_id_list=[]):
-    service_dir = settings.ServiceDir('service_message_broker')
-    queues_dir = os.path.join(service_dir, 'queues')
-    queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
+    qlog = open_queue_log(queue_id)
     if not sequence_id_list:
-        sequence_id_list = [int(sequence_id) for sequence_id in os.listdir(messages_dir)]
-    result = []
-    for sequence_id in sequence_id_list:
-        message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
-        stored_json_message = jsn.loads_text(local_fs.ReadTextFile(message_path))
-        if not stored_json_message:
-            lg.err('failed reading message %d from %r' % (sequence_id, queue_id, ))
-            continue
+        sequence_id_list = qlog.sequence_ids()
+    result = qlog.read_messages(sequence_id_list)
+    for stored_json_message in result:
         stored_json_message.pop('attempts')
-        result.append(stored_json_message)
     return result
 
 
 def get_messages_for_consumer(queue_id, consumer_id, consumer_last_sequence_id, max_messages_count=100):
-    service_dir = settings.ServiceDir('service_message_broker')
-    queues_dir = os.path.join(service_dir, 'queues')
-    queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
-    all_stored_queue_messages = os.listdir(messages_dir)
-    all_stored_queue_messages.sort(key=lambda i: int(i))
-    result = []
-    for sequence_id in all_stored_queue_messages:
-        if consumer_last_sequence_id >= int(sequence_id):
-            continue
-        message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
-        try:
-            stored_json_message = jsn.loads_text(local_fs.ReadTextFile(message_path))
-        except:
-            lg.exc()
-            continue
-        if not stored_json_message:
-            lg.err('failed reading message %d from %r' % (sequence_id, queue_id, ))
-            continue
+    result = open_queue_log(queue_id).read_messages_after(consumer_last_sequence_id, max_messages_count=max_messages_count)
+    for stored_json_message in result:
         stored_json_message.pop('attempts')
-        result.append(stored_json_message)
-        if len(result) >= max_messages_count:
-            break
     if _Debug:
         lg.args(_DebugLevel, queue_id=queue_id, consumer_id=consumer_id, consumer_last_sequence_id=consumer_last_sequence_id, result=len(result))
     return result
@@ -537,52 +536,40 @@ def get_messages_for_consumer(queue_id, consumer_id, consumer_last_sequence_id,
 def register_delivery(queue_id, sequence_id, message_id):
     if _Debug:
         lg.args(_DebugLevel, queue_id=queue_id, sequence_id=sequence_id, message_id=message_id)
-    service_dir = settings.ServiceDir('service_message_broker')
-    queues_dir = os.path.join(service_dir, 'queues')
-    queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
-    message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
-    stored_json_message = jsn.loads_text(local_fs.ReadTextFile(message_path))
-    if not stored_json_message:
+    qlog = open_queue_log(queue_id)
+    stored_state = qlog.get_state(sequence_id)
+    if not stored_state:
         lg.err('failed reading message %d from %r' % (sequence_id, queue_id, ))
         return False
-    stored_json_message['attempts'].append({
+    stored_state['attempts'].append({
         'message_id': message_id,
         'started': utime.get_sec1970(),
         'finished': None,
         'failed_consumers': [],
     })
-    if not local_fs.WriteTextFile(message_path, jsn.dumps(stored_json_message)):
-        return False
-    return True
+    return qlog.set_state(sequence_id, stored_state)
 
 
 def unregister_delivery(queue_id, sequence_id, message_id, failed_consumers):
     if _Debug:
         lg.args(_DebugLevel, queue_id=queue_id, sequence_id=sequence_id, message_id=message_id, failed_consumers=failed_consumers)
-    service_dir = settings.ServiceDir('service_message_broker')
-    queues_dir = os.path.join(service_dir, 'queues')
-    queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
-    message_path = os.path.join(messages_dir, strng.to_text(sequence_id))
-    stored_json_message = jsn.loads_text(local_fs.ReadTextFile(message_path))
-    if not stored_json_message:
+    qlog = open_queue_log(queue_id)
+    stored_state = qlog.get_state(sequence_id)
+    if not stored_state:
         lg.err('failed reading message %d from %r' % (sequence_id, queue_id, ))
         return False
     found_attempt_number = None
-    for attempt_number in range(len(stored_json_message['attempts'])-1, -1, -1):
-        if stored_json_message['attempts'][attempt_number]['message_id'] == message_id:
+    for attempt_number in range(len(stored_state['attempts'])-1, -1, -1):
+        if stored_state['attempts'][attempt_number]['message_id'] == message_id:
             found_attempt_number = attempt_number
             break
     if found_attempt_number is None:
         return False
-    stored_json_message['attempts'][found_attempt_number].update({
+    stored_state['attempts'][found_attempt_number].update({
         'finished': utime.get_sec1970(),
         'failed_consumers': failed_consumers,
     })
-    if not local_fs.WriteTextFile(message_path, jsn.dumps(stored_json_message)):
-        return False
-    return True
+    return qlog.set_state(sequence_id, stored_state)
 
 #------------------------------------------------------------------------------
 
@@ -607,7 +594,6 @@ def load_streams():
         bpio._dirs_make(queues_dir)
     for queue_id in os.listdir(queues_dir):
         queue_dir = os.path.join(queues_dir, queue_id)
-        messages_dir = os.path.join(queue_dir, 'messages')
         consumers_dir = os.path.join(queue_dir, 'consumers')
         producers_dir = os.path.join(queue_dir, 'producers')
         if queue_id not in streams():
@@ -617,22 +603,16 @@ def load_streams():
                 lg.exc()
                 continue
             loaded_queues += 1
-        last_sequence_id = -1
-        all_stored_queue_messages = os.listdir(messages_dir)
-        all_stored_queue_messages.sort(key=lambda i: int(i))
-        for sequence_id in all_stored_queue_messages:
-            stored_json_message = jsn.loads_text(local_fs.ReadTextFile(os.path.join(messages_dir, sequence_id)))
-            if stored_json_message:
-                if stored_json_message.get('processed'):
-                    streams()[queue_id]['archive'].append(sequence_id)
-                    loaded_archive_messages += 1
-                else:
-                    streams()[queue_id]['messages'].append(sequence_id)
-                if int(sequence_id) >= last_sequence_id:
-                    last_sequence_id = sequence_id
-                loaded_messages += 1
+        migrate_queue_messages(queue_id)
+        qlog = open_queue_log(queue_id)
+        for sequence_id in qlog.sequence_ids():
+            if qlog.get_state(sequence_id).get('processed'):
+                streams()[queue_id]['archive'].append(sequence_id)
+                loaded_archive_messages += 1
             else:
-                lg.err('failed reading message %d from %r' % (sequence_id, queue_id, ))
+                streams()[queue_id]['messages'].append(sequence_id)
+            loaded_messages += 1
+        last_sequence_id = qlog.latest_sequence_id()
         streams()[queue_id]['last_sequence_id'] = last_sequence_id
         for consumer_id in os.listdir(consumers_dir):
             if consumer_id in streams()[queue_id]['consumers']:
@@ -697,14 +677,12 @@ def save_stream(queue_id):
     service_dir = settings.ServiceDir('service_message_broker')
     queues_dir = os.path.join(service_dir, 'queues')
     queue_dir = os.path.join(queues_dir, queue_id)
-    messages_dir = os.path.join(queue_dir, 'messages')
     consumers_dir = os.path.join(queue_dir, 'consumers')
     producers_dir = os.path.join(queue_dir, 'producers')
     stream_info = streams()[queue_id]
     if _Debug:
         lg.args(_DebugLevel, queue_id=queue_id, typ=type(queue_id), queue_dir=queue_dir)
-    if not os.path.isdir(messages_dir):
-        bpio._dirs_make(messages_dir)
+    open_queue_log(queue_id)
     if not os.path.isdir(consumers_dir):
         bpio._dirs_make(consumers_dir)
     if not os.path.isdir(producers_dir):
@@ -721,6 +699,7 @@ def erase_stream(queue_id):
     queues_dir = os.path.join(service_dir, 'queues')
     queue_dir = os.path.join(queues_dir, queue_id)
     erased_files = 0
+    queue_log.close_log(queue_id)
     if os.path.isdir(queue_dir):
         erased_files += bpio.rmdir_recursive(queue_dir, ignore_errors=True)
     if _Debug:
@@ -1239,6 +1218,7 @@ class MessagePeddler(automat.Automat):
         global _MessagePeddler
         message.clear_consumer_callbacks(self.name)
         events.remove_subscriber(self._on_identity_url_changed, 'identity-url-changed')
+        queue_log.close_all()
         self.destroy()
         _MessagePeddler = None
 
@@ -1388,6 +1368,7 @@ class MessagePeddler(automat.Automat):
         # TODO: notify other message brokers about that
         for sequence_id in streams()[queue_id]['archive']:
             erase_message(queue_id, sequence_id)
+        open_queue_log(queue_id).compact()
         if queue_id not in streams():
             lg.err('did not found stream %s' % queue_id)
         else:
@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# queue_log.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (queue_log.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+"""
+..
+
+module:: queue_log
+
+Append-only storage for messages of one queue kept by ``message_peddler()``.
+
+Records are appended to segment files "<number>.log" in the queue folder, a new segment
+is started when the current one becomes too big. Every record has a header with CRC32,
+record kind, sequence ID, revision number and length of the body:
+
+    + message record: JSON with "sequence_id", "created", "producer_id" and "payload"
+    + state record: JSON with "attempts" and "processed" fields of the message
+    + erased record: number of the segment where the message was stored
+
+Message body is never modified, every change of delivery attempts or "processed" time
+is written as a new state record. Revision numbers are growing inside the whole log,
+so the latest state always wins when the segments are scanned during start up.
+
+Offset index is kept in memory: sequence ID -> (segment, offset, size). Only headers and
+small state records are read to build it, bodies of the messages are skipped. Reading
+messages for a consumer is a seek to the first record and a sequential read after that.
+
+Records are flushed to the OS immediately, but ``os.fsync()`` is called once for a batch
+of records or after a short delay. Sealed segments are compacted after the messages
+were erased: empty segments are removed and segments with mostly garbage are rewritten.
+"""
+
+#------------------------------------------------------------------------------
+
+from __future__ import absolute_import
+
+#------------------------------------------------------------------------------
+
+_Debug = False
+_DebugLevel = 10
+
+#------------------------------------------------------------------------------
+
+import os
+import zlib
+import struct
+import bisect
+
+from twisted.internet import reactor  # @UnresolvedImport
+
+#------------------------------------------------------------------------------
+
+from logs import lg
+
+from lib import jsn
+from lib import strng
+
+from system import bpio
+from system import local_fs
+
+#------------------------------------------------------------------------------
+
+RECORD_MESSAGE = 1
+RECORD_STATE = 2
+RECORD_ERASED = 3
+
+_RecordHeader = struct.Struct('>IBqQI')  # crc32, kind, sequence_id, revision, body length
+_ErasedBody = struct.Struct('>I')
+
+_SegmentMaxSize = 8 * 1024 * 1024
+_SyncBatchSize = 64
+_SyncDelay = 0.5
+
+#------------------------------------------------------------------------------
+
+_Logs = {}
+_SyncTask = None
+
+#------------------------------------------------------------------------------
+
+
+def open_log(queue_id, log_dir):
+    """
+    Open and scan segments of the queue log, returns already opened ``QueueLog`` if exist.
+    """
+    if queue_id in _Logs:
+        return _Logs[queue_id]
+    qlog = QueueLog(queue_id, log_dir)
+    qlog.open()
+    _Logs[queue_id] = qlog
+    return qlog
+
+
+def get_log(queue_id):
+    return _Logs.get(queue_id)
+
+
+def close_log(queue_id):
+    qlog = _Logs.pop(queue_id, None)
+    if not qlog:
+        return False
+    qlog.close()
+    if not _Logs:
+        _stop_sync()
+    return True
+
+
+def close_all():
+    for queue_id in list(_Logs.keys()):
+        close_log(queue_id)
+    _stop_sync()
+
+
+def sync_all():
+    """
+    Call ``os.fsync()`` for all logs which have not synchronized records.
+    """
+    global _SyncTask
+    _SyncTask = None
+    for qlog in _Logs.values():
+        try:
+            qlog.sync()
+        except:
+            lg.exc()
+
+
+def _schedule_sync():
+    global _SyncTask
+    if _SyncTask and _SyncTask.active():
+        return
+    _SyncTask = reactor.callLater(_SyncDelay, sync_all)  # @UndefinedVariable
+
+
+def _stop_sync():
+    global _SyncTask
+    if _SyncTask and _SyncTask.active():
+        _SyncTask.cancel()
+    _SyncTask = None
+
+#------------------------------------------------------------------------------
+
+
+def _pack_record(kind, sequence_id, revision, body):
+    fields = _RecordHeader.pack(0, kind, sequence_id, revision, len(body))[4:]
+    crc = zlib.crc32(body, zlib.crc32(fields)) & 0xFFFFFFFF
+    return struct.pack('>I', crc) + fields + body
+
+
+def _check_record(raw_header, body):
+    crc = struct.unpack('>I', raw_header[:4])[0]
+    return crc == zlib.crc32(body, zlib.crc32(raw_header[4:])) & 0xFFFFFFFF
+
+
+class QueueLog(object):
+    """
+    Segmented append-only log of a single queue.
+    """
+
+    def __init__(self, queue_id, log_dir, segment_max_size=None, sync_batch_size=None):
+        self.queue_id = queue_id
+        self.log_dir = log_dir
+        self.segment_max_size = segment_max_size or _SegmentMaxSize
+        self.sync_batch_size = sync_batch_size or _SyncBatchSize
+        # sequence_id -> [segment, offset, size, message revision, state revision, state]
+        self.messages = {}
+        self.order = []
+        self.segments = []
+        self.segment_sizes = {}
+        self.live_sizes = {}
+        self.revision = 0
+        self.writer = None
+        self.reader = None
+        self.reader_segment = None
+        self.unsynced = 0
+        self.counters = {
+            'appended': 0,
+            'fsyncs': 0,
+            'reads': 0,
+            'seeks': 0,
+            'compacted': 0,
+            'removed_segments': 0,
+        }
+
+    def __repr__(self):
+        return 'QueueLog(%s|%d messages in %d segments)' % (self.queue_id, len(self.order), len(self.segments))
+
+    def segment_path(self, segment):
+        return os.path.join(self.log_dir, '%08d.log' % segment)
+
+    def open(self):
+        if not os.path.isdir(self.log_dir):
+            bpio._dirs_make(self.log_dir)
+        segments = []
+        for filename in os.listdir(self.log_dir):
+            if filename.endswith('.log') and filename[:-4].isdigit():
+                segments.append(int(filename[:-4]))
+        segments.sort()
+        for segment in segments:
+            self.segments.append(segment)
+            self._scan(segment, is_active=(segment == segments[-1]))
+        self.order = sorted(self.messages.keys())
+        if not self.segments:
+            self.segments.append(0)
+            self.segment_sizes[0] = 0
+        self.writer = open(self.segment_path(self.segments[-1]), 'ab')
+        if _Debug:
+            lg.args(_DebugLevel, queue_id=self.queue_id, messages=len(self.order), segments=len(self.segments))
+
+    def close(self):
+        if self.writer:
+            self.sync()
+            self.writer.close()
+            self.writer = None
+        self._close_reader()
+
+    def sync(self):
+        if not self.writer or not self.unsynced:
+            return False
+        self.writer.flush()
+        os.fsync(self.writer.fileno())
+        self.unsynced = 0
+        self.counters['fsyncs'] += 1
+        return True
+
+    #------------------------------------------------------------------------------
+
+    def sequence_ids(self):
+        return list(self.order)
+
+    def latest_sequence_id(self):
+        return self.order[-1] if self.order else -1
+
+    def get_state(self, sequence_id):
+        """
+        Returns a copy of "attempts" and "processed" fields of the message or None if it is not found.
+        """
+        entry = self.messages.get(sequence_id)
+        if entry is None:
+            return None
+        return {
+            'attempts': [dict(a) for a in entry[5]['attempts']],
+            'processed': entry[5]['processed'],
+        }
+
+    def set_state(self, sequence_id, state):
+        entry = self.messages.get(sequence_id)
+        if entry is None:
+            return False
+        new_state = {
+            'attempts': state.get('attempts') or [],
+            'processed': state.get('processed'),
+        }
+        self.revision += 1
+        self._append(RECORD_STATE, sequence_id, self.revision, strng.to_bin(jsn.dumps(new_state)))
+        entry[4] = self.revision
+        entry[5] = new_state
+        return True
+
+    def append_message(self, stored_json_message):
+        """
+        Store new message, same sequence ID stored again will replace the previous message.
+        """
+        sequence_id = int(stored_json_message['sequence_id'])
+        body = strng.to_bin(jsn.dumps({
+            'sequence_id': sequence_id,
+            'created': stored_json_message.get('created'),
+            'producer_id': stored_json_message.get('producer_id'),
+            'payload': stored_json_message.get('payload'),
+        }))
+        self.revision += 1
+        segment, offset, size = self._append(RECORD_MESSAGE, sequence_id, self.revision, body)
+        old_entry = self.messages.get(sequence_id)
+        if old_entry is not None:
+            self.live_sizes[old_entry[0]] -= old_entry[2]
+        else:
+            bisect.insort(self.order, sequence_id)
+        self.messages[sequence_id] = [segment, offset, size, self.revision, self.revision, {'attempts': [], 'processed': None, }, ]
+        self.live_sizes[segment] = self.live_sizes.get(segment, 0) + size
+        if stored_json_message.get('attempts') or stored_json_message.get('processed'):
+            self.set_state(sequence_id, stored_json_message)
+        return True
+
+    def erase(self, sequence_id):
+        entry = self.messages.pop(sequence_id, None)
+        if entry is None:
+            return False
+        pos = bisect.bisect_left(self.order, sequence_id)
+        del self.order[pos]
+        self.live_sizes[entry[0]] -= entry[2]
+        self.revision += 1
+        self._append(RECORD_ERASED, sequence_id, self.revision, _ErasedBody.pack(entry[0]))
+        return True
+
+    def read_messages(self, sequence_id_list):
+        """
+        Read stored messages with "attempts" and "processed" fields, unknown sequence IDs are skipped.
+        """
+        result = []
+        for sequence_id in sequence_id_list:
+            json_message = self._read(int(sequence_id))
+            if json_message is not None:
+                result.append(json_message)
+        return result
+
+    def read_messages_after(self, sequence_id, max_messages_count=100):
+        """
+        Read messages with sequence ID greater than given, in order.
+        """
+        pos = bisect.bisect_right(self.order, sequence_id)
+        return self.read_messages(self.order[pos:pos + max_messages_count])
+
+    def compact(self):
+        """
+        Remove or rewrite sealed segments where most of the records are not needed anymore.
+        """
+        compacted = 0
+        for segment in self.segments[:-1]:
+            live_size = self.live_sizes.get(segment, 0)
+            if live_size > 0 and live_size * 2 >= self.segment_sizes.get(segment, 0):
+                continue
+            try:
+                self._rewrite(segment)
+            except:
+                lg.exc()
+                continue
+            compacted += 1
+        if _Debug:
+            lg.args(_DebugLevel, queue_id=self.queue_id, compacted=compacted, segments=len(self.segments))
+        return compacted
+
+    #------------------------------------------------------------------------------
+
+    def _append(self, kind, sequence_id, revision, body):
+        if self.segment_sizes[self.segments[-1]] >= self.segment_max_size:
+            self._rotate()
+        segment = self.segments[-1]
+        offset = self.segment_sizes[segment]
+        raw = _pack_record(kind, sequence_id, revision, body)
+        self.writer.write(raw)
+        self.writer.flush()
+        self.segment_sizes[segment] = offset + len(raw)
+        self.counters['appended'] += 1
+        self.unsynced += 1
+        if self.unsynced >= self.sync_batch_size:
+            self.sync()
+        else:
+            _schedule_sync()
+        return segment, offset, len(raw)
+
+    def _rotate(self):
+        self.sync()
+        self.writer.close()
+        segment = self.segments[-1] + 1
+        self.segments.append(segment)
+        self.segment_sizes[segment] = 0
+        self.writer = open(self.segment_path(segment), 'ab')
+
+    def _close_reader(self):
+        if self.reader:
+            self.reader.close()
+        self.reader = None
+        self.reader_segment = None
+
+    def _read(self, sequence_id):
+        entry = self.messages.get(sequence_id)
+        if entry is None:
+            lg.err('message %d not found in %r' % (sequence_id, self, ))
+            return None
+        segment, offset, size = entry[0], entry[1], entry[2]
+        if self.reader_segment != segment:
+            self._close_reader()
+            self.reader = open(self.segment_path(segment), 'rb')
+            self.reader_segment = segment
+        if self.reader.tell() != offset:
+            self.reader.seek(offset)
+            self.counters['seeks'] += 1
+        raw = self.reader.read(size)
+        self.counters['reads'] += 1
+        if len(raw) != size or not _check_record(raw[:_RecordHeader.size], raw[_RecordHeader.size:]):
+            lg.err('message %d is corrupted in %r' % (sequence_id, self, ))
+            self._close_reader()
+            return None
+        json_message = jsn.loads_text(strng.to_text(raw[_RecordHeader.size:]))
+        json_message['attempts'] = [dict(a) for a in entry[5]['attempts']]
+        json_message['processed'] = entry[5]['processed']
+        return json_message
+
+    def _iterate_records(self, fin, file_size, read_bodies):
+        offset = 0
+        while offset + _RecordHeader.size <= file_size:
+            raw_header = fin.read(_RecordHeader.size)
+            _, kind, sequence_id, revision, length = _RecordHeader.unpack(raw_header)
+            if offset + _RecordHeader.size + length > file_size:
+                break
+            if kind == RECORD_MESSAGE and not read_bodies:
+                fin.seek(length, os.SEEK_CUR)
+                body = None
+            else:
+                body = fin.read(length)
+                if not _check_record(raw_header, body):
+                    break
+            yield offset, kind, sequence_id, revision, _RecordHeader.size + length, body
+            offset += _RecordHeader.size + length
+
+    def _scan(self, segment, is_active):
+        path = self.segment_path(segment)
+        file_size = os.path.getsize(path)
+        valid_size = 0
+        with open(path, 'rb') as fin:
+            for offset, kind, sequence_id, revision, size, body in self._iterate_records(fin, file_size, read_bodies=False):
+                valid_size = offset + size
+                self.revision = max(self.revision, revision)
+                entry = self.messages.get(sequence_id)
+                if kind == RECORD_MESSAGE:
+                    if entry is not None:
+                        self.live_sizes[entry[0]] -= entry[2]
+                    self.messages[sequence_id] = [segment, offset, size, revision, revision, {'attempts': [], 'processed': None, }, ]
+                    self.live_sizes[segment] = self.live_sizes.get(segment, 0) + size
+                elif kind == RECORD_STATE:
+                    if entry is not None and revision > entry[4] and revision > entry[3]:
+                        entry[4] = revision
+                        entry[5] = jsn.loads_text(strng.to_text(body))
+                elif kind == RECORD_ERASED:
+                    if entry is not None and revision > entry[3]:
+                        self.messages.pop(sequence_id)
+                        self.live_sizes[entry[0]] -= entry[2]
+        if valid_size < file_size:
+            lg.warn('%d bytes of incomplete records found at the end of %r' % (file_size - valid_size, path, ))
+            if is_active:
+                with open(path, 'r+b') as fout:
+                    fout.truncate(valid_size)
+                file_size = valid_size
+        self.segment_sizes[segment] = file_size
+
+    def _rewrite(self, segment):
+        path = self.segment_path(segment)
+        kept = []
+        kept_size = 0
+        moved = {}
+        with open(path, 'rb') as fin:
+            for offset, kind, sequence_id, revision, size, body in self._iterate_records(fin, self.segment_sizes[segment], read_bodies=True):
+                entry = self.messages.get(sequence_id)
+                if kind == RECORD_MESSAGE:
+                    keep = entry is not None and entry[0] == segment and entry[1] == offset
+                elif kind == RECORD_STATE:
+                    keep = entry is not None and entry[4] == revision
+                else:
+                    # the erased message is still stored in another segment, must not appear again after restart
+                    target_segment = _ErasedBody.unpack(body)[0]
+                    keep = target_segment != segment and target_segment in self.segment_sizes
+                if keep:
+                    if kind == RECORD_MESSAGE:
+                        moved[sequence_id] = kept_size
+                    kept.append(_pack_record(kind, sequence_id, revision, body))
+                    kept_size += size
+        if self.reader_segment == segment:
+            self._close_reader()
+        if not kept:
+            os.remove(path)
+            self.segments.remove(segment)
+            self.segment_sizes.pop(segment, None)
+            self.live_sizes.pop(segment, None)
+            self.counters['removed_segments'] += 1
+            return True
+        if not local_fs.WriteBinaryFile(path, b''.join(kept)):
+            return False
+        for sequence_id, new_offset in moved.items():
+            self.messages[sequence_id][1] = new_offset
+        self.segment_sizes[segment] = kept_size
+        self.counters['compacted'] += 1
+        return True
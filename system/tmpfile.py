@@ -44,6 +44,7 @@ _DebugLevel = 10
 #------------------------------------------------------------------------------
 
 import os
+import io
 import tempfile
 import time
 
@@ -59,6 +60,8 @@ from system import bpio
 
 _TempDirPath = None
 _FilesDict = {}
+_MemoryFiles = {}
+_MemoryFilesCounter = 0
 _CollectorTask = None
 _SubDirs = {
 
@@ -228,6 +231,78 @@ def make(name, extension='', prefix=''):
     return fd, filename
 
 
+def make_in_memory(name, data, extension='', prefix=''):
+    """
+    Keep ``data`` in memory instead of writing a new file under sub folder
+    ``name`` and return a virtual path to identify it.
+
+    Nothing is created on disk, but the path is unique and can be passed to
+    ``exists()``, ``getsize()`` and ``open_for_reading()`` same way as a
+    regular temp file. Call ``release_in_memory()`` when the data is not
+    needed anymore, otherwise the collector will drop it after the lifetime
+    of the sub folder.
+    """
+    global _MemoryFilesCounter
+    if name not in list(_SubDirs.keys()):
+        name = 'all'
+    _MemoryFilesCounter += 1
+    filename = os.path.join(subdir(name), '%smem%d_%d%s' % (prefix, os.getpid(), _MemoryFilesCounter, extension))
+    _MemoryFiles[filename] = (name, data, time.time())
+    if _Debug:
+        lg.out(_DebugLevel, 'tmpfile.make_in_memory %s with %d bytes' % (filename, len(data)))
+    return filename
+
+
+def is_in_memory(filepath):
+    """
+    Return True if given path was created with ``make_in_memory()`` and was not released yet.
+    """
+    return filepath in _MemoryFiles
+
+
+def release_in_memory(filepath):
+    """
+    Forget the data kept in memory for given virtual path.
+
+    Already opened readers are not affected and can finish reading.
+    """
+    if _MemoryFiles.pop(filepath, None) is None:
+        return False
+    if _Debug:
+        lg.out(_DebugLevel, 'tmpfile.release_in_memory %s' % filepath)
+    return True
+
+
+def exists(filepath):
+    """
+    Same as ``os.path.isfile()`` but also aware about files kept in memory.
+    """
+    if filepath in _MemoryFiles:
+        return True
+    return os.path.isfile(filepath)
+
+
+def getsize(filepath):
+    """
+    Same as ``os.path.getsize()`` but also aware about files kept in memory.
+    """
+    if filepath in _MemoryFiles:
+        return len(_MemoryFiles[filepath][1])
+    return os.path.getsize(filepath)
+
+
+def open_for_reading(filepath):
+    """
+    Return a binary file-like object to read the content of given temp file.
+
+    For files kept in memory no disk access happens at all, the reader is
+    taking the bytes directly from the buffer.
+    """
+    if filepath in _MemoryFiles:
+        return io.BytesIO(_MemoryFiles[filepath][1])
+    return io.open(filepath, 'rb')
+
+
 def make_dir(name, extension='', prefix=''):
     """
     """
@@ -332,6 +407,11 @@ def collect():
     for name, filename in erase_list:
         erase(name, filename, 'collected')
 
+    for filename, (name, _, filetime) in list(_MemoryFiles.items()):
+        lifetime = _SubDirs.get(name, 0)
+        if lifetime and time.time() - filetime > lifetime:
+            _MemoryFiles.pop(filename, None)
+
     if _Debug:
         lg.out(_DebugLevel - 4, 'tmpfile.collect %d files erased' % len(erase_list))
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# backupmatrixscan.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (backupmatrixscan.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+from lib import packetid
+
+from contacts import contactsdb
+
+from userid import id_url
+
+from stream import io_throttle
+
+from storage import backup_matrix
+
+
+_BackupID = 'master$alice@127.0.0.1_8084:1/F20200101/'
+
+
+def _row_by_row_missing(backupID, active):
+    result = set()
+    remote = backup_matrix.remote_files()[backupID]
+    for blockNum in range(max(backup_matrix.local_max_block_numbers()[backupID], backup_matrix.remote_max_block_numbers()[backupID]) + 1):
+        if blockNum not in remote:
+            result.add(blockNum)
+            continue
+        for supplierNum in range(len(active)):
+            if active[supplierNum] != 1:
+                continue
+            if remote[blockNum]['D'][supplierNum] != 1 or remote[blockNum]['P'][supplierNum] != 1:
+                result.add(blockNum)
+    return list(result)
+
+
+def _row_by_row_to_send(backupID, active):
+    result = {}
+    local = backup_matrix.local_files()[backupID]
+    remote = backup_matrix.remote_files()[backupID]
+    for supplierNum in range(len(active)):
+        result[supplierNum] = set()
+    for blockNum in range(backup_matrix.local_max_block_numbers()[backupID] + 1):
+        for supplierNum in range(len(active)):
+            if active[supplierNum] != 1:
+                continue
+            for dataORparity in ('Data', 'Parity', ):
+                if remote[blockNum][dataORparity[0]][supplierNum] != 1 and local[blockNum][dataORparity[0]][supplierNum] == 1:
+                    result[supplierNum].add(packetid.MakePacketID(backupID, blockNum, supplierNum, dataORparity))
+    return result
+
+
+def _populate(blocks, suppliers):
+    rnd = random.Random(0)
+    local = {}
+    remote = {}
+    for blockNum in range(blocks):
+        # almost everything is delivered already, only few pieces are missing
+        local[blockNum] = {
+            'D': [1 if rnd.random() < 0.01 else 0 for _ in range(suppliers)],
+            'P': [1 if rnd.random() < 0.01 else 0 for _ in range(suppliers)],
+        }
+        remote[blockNum] = {
+            'D': [0 if rnd.random() < 0.001 else 1 for _ in range(suppliers)],
+            'P': [0 if rnd.random() < 0.001 else 1 for _ in range(suppliers)],
+        }
+    backup_matrix.local_files()[_BackupID] = local
+    backup_matrix.local_max_block_numbers()[_BackupID] = blocks - 1
+    backup_matrix.remote_files()[_BackupID] = remote
+    backup_matrix.remote_max_block_numbers()[_BackupID] = blocks - 1
+
+
+def _measure(method, *args):
+    t = time.time()
+    method(*args)
+    return time.time() - t
+
+
+def main():
+    # TEST
+    # call with number of blocks and number of suppliers as parameters, default is 10000 and 64:
+    # python backupmatrixscan.py 10000 64
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    suppliers = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    active = [1, ] * suppliers
+    supplier_idurls = ['http://127.0.0.1:8084/supplier%d.xml' % i for i in range(suppliers)]
+    backup_matrix._Debug = False
+    backup_matrix.GetActiveArray = lambda customer_idurl=None: list(active)
+    contactsdb.num_suppliers = lambda customer_idurl=None: suppliers
+    contactsdb.supplier = lambda index, customer_idurl=None: supplier_idurls[index]
+    contactsdb.suppliers = lambda customer_idurl=None: supplier_idurls
+    id_url.is_some_empty = lambda iterable_object: False
+    io_throttle.HasPacketInSendQueue = lambda supplierIDURL, packetID: False
+    _populate(blocks, suppliers)
+    print('blocks: %d, suppliers: %d' % (blocks, suppliers))
+    # first scans also build the columns for "remote" and "local" matrixes
+    build_time = _measure(backup_matrix.ScanMissingBlocks, _BackupID) + _measure(backup_matrix.ScanBlocksToSend, _BackupID)
+    print('%-22s %12.2f' % ('build columns, ms', build_time * 1000.0))
+    print('%-22s %12s %12s %10s' % ('scan', 'rows ms', 'columns ms', 'speedup'))
+    for label, row_by_row, columnar in [
+        ('ScanMissingBlocks', _row_by_row_missing, backup_matrix.ScanMissingBlocks),
+        ('ScanBlocksToSend', _row_by_row_to_send, backup_matrix.ScanBlocksToSend),
+    ]:
+        row_time = _measure(row_by_row, _BackupID, active)
+        columns_time = _measure(columnar, _BackupID)
+        print('%-22s %12.2f %12.2f %9.1fx' % (label, row_time * 1000.0, columns_time * 1000.0, row_time / max(columns_time, 0.000000001)))
+    print('%-22s %12s %12.2f' % ('ScanBlocksToRemove', '', _measure(backup_matrix.ScanBlocksToRemove, _BackupID) * 1000.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# bencode.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (bencode.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import json
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+from dht.entangled.kademlia import encoding
+
+
+def _old_encode(data):
+    if type(data) in (int, ):
+        return b'i%de' % data
+    elif isinstance(data, str):
+        return b'%d:%s' % (len(data), data.encode('utf-8'))
+    elif isinstance(data, bytes):
+        return b'%d:%s' % (len(data), data)
+    elif type(data) in (list, tuple):
+        encodedListItems = b''
+        for item in data:
+            encodedListItems += _old_encode(item)
+        return b'l%se' % encodedListItems
+    elif isinstance(data, dict):
+        encodedDictItems = b''
+        _d = {}
+        for k, v in data.items():
+            _d[_old_encode(k)] = v
+        for e_key in sorted(_d.keys()):
+            encodedDictItems += e_key
+            encodedDictItems += _old_encode(_d[e_key])
+        return b'd%se' % encodedDictItems
+    raise TypeError(type(data))
+
+
+def _old_decode_recursive(data, startIndex=0):
+    if data[startIndex:startIndex + 1] == b'i':
+        endPos = data[startIndex:].find(b'e') + startIndex
+        return (int(data[startIndex + 1:endPos] or b'0'), endPos + 1)
+    elif data[startIndex:startIndex + 1] == b'l':
+        startIndex += 1
+        decodedList = []
+        while data[startIndex:startIndex + 1] != b'e':
+            listData, startIndex = _old_decode_recursive(data, startIndex)
+            decodedList.append(listData)
+        return (decodedList, startIndex + 1)
+    elif data[startIndex:startIndex + 1] == b'd':
+        startIndex += 1
+        decodedDict = {}
+        while data[startIndex:startIndex + 1] != b'e':
+            key, startIndex = _old_decode_recursive(data, startIndex)
+            value, startIndex = _old_decode_recursive(data, startIndex)
+            decodedDict[key] = value
+        return (decodedDict, startIndex)
+    splitPos = data[startIndex:].find(b':') + startIndex
+    length = int(data[startIndex:splitPos] or b'0')
+    startIndex = splitPos + 1
+    endPos = startIndex + length
+    return (data[startIndex:endPos], endPos)
+
+
+def _old_decode(data):
+    return _old_decode_recursive(data)[0]
+
+
+def _response(values_count):
+    # similar to a multi-layer findValue() response carrying JSON values
+    values = [json.dumps({'type': 'supplier', 'customer': 'alice@127.0.0.1_8084', 'position': i, 'ecc': 'ecc/4x4', }) for i in range(values_count)]
+    return {0: 'a' * 20, 1: 'b' * 40, 2: 1, 3: values, 5: 2}
+
+
+def _measure(method, arg, count):
+    t = time.time()
+    for _ in range(count):
+        method(arg)
+    return time.time() - t
+
+
+def main():
+    # TEST
+    # call with number of iterations as parameter, default is 200:
+    # python tests/experiments/bencode.py 200
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    b = encoding.Bencode()
+    print('%-12s %10s %16s %16s %10s' % ('', 'bytes', 'old MB/sec', 'new MB/sec', 'speed up'))
+    for values_count in (10, 100, 1000, 5000):
+        msg = _response(values_count)
+        encoded = b.encode(msg)
+        if encoded != _old_encode(msg) or b.decode(encoded) != _old_decode(encoded):
+            raise Exception('results are not matching')
+        for name, old_method, new_method, arg in (
+            ('encode', _old_encode, b.encode, msg),
+            ('decode', _old_decode, b.decode, encoded),
+        ):
+            old_time = _measure(old_method, arg, count)
+            new_time = _measure(new_method, arg, count)
+            mb = len(encoded) * count / (1024.0 * 1024.0)
+            print('%-12s %10d %16.2f %16.2f %9.2fx' % (name, len(encoded), mb / old_time, mb / new_time, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
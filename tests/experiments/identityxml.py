@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# identityxml.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (identityxml.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+from xml.dom import minidom
+
+from crypt import key
+
+from userid import identity
+
+from tests.test_identity import _some_identity_xml
+
+
+def _minidom_parse(xmlsrc):
+    ident = identity.identity()
+    ident.unserialize_object(minidom.parseString(xmlsrc).documentElement)
+    return ident
+
+
+def _minidom_serialize(ident):
+    return ident.toxml()[0].strip()
+
+
+def _old_makehash(ident):
+    sep = b'-'
+    hsh = b''
+    hsh += sep + sep.join(map(lambda s: s.original(), ident.sources))
+    hsh += sep + sep.join(ident.contacts)
+    hsh += sep + sep.join(ident.scrubbers)
+    hsh += sep + ident.postage
+    hsh += sep + ident.date.replace(b' ', b'_')
+    hsh += sep + ident.version
+    hsh += sep + ident.revision
+    return key.Hash(hsh)
+
+
+def _old_valid(ident):
+    return key.VerifySignature(ident.publickey, _old_makehash(ident), ident.signature)
+
+
+def _expat_parse(xmlsrc):
+    return identity.identity(xmlsrc=xmlsrc)
+
+
+def _measure(method, arg, count):
+    t = time.time()
+    for _ in range(count):
+        method(arg)
+    return time.time() - t
+
+
+def main():
+    # TEST
+    # call with number of iterations as parameter, default is 2000:
+    # python tests/experiments/identityxml.py 2000
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    xmlsrc = _some_identity_xml.encode('utf-8')
+    ident = identity.identity(xmlsrc=xmlsrc)
+    if ident.serialize() != _minidom_serialize(ident) or ident.makehash() != _old_makehash(ident):
+        raise Exception('results are not matching')
+    if not ident.Valid() or not _old_valid(ident):
+        raise Exception('identity is not valid')
+    print('%-12s %16s %16s %10s' % ('', 'minidom ops/sec', 'expat ops/sec', 'speed up'))
+    for name, old_method, new_method, arg in (
+        ('parse', _minidom_parse, _expat_parse, xmlsrc),
+        ('serialize', _minidom_serialize, identity.identity.serialize, ident),
+        ('makehash', _old_makehash, identity.identity.makehash, ident),
+        ('Valid()', _old_valid, identity.identity.Valid, ident),
+    ):
+        old_time = _measure(old_method, arg, count)
+        new_time = _measure(new_method, arg, count)
+        print('%-12s %16.1f %16.1f %9.2fx' % (name, count / old_time, count / new_time, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# idurlfield.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (idurlfield.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+from userid import id_url
+
+
+def _populate(count):
+    # register fake users directly in memory, every user has two revisions with different IDURLs
+    idurls = []
+    for i in range(count):
+        pub_key = b'ssh-rsa fake-public-key-%d' % i
+        old_idurl = b'http://first.com/user%d.xml' % i
+        new_idurl = b'http://second.net/user%d.xml' % i
+        id_url._KnownIDURLs[old_idurl] = pub_key
+        id_url._KnownIDURLs[new_idurl] = pub_key
+        id_url._MergedIDURLs[pub_key] = {0: old_idurl, 1: new_idurl, }
+        idurls.append(old_idurl)
+    return idurls
+
+
+class _NotCachedField(id_url.ID_URL_FIELD):
+    # that is how id_url.field() worked before: new object every time and public key is not cached
+
+    __slots__ = ()
+
+    def to_public_key(self, raise_error=True):
+        self._generation = -1
+        return id_url.ID_URL_FIELD.to_public_key(self, raise_error=raise_error)
+
+    def __hash__(self):
+        self._generation = -1
+        return id_url.ID_URL_FIELD.__hash__(self)
+
+
+def _measure(method, idurls, rounds):
+    t = time.time()
+    for _ in range(rounds):
+        for idurl in idurls:
+            method(idurl)
+    return time.time() - t
+
+
+def main():
+    # TEST
+    # call with number of users and rounds as parameters, default is 1000 and 20:
+    # python tests/experiments/idurlfield.py 1000 20
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    idurls = _populate(count)
+    ops = count * rounds
+    old_fields = [_NotCachedField(idurl) for idurl in idurls]
+    new_fields = [id_url.field(idurl) for idurl in idurls]
+    old_dict = {f: True for f in old_fields}
+    new_dict = {f: True for f in new_fields}
+    results = []
+    results.append(('field()', _measure(_NotCachedField, idurls, rounds), _measure(id_url.field, idurls, rounds), ))
+    results.append(('dict lookup', _measure(lambda idurl: old_dict[_NotCachedField(idurl)], idurls, rounds),
+                    _measure(lambda idurl: new_dict[id_url.field(idurl)], idurls, rounds), ))
+    old_pairs = dict(zip(idurls, old_fields))
+    new_pairs = dict(zip(idurls, new_fields))
+    results.append(('equality', _measure(lambda idurl: old_pairs[idurl] == old_pairs[idurl], idurls, rounds),
+                    _measure(lambda idurl: new_pairs[idurl] == new_pairs[idurl], idurls, rounds), ))
+    print('users: %d, operations: %d, interned: %d' % (count, ops, len(id_url._Fields)))
+    print('%-12s %16s %16s %10s' % ('', 'before ops/sec', 'interned ops/sec', 'speed up'))
+    for name, old_time, new_time in results:
+        print('%-12s %16.1f %16.1f %9.2fx' % (name, ops / old_time, ops / new_time, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# lgout.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (lgout.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+from logs import lg
+
+
+def _call_out(level):
+    lg.out(level, 'udp_stream.data_received %d bytes from %s' % (1024, ('127.0.0.1', 7001)))
+
+
+def _call_args(level):
+    lg.args(level, 'some_packet_id', size=1024, remote=('127.0.0.1', 7001), state='SENDING')
+
+
+def _call_dbg(level):
+    lg.dbg(level, 'received %d bytes from %r', 1024, ('127.0.0.1', 7001))
+
+
+def _measure(method, level, count):
+    t = time.time()
+    for _ in range(count):
+        method(level)
+    return time.time() - t
+
+
+def main():
+    # TEST
+    # call with number of iterations as parameter, default is 20000:
+    # python tests/experiments/lgout.py 20000
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    log_dir = tempfile.mkdtemp()
+    lg.set_debug_level(8)
+    # lines are only written to the log files, results are printed to the original STDOUT
+    lg.disable_output()
+    sys.__stdout__.write('%-12s %16s %16s %16s\n' % ('', 'disabled usec', 'direct usec', 'buffered usec'))
+    for name, method in (
+        ('out', _call_out),
+        ('args', _call_args),
+        ('dbg', _call_dbg),
+    ):
+        disabled = _measure(method, 10, count)
+        # every line is written and flushed in the calling thread
+        lg.open_log_file(os.path.join(log_dir, 'direct.log'))
+        lg.stop_log_writer()
+        direct = _measure(method, 6, count)
+        lg.close_log_file()
+        # lines are written and flushed periodically by the writer thread
+        lg.open_log_file(os.path.join(log_dir, 'buffered.log'))
+        buffered = _measure(method, 6, count)
+        lg.close_log_file()
+        sys.__stdout__.write('%-12s %16.3f %16.3f %16.3f\n' % (name, disabled * 1000000.0 / count, direct * 1000000.0 / count, buffered * 1000000.0 / count))
+
+
+if __name__ == '__main__':
+    main()
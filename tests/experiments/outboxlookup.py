@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# outboxlookup.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (outboxlookup.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import copy
+import tempfile
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+from p2p import commands
+
+from crypt import key
+from crypt import signed
+
+from userid import id_url
+
+from transport import packet_out
+
+
+def _linear_search(filename):
+    for p in packet_out.queue():
+        if p.filename == filename:
+            return p
+    return None
+
+
+def _linear_search_by_transfer_id(transfer_id):
+    for p in packet_out.queue():
+        for i in p.items:
+            if i.transfer_id and i.transfer_id == transfer_id:
+                return p, i
+    return None, None
+
+
+def _linear_search_by_packet_id(packet_id):
+    return [p for p in packet_out.queue() if p.outpacket.PacketID.lower() == packet_id.lower()]
+
+
+def _linear_search_by_remote_idurl(remote_idurl):
+    remote_bin = id_url.field(remote_idurl).to_bin()
+    return [p for p in packet_out.queue() if id_url.field(p.remote_idurl).to_bin() == remote_bin]
+
+
+def _populate(count, peers):
+    creator = id_url.field('http://127.0.0.1:8084/me.xml')
+    key.GenerateNewKey(keyfilename=os.path.join(tempfile.mkdtemp(), 'mykey'))
+    sample = signed.Packet(commands.Data(), creator, creator, 'packet', b'', creator)
+    for n in range(count):
+        # signature is not valid for the copies, but only the fields used for lookups are important here
+        outpacket = copy.copy(sample)
+        outpacket.PacketID = 'packet%d' % n
+        outpacket.RemoteID = id_url.field('http://127.0.0.1:8084/peer%d.xml' % (n % peers))
+        p = packet_out.PacketOut(outpacket, wide=False, callbacks={})
+        # do not start the state machine, just put the packet in the queue like it was sent already
+        packet_out.queue().append(p)
+        packet_out.index_packet(p)
+        p.filename = 'outbox/packet%d.out' % n
+        packet_out._OutboxByFilename[p.filename] = p
+        p.items.append(packet_out.WorkItem('tcp', '127.0.0.1:7771', 100))
+        p.items[0].transfer_id = n
+        p.transfer_ids.add(n)
+        packet_out._OutboxByTransferID[n] = p
+
+
+def _measure(method, keys):
+    t = time.time()
+    for key in keys:
+        method(key)
+    return (time.time() - t) / float(len(keys))
+
+
+def main():
+    # TEST
+    # call with number of queued packets as a parameter, default is 10000:
+    # python outboxlookup.py 10000
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    peers = 100
+    _populate(count, peers)
+    lookups = 200
+    step = max(1, int(count / lookups))
+    print('queued packets: %d, remote peers: %d' % (count, peers))
+    print('%-24s %14s %14s %10s' % ('lookup', 'linear usec', 'indexed usec', 'speedup'))
+    for label, linear, indexed, keys in [
+        ('search', _linear_search,
+            lambda k: packet_out.search('tcp', '127.0.0.1:7771', k),
+            ['outbox/packet%d.out' % n for n in range(0, count, step)]),
+        ('search_by_transfer_id', _linear_search_by_transfer_id,
+            packet_out.search_by_transfer_id,
+            list(range(0, count, step))),
+        ('search_many(packet_id)', _linear_search_by_packet_id,
+            lambda k: packet_out.search_many(packet_id=k),
+            ['packet%d' % n for n in range(0, count, step)]),
+        ('search_many(remote)', _linear_search_by_remote_idurl,
+            lambda k: packet_out.search_many(remote_idurl=k),
+            [id_url.field('http://127.0.0.1:8084/peer%d.xml' % n) for n in range(peers)]),
+    ]:
+        linear_time = _measure(linear, keys)
+        indexed_time = _measure(indexed, keys)
+        print('%-24s %14.2f %14.2f %9.1fx' % (label, linear_time * 1000000.0, indexed_time * 1000000.0, linear_time / max(indexed_time, 0.000000001)))
+
+
+if __name__ == '__main__':
+    main()
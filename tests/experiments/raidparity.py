@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# raidparity.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (raidparity.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import copy
+import array
+
+sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.abspath('..'))
+
+from raid import eccmap
+from raid import raidutils
+
+
+def _legacy(data, myeccmap):
+    wholefile = array.array('i', data)
+    wholefile.byteswap()
+    seglength = int(len(data) / myeccmap.datasegments)
+    sds = {}
+    for seg_num, chunk in enumerate(raidutils.chunks(wholefile, int(seglength / 4))):
+        sds[seg_num] = iter(copy.copy(chunk))
+    return raidutils.build_parity(sds, int(seglength / 4), myeccmap.datasegments, myeccmap, myeccmap.paritysegments)
+
+
+def _batched(data, myeccmap):
+    seglength = int(len(data) / myeccmap.datasegments)
+    view = memoryview(data)
+    segments = [view[i * seglength:(i + 1) * seglength] for i in range(myeccmap.datasegments)]
+    return raidutils.build_parity_segments(segments, myeccmap)
+
+
+def _measure(method, data, myeccmap):
+    t = time.time()
+    method(data, myeccmap)
+    dt = time.time() - t
+    return dt, len(data) / (1024.0 * 1024.0) / max(dt, 0.000001)
+
+
+def main():
+    # TEST
+    # call with block size in bytes as a parameter, default is 1 MB:
+    # python raidparity.py 4194304
+    block_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024 * 1024
+    print('block size: %d bytes' % block_size)
+    print('%-12s %14s %14s %10s' % ('eccmap', 'legacy MB/s', 'batched MB/s', 'speedup'))
+    for eccmapname in eccmap.EccMapNames():
+        myeccmap = eccmap.eccmap(eccmapname)
+        step = myeccmap.datasegments * 4
+        data = os.urandom(int(block_size / step) * step)
+        legacy_time, legacy_speed = _measure(_legacy, data, myeccmap)
+        batched_time, batched_speed = _measure(_batched, data, myeccmap)
+        print('%-12s %14.2f %14.2f %9.1fx' % (eccmapname, legacy_speed, batched_speed, legacy_time / max(batched_time, 0.000001)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# verifypeers.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (verifypeers.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import itertools
+
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('..'))
+
+try:
+    from Cryptodome.PublicKey import RSA
+    from Cryptodome.Util import number
+except:
+    from Crypto.PublicKey import RSA  # @UnresolvedImport @Reimport
+    from Crypto.Util import number  # @UnresolvedImport @Reimport
+
+from crypt import key
+from crypt import rsa_key
+
+
+def _make_peers(count, bits=2048):
+    # generating thousand of RSA keys takes minutes, so build them from a small pool of primes:
+    # every pair of primes gives another valid key with a distinct modulus
+    primes = []
+    while len(primes) * (len(primes) - 1) / 2 < count:
+        primes.append(number.getPrime(int(bits / 2)))
+    peers = []
+    e = 65537
+    for p, q in itertools.combinations(primes, 2):
+        if len(peers) >= count:
+            break
+        phi = (p - 1) * (q - 1)
+        if number.GCD(e, phi) != 1:
+            continue
+        d = number.inverse(e, phi)
+        priv_key = rsa_key.RSAKey()
+        priv_key.keyObject = RSA.construct((p * q, e, d, p, q, ))
+        peers.append((priv_key, priv_key.toPublicString(), ))
+    return peers
+
+
+def _verify_without_cache(pubkeystring, hashcode, signature):
+    pub_key = rsa_key.RSAKey()
+    pub_key.fromString(pubkeystring)
+    return pub_key.verify(signature, hashcode)
+
+
+def _measure(method, packets):
+    t = time.time()
+    for pubkeystring, hashcode, signature in packets:
+        if not method(pubkeystring, hashcode, signature):
+            raise Exception('signature verification failed')
+    return time.time() - t
+
+
+def main():
+    # TEST
+    # call with number of peers, number of packets from every peer and key size as parameters, default is 1000, 5 and 2048:
+    # python verifypeers.py 1000 5 2048
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    bits = int(sys.argv[3]) if len(sys.argv) > 3 else 2048
+    peers = _make_peers(count, bits=bits)
+    packets = []
+    for r in range(rounds):
+        # packets from different peers are mixed, like it happens in a real network
+        for priv_key, pubkeystring in peers:
+            hashcode = key.Hash(os.urandom(64))
+            packets.append((pubkeystring, hashcode, priv_key.sign(hashcode), ))
+    print('peers: %d, packets: %d, cache size: %d' % (len(peers), len(packets), key.PublicKeysCacheCounters()['max_size']))
+    key.ClearPublicKeysCache()
+    no_cache_time = _measure(_verify_without_cache, packets)
+    cache_time = _measure(key.VerifySignature, packets)
+    counters = key.PublicKeysCacheCounters()
+    print('%-16s %14s %14s' % ('', 'packets/sec', 'usec/packet'))
+    print('%-16s %14.1f %14.1f' % ('no cache', len(packets) / no_cache_time, no_cache_time * 1000000.0 / len(packets)))
+    print('%-16s %14.1f %14.1f' % ('with cache', len(packets) / cache_time, cache_time * 1000000.0 / len(packets)))
+    print('hits: %d, misses: %d, evicted: %d' % (counters['hits'], counters['misses'], counters['evicted'], ))
+
+
+if __name__ == '__main__':
+    main()
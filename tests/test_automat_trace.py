@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+from unittest import TestCase
+
+from automats import automat
+from automats import event_trace
+
+
+class _Switch(automat.Automat):
+
+    fast = True
+
+    def A(self, event, *args, **kwargs):
+        if self.state == 'OFF':
+            if event == 'turn-on':
+                self.state = 'ON'
+        elif self.state == 'ON':
+            if event == 'turn-off':
+                self.state = 'OFF'
+            elif event == 'fail':
+                raise Exception('failed')
+
+
+class TestEventTrace(TestCase):
+
+    def setUp(self):
+        automat.StopEventTrace()
+        self.dump_filename = os.path.join(tempfile.mkdtemp(), 'automats.trace')
+
+    def tearDown(self):
+        automat.StopEventTrace()
+        if os.path.isfile(self.dump_filename):
+            os.remove(self.dump_filename)
+        os.rmdir(os.path.dirname(self.dump_filename))
+
+    def test_ring_buffer(self):
+        trace = event_trace.EventTrace(capacity=3)
+        for i in range(5):
+            trace.record(1000.0 + i, i, 'a', 'ev%d' % i, 'S1', 'S2', i / 10.0)
+        self.assertEqual(len(trace), 3)
+        self.assertEqual(trace.total, 5)
+        self.assertEqual([r[3] for r in trace.records()], ['ev2', 'ev3', 'ev4', ])
+        self.assertEqual(trace.dump(self.dump_filename), 3)
+        loaded = event_trace.load(self.dump_filename)
+        self.assertEqual(list(loaded.records()), list(trace.records()))
+        stats = loaded.stats(top=2)
+        self.assertEqual(stats['automats']['a']['events'], 3)
+        self.assertEqual(stats['automats']['a']['instances'], 3)
+        self.assertEqual(stats['automats']['a']['events_per_sec'], 1.5)
+        self.assertEqual([s['event'] for s in stats['slowest']], ['ev4', 'ev3', ])
+
+    def test_automat_events(self):
+        sw = _Switch('switch', 'OFF')
+        sw.event('turn-on')
+        self.assertTrue(automat.StartEventTrace(capacity=10))
+        self.assertFalse(automat.StartEventTrace())
+        sw.event('turn-off')
+        sw.event('turn-on')
+        sw.event('fail')
+        sw.event('unknown')
+        trace = automat.StopEventTrace()
+        self.assertIsNone(automat.GetEventTrace())
+        sw.event('turn-off')
+        sw.destroy()
+        records = list(trace.records())
+        self.assertEqual([r[3:6] for r in records], [
+            ('turn-off', 'ON', 'OFF'),
+            ('turn-on', 'OFF', 'ON'),
+            ('fail', 'ON', 'ON'),
+            ('unknown', 'ON', 'ON'),
+        ])
+        self.assertEqual(set(r[1] for r in records), {sw.index, })
+        self.assertEqual(trace.stats()['automats']['switch']['events'], 4)
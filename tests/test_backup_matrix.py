@@ -0,0 +1,199 @@
+import random
+
+import mock
+
+from unittest import TestCase
+
+from logs import lg
+
+from system import bpio
+
+from main import settings
+
+from lib import packetid
+
+from storage import backup_matrix
+
+
+_backup_id = 'master$alice@127.0.0.1_8084:1/F20200101/'
+
+
+def _legacy_missing(backupID, active):
+    result = set()
+    local = backup_matrix.local_files().get(backupID)
+    remote = backup_matrix.remote_files().get(backupID)
+    localMax = backup_matrix.local_max_block_numbers().get(backupID, -1)
+    remoteMax = backup_matrix.remote_max_block_numbers().get(backupID, -1)
+    if remote is None:
+        if local is None:
+            return []
+        for blockNum in range(localMax + 1):
+            row = local.get(blockNum, {'D': [0, ] * len(active), 'P': [0, ] * len(active), })
+            for s in range(len(active)):
+                if active[s] == 1 and (row['D'][s] == 1 or row['P'][s] == 1):
+                    result.add(blockNum)
+        return sorted(result)
+    for blockNum in range(max(localMax, remoteMax) + 1):
+        if blockNum not in remote:
+            result.add(blockNum)
+            continue
+        for s in range(len(active)):
+            if active[s] != 1:
+                continue
+            if s >= len(remote[blockNum]['D']) or s >= len(remote[blockNum]['P']):
+                result.add(blockNum)
+                continue
+            if remote[blockNum]['D'][s] != 1 or remote[blockNum]['P'][s] != 1:
+                result.add(blockNum)
+    return sorted(result)
+
+
+def _legacy_to_remove(backupID, suppliers_count):
+    result = []
+    local = backup_matrix.local_files()[backupID]
+    remote = backup_matrix.remote_files()[backupID]
+    zeros = {'D': [0, ] * suppliers_count, 'P': [0, ] * suppliers_count, }
+    for blockNum in range(backup_matrix.local_max_block_numbers().get(backupID, -1) + 1):
+        remoteRow = remote.get(blockNum, zeros)
+        localRow = local.get(blockNum, zeros)
+        if [v for v in remoteRow['D'] + remoteRow['P'] if v != 1]:
+            continue
+        for s in range(suppliers_count):
+            for dataORparity in ('Data', 'Parity', ):
+                if s < len(localRow[dataORparity[0]]) and localRow[dataORparity[0]][s] == 1:
+                    result.append(packetid.MakePacketID(backupID, blockNum, s, dataORparity))
+    return result
+
+
+def _legacy_to_send(backupID, active):
+    result = {}
+    local = backup_matrix.local_files().get(backupID, {})
+    remote = backup_matrix.remote_files().get(backupID)
+    zeros = {'D': [0, ] * len(active), 'P': [0, ] * len(active), }
+    for s in range(len(active)):
+        result[s] = set()
+    for blockNum in range(backup_matrix.local_max_block_numbers().get(backupID, -1) + 1):
+        localRow = local.get(blockNum, zeros)
+        for s in range(len(active)):
+            if active[s] != 1:
+                continue
+            if remote is None:
+                if s >= len(localRow['D']) or s >= len(localRow['P']):
+                    continue
+                remoteRow = zeros
+            else:
+                remoteRow = remote.get(blockNum, zeros)
+                if s >= len(remoteRow['D']) or s >= len(remoteRow['P']):
+                    continue
+            for dataORparity in ('Data', 'Parity', ):
+                dp = dataORparity[0]
+                if remoteRow[dp][s] != 1 and s < len(localRow[dp]) and localRow[dp][s] == 1:
+                    result[s].add(packetid.MakePacketID(backupID, blockNum, s, dataORparity))
+    return result
+
+
+class TestBackupMatrixScan(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(30)
+        settings.init(base_dir='/tmp/.bitdust_tmp')
+        self.suppliers_count = 6
+        self.suppliers = ['http://127.0.0.1:8084/supplier%d.xml' % i for i in range(self.suppliers_count)]
+        self.active = [1, 1, 0, 1, 1, 1, ]
+        self.patches = [
+            mock.patch.object(backup_matrix, 'GetActiveArray', lambda customer_idurl=None: list(self.active)),
+            mock.patch.object(backup_matrix.contactsdb, 'num_suppliers', lambda customer_idurl=None: self.suppliers_count),
+            mock.patch.object(backup_matrix.contactsdb, 'supplier', lambda index, customer_idurl=None: self.suppliers[index]),
+            mock.patch.object(backup_matrix.contactsdb, 'suppliers', lambda customer_idurl=None: self.suppliers),
+            mock.patch.object(backup_matrix.id_url, 'is_some_empty', lambda iterable_object: False),
+            mock.patch('stream.io_throttle.HasPacketInSendQueue', lambda supplierIDURL, packetID: False),
+        ]
+        for p in self.patches:
+            p.start()
+        backup_matrix.ClearLocalInfo()
+        backup_matrix.ClearRemoteInfo()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        backup_matrix.ClearLocalInfo()
+        backup_matrix.ClearRemoteInfo()
+        settings.shutdown()
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def _random_row(self, rnd, values, width=None):
+        width = self.suppliers_count if width is None else width
+        return {
+            'D': [rnd.choice(values) for _ in range(width)],
+            'P': [rnd.choice(values) for _ in range(width)],
+        }
+
+    def _fill(self, rnd, blocks=60, with_remote=True, short_rows=True):
+        local = {}
+        remote = {}
+        for blockNum in range(blocks):
+            if rnd.random() < 0.9:
+                local[blockNum] = self._random_row(rnd, [0, 1, ])
+            if with_remote and rnd.random() < 0.8:
+                width = self.suppliers_count
+                if short_rows and rnd.random() < 0.2:
+                    width -= 2
+                remote[blockNum] = self._random_row(rnd, [-1, 0, 1, 1, 1, ], width=width)
+        backup_matrix.local_files()[_backup_id] = local
+        backup_matrix.local_max_block_numbers()[_backup_id] = max(local.keys()) if local else -1
+        if with_remote:
+            backup_matrix.remote_files()[_backup_id] = remote
+            backup_matrix.remote_max_block_numbers()[_backup_id] = max(remote.keys()) if remote else -1
+
+    def _check(self):
+        self.assertEqual(backup_matrix.ScanMissingBlocks(_backup_id), _legacy_missing(_backup_id, self.active))
+        self.assertEqual(backup_matrix.ScanBlocksToSend(_backup_id), _legacy_to_send(_backup_id, self.active))
+        if _backup_id in backup_matrix.remote_files():
+            self.assertEqual(
+                sorted(backup_matrix.ScanBlocksToRemove(_backup_id)),
+                sorted(_legacy_to_remove(_backup_id, self.suppliers_count)),
+            )
+
+    def test_scans_match_row_by_row_logic(self):
+        rnd = random.Random(1)
+        for _ in range(20):
+            self._fill(rnd, with_remote=True)
+            self._check()
+            self._fill(rnd, with_remote=False)
+            self._check()
+
+    def test_columns_follow_reports(self):
+        rnd = random.Random(2)
+        self._fill(rnd, with_remote=True, short_rows=False)
+        self._check()
+        for _ in range(200):
+            blockNum = rnd.randint(0, 70)
+            supplierNum = rnd.randint(0, self.suppliers_count - 1)
+            dataORparity = rnd.choice(['Data', 'Parity', ])
+            packetID = packetid.MakePacketID(_backup_id, blockNum, supplierNum, dataORparity)
+            if rnd.random() < 0.5:
+                backup_matrix.RemoteFileReport(_backup_id, blockNum, supplierNum, dataORparity, rnd.choice([True, False, ]))
+            else:
+                with mock.patch.object(backup_matrix.os.path, 'isfile', lambda path: rnd.random() < 0.7), \
+                        mock.patch.object(backup_matrix.os.path, 'getsize', lambda path: 1):
+                    backup_matrix.LocalFileReport(packetID=packetID)
+            self._check()
+        # direct modification from outside must be noticed as well
+        backup_matrix.remote_files()[_backup_id][500] = {'D': [0, ] * self.suppliers_count, 'P': [0, ] * self.suppliers_count, }
+        backup_matrix.remote_max_block_numbers()[_backup_id] = 500
+        self._check()
+
+    def test_limit_per_supplier(self):
+        self.active = [1, ] * self.suppliers_count
+        backup_matrix.local_files()[_backup_id] = {}
+        for blockNum in range(30):
+            backup_matrix.local_files()[_backup_id][blockNum] = {'D': [1, ] * self.suppliers_count, 'P': [1, ] * self.suppliers_count, }
+        backup_matrix.local_max_block_numbers()[_backup_id] = 29
+        result = backup_matrix.ScanBlocksToSend(_backup_id, limit_per_supplier=5)
+        for supplierNum in range(self.suppliers_count):
+            self.assertEqual(len(result[supplierNum]), 6)
+            self.assertIn(packetid.MakePacketID(_backup_id, 0, supplierNum, 'Data'), result[supplierNum])
@@ -6,6 +6,8 @@ from logs import lg
 
 from system import bpio
 
+from lib import serialization
+
 from main import settings
 
 from crypt import key
@@ -166,3 +168,105 @@ class Test(TestCase):
             raw1 = p1.Serialize()
             p2 = signed.Unserialize(raw1)
             self.assertTrue(p2.Valid())
+
+    def test_signed_packet_binary_format(self):
+        key.InitMyKey()
+        data1 = os.urandom(1024 * 64)
+        p1 = signed.Packet(
+            'Data',
+            my_id.getLocalID(),
+            my_id.getLocalID(),
+            'SomeID',
+            data1,
+            self.bob_ident.getIDURL(),
+        )
+        raw_json = p1.Serialize()
+        raw_binary = p1.Serialize(packet_format=signed.PACKET_FORMAT_BINARY)
+        self.assertIs(p1.Serialize(packet_format=signed.PACKET_FORMAT_BINARY), raw_binary)
+        self.assertEqual(signed.PacketFormat(raw_json), signed.PACKET_FORMAT_JSON)
+        self.assertEqual(signed.PacketFormat(raw_binary), signed.PACKET_FORMAT_BINARY)
+        self.assertLess(len(raw_binary), len(raw_json))
+        for raw in (raw_json, raw_binary, ):
+            p2 = signed.Unserialize(raw)
+            self.assertTrue(p2.Valid())
+            self.assertEqual(p2.Payload, data1)
+            self.assertEqual(p2.Signature, p1.Signature)
+            self.assertEqual(p2._supported_format, signed.PACKET_FORMAT_BINARY)
+            self.assertEqual(len(p2), len(raw))
+        self.assertIsNone(signed.Unserialize(raw_binary[:-1]))
+
+    def test_signed_packet_format_flag(self):
+        key.InitMyKey()
+        p1 = signed.Packet(
+            'Data',
+            my_id.getLocalID(),
+            my_id.getLocalID(),
+            'SomeID',
+            os.urandom(1024),
+            self.bob_ident.getIDURL(),
+        )
+        self.assertEqual(p1.Format, signed.PACKET_FORMAT_BINARY)
+        dct = serialization.BytesToDict(p1.Serialize(), keys_to_text=True, encoding='latin1')
+        # format flag is covered by the signature and can not be removed or changed
+        dct.pop('f')
+        p2 = signed.Unserialize(serialization.DictToBytes(dct, encoding='latin1'))
+        self.assertEqual(p2._supported_format, signed.PACKET_FORMAT_JSON)
+        self.assertFalse(p2.Valid())
+        # flag can not be added to a packet which was signed without it
+        p1.Format = ''
+        p1.Sign()
+        dct = serialization.BytesToDict(p1.Serialize(), keys_to_text=True, encoding='latin1')
+        self.assertNotIn('f', dct)
+        self.assertTrue(signed.Unserialize(serialization.DictToBytes(dct, encoding='latin1')).Valid())
+        dct['f'] = signed.PACKET_FORMAT_BINARY
+        p3 = signed.Unserialize(serialization.DictToBytes(dct, encoding='latin1'))
+        self.assertEqual(p3._supported_format, signed.PACKET_FORMAT_BINARY)
+        self.assertFalse(p3.Valid())
+
+    def test_peer_packet_format_remembered_only_for_valid_packets(self):
+        from transport import packet_in
+        key.InitMyKey()
+        p1 = signed.Packet(
+            'Data',
+            my_id.getLocalID(),
+            my_id.getLocalID(),
+            'SomeID',
+            os.urandom(1024),
+            self.bob_ident.getIDURL(),
+        )
+        p2 = signed.Unserialize(p1.Serialize(packet_format=signed.PACKET_FORMAT_BINARY))
+        info = packet_in.PacketIn('transfer_id')
+        info.proto = 'tcp'
+        info.host = '127.0.0.1:7103'
+        info.sender_idurl = my_id.getLocalID()
+        info.bytes_received = len(p2)
+        signed._PeersPacketFormats.clear()
+        packet_in.on_signature_verified(p2, info, False)
+        self.assertEqual(signed.PeerPacketFormat(my_id.getLocalID()), signed.PACKET_FORMAT_JSON)
+        packet_in.on_signature_verified(p2, info, True)
+        self.assertEqual(signed.PeerPacketFormat(my_id.getLocalID()), signed.PACKET_FORMAT_BINARY)
+        signed._PeersPacketFormats.clear()
+        info.destroy()
+
+    def test_public_keys_cache(self):
+        key.InitMyKey()
+        key.ClearPublicKeysCache()
+        data = os.urandom(1024)
+        signature = key.Sign(key.Hash(data))
+        self.assertTrue(key.VerifySignature(key.MyPublicKey(), key.Hash(data), signature))
+        self.assertEqual(key.PublicKeysCacheCounters()['misses'], 1)
+        self.assertEqual(key.PublicKeysCacheCounters()['hits'], 0)
+        self.assertTrue(key.VerifySignature(key.MyPublicKey(), key.Hash(data), signature))
+        self.assertTrue(self.bob_ident.Valid())
+        self.assertTrue(self.bob_ident.Valid())
+        self.assertFalse(key.VerifySignature(self.bob_ident.publickey, key.Hash(data), signature))
+        counters = key.PublicKeysCacheCounters()
+        self.assertEqual(counters['misses'], 2)
+        self.assertEqual(counters['hits'], 3)
+        self.assertEqual(counters['size'], 2)
+        key.SetPublicKeysCacheSize(1)
+        self.assertEqual(key.PublicKeysCacheCounters()['evicted'], 1)
+        self.assertTrue(key.VerifySignature(key.MyPublicKey(), key.Hash(data), signature))
+        self.assertEqual(key.PublicKeysCacheCounters()['misses'], 3)
+        key.SetPublicKeysCacheSize(1024)
+        key.ClearPublicKeysCache()
@@ -0,0 +1,109 @@
+import os
+
+from unittest import TestCase
+
+from twisted.internet.defer import Deferred
+
+from logs import lg
+
+from lib import jsn
+from lib import utime
+
+from system import bpio
+from system import local_fs
+
+from main import settings
+
+from dht import dht_cache
+
+
+class TestDHTCache(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(30)
+        settings.init(base_dir='/tmp/.bitdust_tmp')
+        self.cache_file_path = '/tmp/.bitdust_tmp/cache.json'
+        self.legacy_dir_path = '/tmp/.bitdust_tmp/cache'
+
+    def tearDown(self):
+        dht_cache.shutdown()
+        settings.shutdown()
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def _results(self, d):
+        results = []
+        d.addBoth(results.append)
+        return results
+
+    def test_lru_and_persistence(self):
+        bpio._dirs_make(os.path.join(self.legacy_dir_path, '3'))
+        local_fs.WriteTextFile(os.path.join(self.legacy_dir_path, '3', 'aaa'), jsn.dumps({'v': {'a': 1}, 't': utime.get_sec1970(), }))
+        dht_cache.init(self.cache_file_path, max_records=3, legacy_cache_dir_path=self.legacy_dir_path)
+        self.assertFalse(os.path.exists(self.legacy_dir_path))
+        self.assertEqual(dht_cache.get('aaa', layer_id=3), ({'a': 1}, dht_cache.get('aaa', layer_id=3)[1]))
+        self.assertIsNone(dht_cache.get('aaa', layer_id=0))
+        dht_cache.store('bbb', {'b': 1}, layer_id=3)
+        dht_cache.store('ccc', {'c': 1}, layer_id=3, timestamp=utime.get_sec1970() - 100)
+        # "aaa" was used recently, so "bbb" is evicted first
+        dht_cache.get('aaa', layer_id=3)
+        dht_cache.store('ddd', None, layer_id=7)
+        self.assertIsNone(dht_cache.get('bbb', layer_id=3))
+        self.assertIsNotNone(dht_cache.get('aaa', layer_id=3))
+        self.assertIsNone(dht_cache.get('ccc', layer_id=3, cache_ttl=50))
+        self.assertIsNotNone(dht_cache.get('ccc', layer_id=3, cache_ttl=500))
+        self.assertEqual(dht_cache.counters()[3]['evicted'], 1)
+        dht_cache.shutdown()
+        dht_cache.init(self.cache_file_path, max_records=3)
+        self.assertEqual(dht_cache.get('aaa', layer_id=3)[0], {'a': 1})
+        self.assertEqual(dht_cache.get('ddd', layer_id=7)[0], None)
+        self.assertEqual(dht_cache.counters()[3]['records'], 2)
+
+    def test_read_through(self):
+        dht_cache.init(self.cache_file_path)
+        requests = []
+
+        def _request(key, found):
+            d = Deferred()
+            requests.append((key, found, d))
+            return d
+
+        r1 = self._results(dht_cache.read_through('k1', 2, 60, _request, 'k1', found=True))
+        r2 = self._results(dht_cache.read_through('k1', 2, 60, _request, 'k1', found=True))
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(r1, [])
+        dht_cache.store('k1', {'x': 1}, layer_id=2)
+        requests[0][2].callback({'x': 1})
+        self.assertEqual(r1, [{'x': 1}])
+        self.assertEqual(r2, [{'x': 1}])
+        r3 = self._results(dht_cache.read_through('k1', 2, 60, _request, 'k1', found=True))
+        self.assertEqual(r3, [{'x': 1}])
+        self.assertEqual(len(requests), 1)
+        # value not found in DHT
+        r4 = self._results(dht_cache.read_through('k2', 2, 60, _request, 'k2', found=False))
+        requests[1][2].callback(['some', 'closest', 'nodes', ])
+        self.assertEqual(r4, [['some', 'closest', 'nodes', ]])
+        r5 = self._results(dht_cache.read_through('k2', 2, 60, _request, 'k2', found=False))
+        self.assertEqual(r5, [[]])
+        self.assertEqual(len(requests), 2)
+        # failed requests are not cached
+        r6 = self._results(dht_cache.read_through('k3', 2, 60, _request, 'k3', found=False))
+        r7 = self._results(dht_cache.read_through('k3', 2, 60, _request, 'k3', found=False))
+        requests[2][2].errback(Exception('DHT service is off'))
+        self.assertEqual(r6[0].getErrorMessage(), 'DHT service is off')
+        self.assertEqual(r7[0].getErrorMessage(), 'DHT service is off')
+        self.assertIsNone(dht_cache.get('k3', layer_id=2))
+        self.assertTrue(dht_cache.forget('k2', layer_id=2))
+        self.assertFalse(dht_cache.forget('k2', layer_id=2))
+        self.assertEqual(dht_cache.counters()[2], {
+            'hits': 1,
+            'negative_hits': 1,
+            'misses': 3,
+            'coalesced': 2,
+            'evicted': 0,
+            'hit_ratio': 0.286,
+            'records': 1,
+        })
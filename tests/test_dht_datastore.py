@@ -0,0 +1,93 @@
+import os
+import json
+import sqlite3
+
+from unittest import TestCase
+
+from system import bpio
+
+from dht.entangled.kademlia import datastore
+
+
+class TestSQLiteDataStore(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        os.makedirs('/tmp/.bitdust_tmp')
+        self.db_file = '/tmp/.bitdust_tmp/dht.db'
+
+    def tearDown(self):
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def _old_db(self, rows):
+        db = sqlite3.connect(self.db_file)
+        db.execute('CREATE TABLE data(key, value, lastPublished, originallyPublished, originalPublisherID, expireSeconds, revision)')
+        for key, value, published, expire_seconds, revision in rows:
+            db.execute('INSERT INTO data VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                key,
+                json.dumps({'k': key, 'd': value, 'v': datastore.PROTOCOL_VERSION, }),
+                published,
+                published,
+                None,
+                expire_seconds,
+                revision,
+            ))
+        db.commit()
+        db.close()
+
+    def test_upsert_and_revision(self):
+        ds = datastore.SQLiteVersionedJsonDataStore(self.db_file)
+        ds.setItem('abc', 'value1', 1000, 1000, 'nodeA', expireSeconds=60)
+        self.assertEqual(ds.revision('abc'), 1)
+        ds.setItem(b'abc', 'value2', 1010, 1000, 'nodeA', expireSeconds=60)
+        self.assertEqual(ds.revision('abc'), 2)
+        ds.setItem('abc', 'value3', 1020, 1000, 'nodeA', expireSeconds=60, revision=10)
+        self.assertEqual(ds.revision('abc'), 10)
+        self.assertEqual(ds.revision('xyz'), 0)
+        self.assertEqual(len(ds), 1)
+        self.assertIn('abc', ds)
+        self.assertNotIn('xyz', ds)
+        item = ds.getItem('abc')
+        self.assertEqual(item['value'], 'value3')
+        self.assertEqual(item['lastPublished'], 1020)
+        self.assertEqual(item['originalPublisherID'], 'nodeA')
+        self.assertEqual(ds['abc'], 'value3')
+        self.assertEqual(ds.getItem('xyz'), None)
+        self.assertEqual(len(ds.getAllItems()), 1)
+
+    def test_expire_and_republish(self):
+        ds = datastore.SQLiteVersionedJsonDataStore(self.db_file)
+        ds.setItem('k1', 'v1', 1000, 1000, 'nodeA', expireSeconds=100)
+        ds.setItem('k2', 'v2', 1500, 1000, 'nodeA', expireSeconds=1000)
+        ds.setItem('k3', 'v3', 1950, 1950, 'nodeA', expireSeconds=100)
+        ds.setItem('nodeState', 'state', 0, 0, None, expireSeconds=0)
+        ds.setItem('k4', 'v4', 1000, 1000, 'nodeA', expireSeconds=10)
+        items = ds.getRepublishItems(900, 1600)
+        self.assertEqual(sorted(i['key'] for i in items), ['k1', 'k2', 'k4', 'nodeState', ])
+        self.assertEqual(sorted(ds.expireItems(2000, keepKeys=['k4', ])), ['k1', ])
+        self.assertEqual(sorted(ds.keys()), ['k2', 'k3', 'k4', 'nodeState', ])
+        ds.removeItems(['k3', 'k4', ])
+        self.assertEqual(sorted(ds.keys()), ['k2', 'nodeState', ])
+
+    def test_migrate_old_schema(self):
+        self._old_db([
+            ('k1', 'v1', 1000, 100, 3),
+            ('k2', 'v2', 1000, 5000, 1),
+            ('k1', 'v1_latest', 1100, 100, 4),
+        ])
+        ds = datastore.SQLiteVersionedJsonDataStore(self.db_file)
+        self.assertEqual(len(ds), 2)
+        self.assertEqual(ds['k1'], 'v1_latest')
+        self.assertEqual(ds.revision('k1'), 4)
+        self.assertEqual(ds.expireItems(2000), ['k1', ])
+        ds.setItem('k2', 'v2_new', 2000, 1000, 'nodeA', expireSeconds=5000)
+        self.assertEqual(ds.revision('k2'), 2)
+        ds._db.close()
+        # opening already migrated database does not change anything
+        ds = datastore.SQLiteVersionedJsonDataStore(self.db_file)
+        self.assertEqual(ds.keys(), ['k2', ])
+        self.assertEqual(ds['k2'], 'v2_new')
+        ds._db.close()
@@ -0,0 +1,89 @@
+import random
+
+from unittest import TestCase
+
+from dht.entangled.kademlia import encoding
+
+
+def _random_value(rnd, depth=0):
+    kind = rnd.randint(0, 5 if depth < 4 else 2)
+    if kind == 0:
+        return rnd.randint(-2 ** 40, 2 ** 40)
+    if kind == 1:
+        return bytes(bytearray(rnd.randint(0, 255) for _ in range(rnd.randint(0, 40))))
+    if kind == 2:
+        return rnd.choice([u'', u'abc', u'привет', u'{"json": [1, 2]}', u'e:l:d:i'])
+    if kind == 3:
+        return [_random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 5))]
+    if kind == 4:
+        return tuple(_random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 3)))
+    return {rnd.choice([rnd.randint(0, 10), u'k%d' % rnd.randint(0, 10)]): _random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 5))}
+
+
+def _normalized(value):
+    # that is how data comes back after decoding
+    if isinstance(value, (list, tuple)):
+        return [_normalized(v) for v in value]
+    if isinstance(value, dict):
+        return {_normalized(k): _normalized(v) for k, v in value.items()}
+    if isinstance(value, encoding.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+class TestBencode(TestCase):
+
+    def test_wire_format(self):
+        b = encoding.Bencode()
+        self.assertEqual(b.encode(None), b'i0e')
+        self.assertEqual(b.encode(-5), b'i-5e')
+        self.assertEqual(b.encode(1.5), b'f1.500000e')
+        self.assertEqual(b.encode(u'abc'), b'3:abc')
+        self.assertEqual(b.encode(b''), b'0:')
+        self.assertEqual(b.encode([1, (2, b'x')]), b'li1eli2e1:xee')
+        self.assertEqual(b.encode({u'b': 1, b'a': [], 10: {}, 2: u's'}), b'd1:ale1:bi1ei10edei2e1:se')
+        self.assertEqual(b.encode({0: 1, 1: b'id', 3: [u'store', {u'k': u'v'}], 5: 2}), b'di0ei1ei1e2:idi3el5:stored1:k1:veei5ei2ee')
+        self.assertEqual(b.encode(u'п'), b'2:\xd0\xbf')
+        self.assertEqual(b.encode(True), None)
+        self.assertEqual(b.encode([1, object()]), None)
+
+    def test_decode(self):
+        b = encoding.Bencode()
+        self.assertEqual(b.decode(b'i0e'), 0)
+        self.assertEqual(b.decode(b'ie'), 0)
+        self.assertEqual(b.decode(b'f1.500000e'), 1.5)
+        self.assertEqual(b.decode(b'3:abc'), b'abc')
+        self.assertEqual(b.decode(b'3:abc', encoding='utf-8'), u'abc')
+        self.assertEqual(b.decode(memoryview(b'li1ee')), [1])
+        # items after a nested dictionary are not lost
+        self.assertEqual(b.decode(b'd1:ad1:bi1ee1:ci2ee'), {b'a': {b'b': 1}, b'c': 2})
+        self.assertEqual(b.decode(b'ld1:ai1eei2ee'), [{b'a': 1}, 2])
+
+    def test_round_trip(self):
+        rnd = random.Random(2000)
+        b = encoding.Bencode()
+        for _ in range(500):
+            value = _random_value(rnd)
+            encoded = b.encode(value)
+            self.assertEqual(b.decode(encoded), _normalized(value))
+            self.assertEqual(b.encode(b.decode(encoded)), encoded)
+
+    def test_fuzz(self):
+        rnd = random.Random(3000)
+        b = encoding.Bencode()
+        for s in [b'', b'l', b'd', b'i', b'f', b'i12', b'5:ab', b'-1:', b'x', b'ld', b'di1e', b'lli1ee', b'e', b'l' * 5000]:
+            self.assertIsNone(b.decode(s))
+        for _ in range(500):
+            encoded = bytearray(b.encode(_random_value(rnd)))
+            for _ in range(rnd.randint(1, 3)):
+                pos = rnd.randint(0, len(encoded))
+                op = rnd.randint(0, 2)
+                if op == 0:
+                    del encoded[pos:pos + rnd.randint(1, 4)]
+                elif op == 1:
+                    encoded[pos:pos] = bytearray([rnd.choice(b'ilfde:0123456789-x')])
+                else:
+                    encoded = encoded[:pos]
+            # must never raise or hang, broken input is decoded to something or to None
+            b.decode(bytes(encoded))
+            b.decode(bytes(encoded), encoding='utf-8')
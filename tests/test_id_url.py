@@ -522,6 +522,79 @@ class TestIDURL(TestCase):
         self.assertEqual(id_url.field(hans2).original(), strng.to_bin(hans2))
         self.assertEqual(id_url.field(hans3).original(), strng.to_bin(hans3))
 
+    def _restart(self):
+        history_dir = id_url._IdentityHistoryDir
+        id_url.shutdown()
+        id_url._IdentityHistoryDir = history_dir
+        id_url.init()
+
+    def _known(self):
+        return (dict(id_url._KnownUsers), dict(id_url._KnownIDURLs), {k: dict(v) for k, v in id_url._MergedIDURLs.items()}, )
+
+    def test_history_index(self):
+        alice_identity = self._cache_identity('alice')
+        self._cache_identity('frank')
+        self._cache_identity('hans1')
+        self._cache_identity('hans2')
+        self._cache_identity('hans3')
+        # index file is not written on every update, but only once a bit later or during shutdown
+        self.assertFalse(os.path.isfile(settings.IdentityHistoryIndexFilename()))
+        self.assertTrue(id_url._SaveTask.active())
+        known = self._known()
+        self._restart()
+        self.assertTrue(os.path.isfile(settings.IdentityHistoryIndexFilename()))
+        # nothing was parsed, all users are loaded from the index and not verified yet
+        self.assertEqual(self._known(), known)
+        self.assertEqual(len(id_url._UnverifiedUsers), 3)
+        self.assertEqual(id_url.field(hans1).to_text(), hans3)
+        self.assertEqual(id_url.field(alice_bin).to_public_key(), alice_identity.getPublicKey())
+        self.assertEqual(len(id_url._UnverifiedUsers), 1)
+        # broken index is rebuilt from the history files
+        with open(settings.IdentityHistoryIndexFilename(), 'r') as f:
+            raw = f.read()
+        with open(settings.IdentityHistoryIndexFilename(), 'w') as f:
+            f.write(raw.replace('"revision": 0', '"revision": 1', 1))
+        self._restart()
+        self.assertEqual(self._known(), known)
+        self.assertEqual(len(id_url._UnverifiedUsers), 0)
+        # index item which does not match the history file is dropped after lazy verification
+        user_dir = os.path.basename(id_url._KnownUsers[strng.to_bin(alice_identity.getPublicKey())])
+        id_url._HistoryIndex[user_dir][0]['revision'] = 5
+        id_url.save_history_index()
+        self._restart()
+        self.assertTrue(id_url.is_cached(alice_bin))
+        self.assertEqual(id_url.get_latest_revision(alice_text), (b'', -1, ))
+        self.assertFalse(id_url.is_cached(alice_bin))
+        self.assertTrue(id_url._SaveTask.active())
+        id_url.save_history_index()
+        self.assertIsNone(id_url._SaveTask)
+        self.assertNotIn(user_dir, id_url.load_history_index())
+
+
+    def test_interned_fields(self):
+        self._cache_identity('hans1')
+        f1 = id_url.field(hans1)
+        self.assertIs(id_url.field(hans1), f1)
+        self.assertIs(id_url.field(strng.to_text(hans1)), f1)
+        h = hash(f1)
+        d = {f1: 'hans', }
+        self.assertEqual(f1.to_text(), hans1)
+        # identity rotated: already existing fields are pointing to the latest IDURL now
+        self._cache_identity('hans2')
+        self.assertEqual(f1.to_text(), hans2)
+        self.assertEqual(f1.original(), strng.to_bin(hans1))
+        self.assertEqual(hash(f1), h)
+        self.assertIn(id_url.field(hans2), d)
+        self.assertIsNot(id_url.field(hans2), f1)
+        # field which changed original IDURL is not shared anymore
+        f1.refresh(replace_original=True)
+        self.assertEqual(f1.original(), strng.to_bin(hans2))
+        self.assertIsNot(id_url.field(hans1), f1)
+        self.assertEqual(id_url.field(hans1).original(), strng.to_bin(hans1))
+        # identity keeps own copies of the sources
+        ident = self._cache_identity('hans3')
+        self.assertIsNot(ident.getIDURL(), id_url.field(hans3))
+        self.assertEqual(ident.getIDURL(), id_url.field(hans3))
 
 if __name__ == "__main__":
     unittest.main()
@@ -102,3 +102,40 @@ class Test(TestCase):
         broken_identity = identity.identity(xmlsrc=_broken_identity_xml)
         self.assertTrue(broken_identity.isCorrect())
         self.assertFalse(broken_identity.Valid())
+
+    def _fields(self, ident):
+        return (
+            ident.getSources(as_originals=True), ident.contacts, ident.certificates, ident.scrubbers, ident.postage,
+            ident.date, ident.version, ident.revision, ident.publickey, ident.signature,
+        )
+
+    def _from_minidom(self, xmlsrc):
+        from xml.dom import minidom
+        from userid import identity
+        ident = identity.identity()
+        ident.unserialize_object(minidom.parseString(xmlsrc.encode('utf-8')).documentElement)
+        return ident
+
+    def test_xml_same_as_minidom(self):
+        from userid import identity
+        some_identity = identity.identity(xmlsrc=_some_identity_xml)
+        self.assertEqual(self._fields(some_identity), self._fields(self._from_minidom(_some_identity_xml)))
+        self.assertEqual(some_identity.serialize(), some_identity.toxml()[0].strip())
+        some_identity.setSources(['http://127.0.0.1:8084/alice.xml', 'http://second.net/alice.xml', ])
+        some_identity.setContacts(['tcp://127.0.0.1:7103', 'udp://127.0.0.1:8882', ])
+        some_identity.setScrubbers(['http://127.0.0.1:8084/bob.xml', ])
+        some_identity.setVersion('1.2 & <beta> "x"')
+        some_identity.setDate(u'Жов 06, 2018')
+        some_identity.setRevision(5)
+        some_identity.sign()
+        xmlsrc = some_identity.serialize(as_text=True)
+        self.assertEqual(some_identity.serialize(), some_identity.toxml()[0].strip())
+        self.assertEqual(self._fields(identity.identity(xmlsrc=xmlsrc)), self._fields(self._from_minidom(xmlsrc)))
+        self.assertEqual(identity.identity(xmlsrc=xmlsrc).makehash(), self._from_minidom(xmlsrc).makehash())
+        self.assertTrue(identity.identity(xmlsrc=xmlsrc).Valid())
+        # formatting is not important, only first text block of every element is taken
+        messy_xml = _some_identity_xml.replace('<version></version>', '<version>\n  </version>').replace(
+            '<postage>0</postage>', '<postage><!-- price -->\n 0 <x>1</x> 2</postage>').replace(
+            '</contacts>', '  <contact>  </contact>\n  <contact/>\n</contacts>')
+        self.assertEqual(self._fields(identity.identity(xmlsrc=messy_xml)), self._fields(self._from_minidom(messy_xml)))
+        self.assertEqual(identity.identity(xmlsrc=messy_xml).contacts, [b'tcp://127.0.0.1:7103', b'', ])
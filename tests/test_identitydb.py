@@ -0,0 +1,79 @@
+import os
+
+from unittest import TestCase
+
+from logs import lg
+
+from system import bpio
+
+from main import settings
+
+from userid import id_url
+
+from contacts import identitydb
+
+from tests.test_crypt_signed import _some_identity_xml
+
+
+alice_bin = b'http://127.0.0.1:8084/alice.xml'
+
+
+class TestIdentityDB(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(30)
+        settings.init(base_dir='/tmp/.bitdust_tmp')
+        id_url.init()
+        identitydb.init()
+
+    def tearDown(self):
+        identitydb.shutdown()
+        self._forget()
+        id_url.shutdown()
+        settings.shutdown()
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def _forget(self):
+        for d in (identitydb._IdentityCache, identitydb._IdentityCacheIDs, identitydb._IdentityCacheModifiedTime,
+                  identitydb._Contact2IDURL, identitydb._IDURL2Contacts, identitydb._IPPort2IDURL, identitydb._LazyIdentities, ):
+            d.clear()
+
+    def _restart(self):
+        identitydb.shutdown()
+        self._forget()
+        identitydb.init()
+
+    def test_lazy_warm_up(self):
+        self.assertTrue(identitydb.update(alice_bin, _some_identity_xml))
+        self._restart()
+        # identity was registered from the index, file was not read yet
+        self.assertEqual(identitydb.size(), 1)
+        self.assertTrue(identitydb.has_idurl(alice_bin))
+        self.assertIn(alice_bin, identitydb._LazyIdentities)
+        self.assertEqual(identitydb._IdentityCache, {})
+        self.assertEqual(identitydb.get_idurl_by_ip_port('127.0.0.1', 7103), alice_bin)
+        self.assertEqual(identitydb.get_idurls_by_contact(b'tcp://127.0.0.1:7103'), [alice_bin, ])
+        self.assertEqual(identitydb.idcontacts(alice_bin), [b'tcp://127.0.0.1:7103', ])
+        # first access reads the file
+        id_obj = identitydb.get_ident(alice_bin)
+        self.assertEqual(id_obj.getIDURL().original(), alice_bin)
+        self.assertNotIn(alice_bin, identitydb._LazyIdentities)
+        self.assertEqual(identitydb.size(), 1)
+        # modified file is read at startup
+        filename = identitydb.get_filename(alice_bin)
+        bpio.WriteTextFile(filename, _some_identity_xml + '\n')
+        self._restart()
+        self.assertNotIn(alice_bin, identitydb._LazyIdentities)
+        self.assertIn(alice_bin, identitydb._IdentityCache)
+        self._restart()
+        self.assertIn(alice_bin, identitydb._LazyIdentities)
+        # removed file is dropped from the index
+        os.remove(filename)
+        self._restart()
+        self.assertFalse(identitydb.has_idurl(alice_bin))
+        self.assertEqual(identitydb.load_cache_index(), {})
+        self.assertEqual(identitydb.get_idurl_by_ip_port('127.0.0.1', 7103), None)
@@ -0,0 +1,145 @@
+import os
+import time
+
+from unittest import TestCase
+
+from logs import lg
+
+from system import bpio
+
+from main import settings
+
+from transport import timeouts
+
+from stream import io_throttle
+
+
+class _FakeFileUp(object):
+
+    def __init__(self, parent, packetID, fileName, fileSize=1024 * 64):
+        self.parent = parent
+        self.packetID = packetID
+        self.fileName = fileName
+        self.fileSize = fileSize
+        self.state = 'IN_QUEUE'
+        self.sendTime = None
+        self.ackTime = None
+        self.sendTimeout = 60
+        self.events = []
+        parent.fileSendQueue.append(packetID)
+        parent.fileSendDict[packetID] = self
+
+    def event(self, evt, *args, **kwargs):
+        self.events.append(evt)
+        if evt == 'start':
+            self.state = 'UPLOADING'
+            self.sendTime = time.time()
+            return
+        if evt == 'ack-received':
+            self.ackTime = time.time()
+        self.state = 'DONE'
+        self.parent.fileSendQueue.remove(self.packetID)
+        del self.parent.fileSendDict[self.packetID]
+        self.parent.OnSendItemFinished(self, evt)
+
+
+class TestSendWindow(TestCase):
+
+    def test_window_follows_bandwidth_delay_product(self):
+        w = io_throttle.SendWindow(4)
+        # 1 MB/sec with 2 seconds round trip time and 64 KB files: 2 * 2 MB / 64 KB
+        for _ in range(100):
+            w.on_acked(64 * 1024, 2.0, w.delivered - 2 * 1024 * 1024 + 64 * 1024)
+        self.assertEqual(w.size, io_throttle._MaxSendWindow)
+        self.assertEqual(w.min_rtt(), 2.0)
+        self.assertEqual(w.bandwidth(), 1024 * 1024)
+        # slow supplier: only one file delivered per round trip
+        w = io_throttle.SendWindow(8)
+        for _ in range(20):
+            w.on_acked(64 * 1024, 2.0, w.delivered)
+        self.assertEqual(w.size, 2)
+        self.assertEqual(w.on_failed(), 1)
+        self.assertEqual(w.bandwidth(), None)
+        self.assertEqual(w.failed, 1)
+        self.assertEqual(w.acked, 20)
+
+    def test_window_grows_by_one(self):
+        w = io_throttle.SendWindow(2)
+        w.on_acked(1000, 1.0, -100000)
+        self.assertEqual(w.size, 3)
+        w.on_acked(1000, 1.0, -100000)
+        self.assertEqual(w.size, 4)
+        w.on_failed()
+        self.assertEqual(w.size, 2)
+
+
+class TestSupplierQueue(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(30)
+        settings.init(base_dir='/tmp/.bitdust_tmp')
+        self.filename = '/tmp/.bitdust_tmp/some_file'
+        bpio.WriteBinaryFile(self.filename, b'x' * 1024)
+
+    def tearDown(self):
+        timeouts.shutdown()
+        settings.shutdown()
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def test_send_window(self):
+        q = io_throttle.SupplierQueue('http://127.0.0.1:8084/bob.xml', 'http://127.0.0.1:8084/alice.xml', customerIDURL='http://127.0.0.1:8084/alice.xml')
+        q.sendWindow = io_throttle.SendWindow(3)
+        items = [_FakeFileUp(q, 'packet%d' % i, self.filename) for i in range(10)]
+        missing = _FakeFileUp(q, 'missing', '/tmp/.bitdust_tmp/not_existing_file')
+        self.assertEqual(q.RunSend(), 3)
+        self.assertEqual([i.state for i in items[:4]], ['UPLOADING', 'UPLOADING', 'UPLOADING', 'IN_QUEUE', ])
+        self.assertEqual(timeouts.pending(), 3)
+        stats = q.GetSendingStats()
+        self.assertEqual(stats['in_flight'], 3)
+        self.assertEqual(stats['in_flight_bytes'], 3 * 64 * 1024)
+        self.assertEqual(stats['queued'], 11)
+        items[0].event('ack-received')
+        self.assertEqual(timeouts.pending(), 2)
+        self.assertEqual(q.GetSendingStats()['acked'], 1)
+        # file was acknowledged immediately, so one file in flight is enough to fill the pipe
+        self.assertEqual(q.sendWindow.size, 2)
+        self.assertEqual(q.RunSend(), 0)
+        items[1].event('timeout')
+        self.assertEqual(q.sendWindow.size, 1)
+        self.assertEqual(q.RunSend(), 0)
+        for i in items[2:]:
+            q.RunSend()
+            self.assertTrue(0 < q.GetSendingStats()['in_flight'] <= q.sendWindow.size)
+            i.event('ack-received')
+        q.RunSend()
+        self.assertEqual(missing.events, ['file-not-exist', ])
+        self.assertEqual(q.GetSendingStats()['in_flight'], 0)
+        self.assertEqual(timeouts.pending(), 0)
+        self.assertFalse(os.path.exists(missing.fileName))
+
+    def test_send_timeout_after_network_restart(self):
+        from transport import gateway
+        q = io_throttle.SupplierQueue('http://127.0.0.1:8084/bob.xml', 'http://127.0.0.1:8084/alice.xml', customerIDURL='http://127.0.0.1:8084/alice.xml')
+        q.sendWindow = io_throttle.SendWindow(1)
+        item = _FakeFileUp(q, 'packet1', self.filename)
+        waiting = _FakeFileUp(q, 'packet2', self.filename)
+        item.sendTimeout = 0.05
+        timeouts.register(('packet_out', 'some_packet', ), 60, lambda: None)
+        self.assertEqual(q.RunSend(), 1)
+        self.assertEqual(timeouts.pending(), 2)
+        # network goes down and up again while the file is waiting for Ack()
+        gateway.stop_packets_timeout_loop()
+        gateway.start_packets_timeout_loop()
+        self.assertFalse(timeouts.is_registered(('packet_out', 'some_packet', )))
+        self.assertEqual(timeouts.pending(), 1)
+        time.sleep(0.1)
+        timeouts._on_timer()
+        self.assertEqual(item.events, ['start', 'timeout', ])
+        self.assertEqual(q.GetSendingStats()['in_flight'], 0)
+        # window slot was released, so next file can be started
+        self.assertEqual(q.RunSend(), 1)
+        self.assertEqual(waiting.state, 'UPLOADING')
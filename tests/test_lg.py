@@ -0,0 +1,72 @@
+import os
+import time
+
+from unittest import TestCase
+
+from logs import lg
+
+from system import bpio
+
+
+class _NotFormatted(object):
+
+    def __str__(self):
+        raise Exception('must not be formatted')
+
+
+class TestLogs(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(4)
+        self.log_filename = '/tmp/.bitdust_tmp/logs/main.log'
+
+    def tearDown(self):
+        lg.close_log_file()
+        lg.set_debug_level(30)
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+
+    def _read_log(self):
+        with open(self.log_filename) as f:
+            return f.read()
+
+    def test_disabled_levels(self):
+        self.assertIsNone(lg.args(6, _NotFormatted(), key=_NotFormatted()))
+        self.assertIsNone(lg.dbg(6, 'value is %s', _NotFormatted()))
+        self.assertIsNone(lg.args(7, _NotFormatted()))
+        # odd levels are printed same way as previous even level
+        self.assertEqual(lg.args(5, 1, key='value'), 'test_lg.test_disabled_levels(1, key=value)')
+        self.assertEqual(lg.dbg(4, 'value is %s', 5), 'test_lg.test_disabled_levels value is 5')
+
+    def test_buffered_writer(self):
+        lg.open_log_file(self.log_filename)
+        self.assertIsNotNone(lg._LogWriter)
+        lg.out(4, 'first line')
+        lg.args(6, 'not printed')
+        lg.out(0, 'important line')
+        # level 0 messages are written immediately together with everything before them
+        self.assertIn('first line', self._read_log())
+        self.assertIn('important line', self._read_log())
+        lg.out(2, 'second line')
+        lg.out(4, 'third line', log_name='other')
+        for _ in range(50):
+            if 'second line' in self._read_log():
+                break
+            time.sleep(0.1)
+        self.assertIn('second line', self._read_log())
+        lg.out(2, 'last line')
+        lg.close_log_file()
+        self.assertIsNone(lg._LogWriter)
+        lines = self._read_log()
+        self.assertIn('last line', lines)
+        self.assertNotIn('not printed', lines)
+        self.assertLess(lines.index('first line'), lines.index('important line'))
+        self.assertLess(lines.index('second line'), lines.index('last line'))
+        with open(os.path.join(os.path.dirname(self.log_filename), 'other.log')) as f:
+            self.assertIn('third line', f.read())
@@ -0,0 +1,160 @@
+import os
+
+from unittest import TestCase
+
+from logs import lg
+
+from lib import jsn
+
+from system import bpio
+from system import local_fs
+
+from main import settings
+
+from stream import queue_log
+from stream import message_peddler
+
+
+_queue_id = 'queue_abc&alice@127.0.0.1_8084&bob@127.0.0.1_8084'
+
+
+class TestQueueLog(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(30)
+        settings.init(base_dir='/tmp/.bitdust_tmp')
+        self.log_dir = '/tmp/.bitdust_tmp/queue_log'
+
+    def tearDown(self):
+        queue_log.close_all()
+        settings.shutdown()
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def _message(self, sequence_id, **kwargs):
+        json_message = {
+            'sequence_id': sequence_id,
+            'created': 1000 + sequence_id,
+            'producer_id': 'alice@127.0.0.1_8084',
+            'payload': {'message_id': 'm%d' % sequence_id, 'data': 'x' * 100, },
+            'attempts': [],
+            'processed': None,
+        }
+        json_message.update(kwargs)
+        return json_message
+
+    def _reopen(self, qlog, **kwargs):
+        qlog.close()
+        qlog = queue_log.QueueLog(_queue_id, self.log_dir, **kwargs)
+        qlog.open()
+        return qlog
+
+    def test_append_read_reopen(self):
+        qlog = queue_log.QueueLog(_queue_id, self.log_dir, segment_max_size=1024, sync_batch_size=4)
+        qlog.open()
+        for sequence_id in range(30):
+            qlog.append_message(self._message(sequence_id))
+        self.assertGreater(len(qlog.segments), 3)
+        self.assertGreater(qlog.counters['fsyncs'], 0)
+        state = qlog.get_state(5)
+        state['attempts'].append({'message_id': 'm5', 'started': 1, 'finished': None, 'failed_consumers': [], })
+        qlog.set_state(5, state)
+        state['processed'] = 123
+        qlog.set_state(5, state)
+        qlog.append_message(self._message(7, payload={'message_id': 'm7', 'data': 'replaced', }))
+        qlog.append_message(self._message(40, processed=555, attempts=[{'message_id': 'm40', }, ]))
+        for _ in range(2):
+            self.assertEqual(qlog.sequence_ids(), list(range(30)) + [40, ])
+            result = qlog.read_messages_after(3, max_messages_count=5)
+            self.assertEqual([m['sequence_id'] for m in result], [4, 5, 6, 7, 8, ])
+            self.assertEqual(result[1]['processed'], 123)
+            self.assertEqual(result[1]['attempts'][0]['message_id'], 'm5')
+            self.assertEqual(result[3]['payload']['data'], 'replaced')
+            self.assertEqual(result[4], self._message(8))
+            self.assertEqual(qlog.read_messages([40, ])[0]['processed'], 555)
+            self.assertEqual(qlog.latest_sequence_id(), 40)
+            qlog = self._reopen(qlog, segment_max_size=1024)
+        qlog.close()
+
+    def test_sequential_reads(self):
+        qlog = queue_log.QueueLog(_queue_id, self.log_dir)
+        qlog.open()
+        for sequence_id in range(100):
+            qlog.append_message(self._message(sequence_id))
+        result = qlog.read_messages_after(-1, max_messages_count=100)
+        self.assertEqual(len(result), 100)
+        self.assertEqual(qlog.counters['seeks'], 0)
+        qlog.read_messages_after(49, max_messages_count=10)
+        self.assertEqual(qlog.counters['seeks'], 1)
+        qlog.close()
+
+    def test_erase_and_compact(self):
+        qlog = queue_log.QueueLog(_queue_id, self.log_dir, segment_max_size=2048)
+        qlog.open()
+        for sequence_id in range(60):
+            qlog.append_message(self._message(sequence_id))
+        for sequence_id in range(60):
+            state = qlog.get_state(sequence_id)
+            state['processed'] = 100 + sequence_id
+            qlog.set_state(sequence_id, state)
+        segments_before = len(qlog.segments)
+        for sequence_id in range(45):
+            self.assertTrue(qlog.erase(sequence_id))
+        self.assertFalse(qlog.erase(0))
+        self.assertGreater(qlog.compact(), 0)
+        self.assertLess(len(qlog.segments), segments_before)
+        self.assertGreater(qlog.counters['removed_segments'], 0)
+        expected = [self._message(sequence_id, processed=100 + sequence_id) for sequence_id in range(45, 60)]
+        self.assertEqual(qlog.read_messages_after(-1), expected)
+        qlog = self._reopen(qlog, segment_max_size=2048)
+        self.assertEqual(qlog.sequence_ids(), list(range(45, 60)))
+        self.assertEqual(qlog.read_messages_after(-1), expected)
+        qlog.close()
+
+    def test_incomplete_record(self):
+        qlog = queue_log.QueueLog(_queue_id, self.log_dir)
+        qlog.open()
+        for sequence_id in range(3):
+            qlog.append_message(self._message(sequence_id))
+        qlog.close()
+        path = qlog.segment_path(qlog.segments[-1])
+        good_size = os.path.getsize(path)
+        with open(path, 'ab') as fout:
+            fout.write(b'\x00\x01\x02\x03\x01')
+        qlog = queue_log.QueueLog(_queue_id, self.log_dir)
+        qlog.open()
+        self.assertEqual(os.path.getsize(path), good_size)
+        self.assertEqual(qlog.sequence_ids(), [0, 1, 2, ])
+        qlog.append_message(self._message(3))
+        qlog = self._reopen(qlog)
+        self.assertEqual([m['sequence_id'] for m in qlog.read_messages_after(-1)], [0, 1, 2, 3, ])
+        qlog.close()
+
+    def test_migrate_messages(self):
+        messages_dir = os.path.join(os.path.dirname(message_peddler.queue_log_dir(_queue_id)), 'messages')
+        bpio._dirs_make(messages_dir)
+        for sequence_id in range(12):
+            json_message = self._message(sequence_id)
+            if sequence_id < 4:
+                json_message['processed'] = 10
+                json_message['attempts'].append({'message_id': 'm%d' % sequence_id, 'started': 1, 'finished': 2, 'failed_consumers': [], })
+            local_fs.WriteTextFile(os.path.join(messages_dir, str(sequence_id)), jsn.dumps(json_message))
+        self.assertEqual(message_peddler.migrate_queue_messages(_queue_id), 12)
+        self.assertFalse(os.path.isdir(messages_dir))
+        self.assertEqual(message_peddler.migrate_queue_messages(_queue_id), 0)
+        result = message_peddler.get_messages_for_consumer(_queue_id, 'bob@127.0.0.1_8084', 1, max_messages_count=3)
+        self.assertEqual([m['sequence_id'] for m in result], [2, 3, 4, ])
+        self.assertEqual(result[1]['processed'], 10)
+        self.assertNotIn('attempts', result[0])
+        self.assertTrue(message_peddler.register_delivery(_queue_id, 5, 'm5'))
+        self.assertTrue(message_peddler.unregister_delivery(_queue_id, 5, 'm5', []))
+        self.assertTrue(message_peddler.update_processed_message(_queue_id, 5))
+        queue_log.close_all()
+        self.assertEqual(queue_log.get_log(_queue_id), None)
+        result = message_peddler.read_messages(_queue_id, sequence_id_list=[5, ])
+        self.assertTrue(result[0]['processed'])
+        self.assertTrue(message_peddler.erase_message(_queue_id, 5))
+        self.assertEqual(len(message_peddler.read_messages(_queue_id)), 11)
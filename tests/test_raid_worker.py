@@ -1,4 +1,5 @@
 import os
+import time
 import base64
 
 from twisted.trial.unittest import TestCase
@@ -22,6 +23,8 @@ from main import config
 
 class _Helper(object):
 
+    cpu_cores = None
+
     def setUp(self):
         try:
             bpio.rmdir_recursive('/tmp/.bitdust_tmp')
@@ -38,6 +41,9 @@ class _Helper(object):
             config.conf().setBool('services/rebuilding/child-processes-enabled', True)
         else:
             config.conf().setBool('services/rebuilding/child-processes-enabled', False)
+        if self.cpu_cores:
+            self.addCleanup(setattr, bpio, 'detect_number_of_cpu_cores', bpio.detect_number_of_cpu_cores)
+            bpio.detect_number_of_cpu_cores = lambda: self.cpu_cores
 
     def tearDown(self):
         settings.shutdown()
@@ -310,8 +316,37 @@ class _Helper(object):
 
         reactor.callLater(0.5, raid_worker.add_task, 'make', (  # @UndefinedVariable
             '/tmp/source1.txt', 'ecc/64x64', 'F12345678', '5', '/tmp/raidtest/master$alice@somehost.com/0/F12345678'), _task_failed)
-        reactor.callLater(0.55, raid_worker.cancel_task, 'make', '/tmp/source1.txt')  # @UndefinedVariable
 
+        def _on_worker_started():
+            # task is cancelled right after it was started
+            raid_worker.A().addStateChangedCallback(
+                lambda *a: raid_worker.cancel_task('make', '/tmp/source1.txt'), newstate='WORK')
+
+        reactor.callLater(0.4, _on_worker_started)  # @UndefinedVariable
+
+        return test_result
+
+
+
+    def _test_make_buffer(self):
+        test_result = Deferred()
+        os.system('rm -rf /tmp/raidtest')
+        os.system("mkdir -p '/tmp/raidtest/master$alice@somehost.com/0/F12345678'")
+        block = base64.b64encode(os.urandom(100000))
+        reactor.callWhenRunning(raid_worker.A, 'init')  # @UndefinedVariable
+
+        def _make_done(c, t, r):
+            fragments = sorted(os.listdir('/tmp/raidtest/master$alice@somehost.com/0/F12345678'))
+            os.system('rm -rf /tmp/raidtest')
+            reactor.callLater(0, raid_worker.A, 'shutdown')  # @UndefinedVariable
+            if r is not None and list(r) == [18, 18] and len(fragments) == 36:
+                reactor.callLater(0.1, test_result.callback, True)  # @UndefinedVariable
+            else:
+                reactor.callLater(0.1, test_result.errback, Exception('unexpected result %r with %d fragments' % (r, len(fragments))))  # @UndefinedVariable
+
+        reactor.callLater(0.1, raid_worker.add_task, 'make-buffer', (  # @UndefinedVariable
+            'block/5', memoryview(b'%d:' % len(block) + block), 'ecc/18x18', 'F12345678', '5',
+            '/tmp/raidtest/master$alice@somehost.com/0/F12345678'), _make_done)
         return test_result
 
 
@@ -325,4 +360,60 @@ class TestRaidWorkerWithParallelP(_Helper, TestCase):
 class TestRaidWorkerWithThreads(_Helper, TestCase):
 
     child_processes_enabled = False
+    cpu_cores = 1
 
+    def test_make_buffer(self):
+        return self._test_make_buffer()
+
+    def test_task_cancel_during_parity_build(self):
+        test_result = Deferred()
+        os.system('rm -rf /tmp/raidtest')
+        os.system("mkdir -p '/tmp/raidtest/master$alice@somehost.com/0/F12345678'")
+        open('/tmp/source2.txt', 'w').write(base64.b64encode(os.urandom(100000)).decode())
+        threshold_control = raid_worker.RaidTask.threshold_control
+        progress = []
+
+        def _threshold_control(task, more_bytes):
+            if not progress:
+                # cancel the task from the main thread and wait until it is stopped
+                reactor.callFromThread(raid_worker.cancel_task, 'make', '/tmp/source2.txt')  # @UndefinedVariable
+                for _ in range(500):
+                    if task._stopped:
+                        break
+                    time.sleep(0.01)
+            progress.append(more_bytes)
+            return threshold_control(task, more_bytes)
+
+        def _task_done(c, t, r):
+            os.system('rm -rf /tmp/source2.txt')
+            os.system('rm -rf /tmp/raidtest')
+            reactor.callLater(0, raid_worker.A, 'shutdown')  # @UndefinedVariable
+            if r is None and len(progress) == 1:
+                reactor.callLater(0.1, test_result.callback, True)  # @UndefinedVariable
+            else:
+                reactor.callLater(0.1, test_result.errback, Exception('task expected to be cancelled, result=%r progress=%r' % (r, progress)))  # @UndefinedVariable
+
+        raid_worker.RaidTask.threshold_control = _threshold_control
+        self.addCleanup(setattr, raid_worker.RaidTask, 'threshold_control', threshold_control)
+        reactor.callWhenRunning(raid_worker.A, 'init')  # @UndefinedVariable
+        reactor.callLater(0.1, raid_worker.add_task, 'make', (  # @UndefinedVariable
+            '/tmp/source2.txt', 'ecc/64x64', 'F12345678', '5', '/tmp/raidtest/master$alice@somehost.com/0/F12345678'), _task_done)
+        return test_result
+
+
+
+class TestRaidWorkerWithProcessPool(TestCase):
+
+    child_processes_enabled = False
+    cpu_cores = 4
+
+    # starting worker processes takes time, so only few cases are checked here
+    setUp = _Helper.setUp
+    tearDown = _Helper.tearDown
+    _test_make_rebuild_read = _Helper._test_make_rebuild_read
+    _test_make_buffer = _Helper._test_make_buffer
+    test_ecc18x18_with_5_dead_suppliers_success = _Helper.test_ecc18x18_with_5_dead_suppliers_success
+    test_task_cancel = _Helper.test_task_cancel
+
+    def test_make_buffer(self):
+        return self._test_make_buffer()
@@ -0,0 +1,114 @@
+from unittest import TestCase
+import os
+import array
+import copy
+import shutil
+import tempfile
+
+from raid import eccmap
+from raid import raidutils
+from raid import make
+from raid import read
+
+
+def _legacy_parity(data, myeccmap):
+    wholefile = array.array('i', data)
+    wholefile.byteswap()
+    seglength = int(len(data) / myeccmap.datasegments)
+    sds = {}
+    for seg_num, chunk in enumerate(raidutils.chunks(wholefile, int(seglength / 4))):
+        sds[seg_num] = iter(copy.copy(chunk))
+    psds_list = raidutils.build_parity(sds, int(seglength / 4), myeccmap.datasegments, myeccmap, myeccmap.paritysegments)
+    return {PSegNum: psds_list[PSegNum].tobytes() for PSegNum in psds_list}
+
+
+def _legacy_rebuild_one(inlist):
+    raidreads = [bytearray(open(filename, 'rb').read()) for filename in inlist]
+    rebuilt = bytearray()
+    for i in range(len(raidreads[0])):
+        xor = 0
+        for j in range(len(inlist)):
+            xor = xor ^ raidreads[j][i]
+        rebuilt.append(xor)
+    return bytes(rebuilt)
+
+
+class TestRaidUtils(TestCase):
+
+    def test_build_parity_segments_identical(self):
+        for eccmapname in eccmap.EccMapNames():
+            myeccmap = eccmap.eccmap(eccmapname)
+            for seglength in (4, 100, 1028, ):
+                data = os.urandom(seglength * myeccmap.datasegments)
+                segments = [data[i * seglength:(i + 1) * seglength] for i in range(myeccmap.datasegments)]
+                expected = _legacy_parity(data, myeccmap)
+                result = raidutils.build_parity_segments(segments, myeccmap, chunk_size=256)
+                self.assertEqual(sorted(result.keys()), sorted(expected.keys()))
+                for PSegNum in expected:
+                    self.assertEqual(result[PSegNum], expected[PSegNum], '%s parity %d' % (eccmapname, PSegNum))
+
+    def test_build_parity_segments_cancel(self):
+        myeccmap = eccmap.eccmap('ecc/4x4')
+        segments = [os.urandom(1024) for _ in range(myeccmap.datasegments)]
+        with self.assertRaises(Exception):
+            raidutils.build_parity_segments(segments, myeccmap, threshold_control=lambda more_bytes: False)
+
+
+class TestRebuildOne(TestCase):
+
+    def setUp(self):
+        self.dir_to_test = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_to_test)
+
+    def _segment(self, block_num, seg_num, data_or_parity):
+        return os.path.join(self.dir_to_test, '%d-%d-%s' % (block_num, seg_num, data_or_parity))
+
+    def test_rebuild_one_all_eccmaps(self):
+        for block_num, eccmapname in enumerate(eccmap.EccMapNames()):
+            myeccmap = eccmap.eccmap(eccmapname)
+            source_filename = os.path.join(self.dir_to_test, 'source%d' % block_num)
+            with open(source_filename, 'wb') as f:
+                f.write(os.urandom(517 * myeccmap.datasegments + 3))
+            self.assertEqual(make.do_in_memory(source_filename, eccmapname, 'F1', block_num, self.dir_to_test), (myeccmap.datasegments, myeccmap.paritysegments))
+            for PSegNum in range(myeccmap.paritysegments):
+                Map = myeccmap.ParityToData[PSegNum]
+                for DSegNum in Map:
+                    inlist = [self._segment(block_num, seg_num, 'Data') for seg_num in Map if seg_num != DSegNum]
+                    inlist.append(self._segment(block_num, PSegNum, 'Parity'))
+                    rebuilt_filename = os.path.join(self.dir_to_test, 'rebuilt')
+                    self.assertTrue(read.RebuildOne(inlist, len(inlist), rebuilt_filename))
+                    rebuilt = open(rebuilt_filename, 'rb').read()
+                    self.assertEqual(rebuilt, open(self._segment(block_num, DSegNum, 'Data'), 'rb').read())
+                    self.assertEqual(rebuilt, _legacy_rebuild_one(inlist))
+
+
+class TestMakeBuffer(TestCase):
+
+    def setUp(self):
+        self.dir_to_test = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_to_test)
+
+    def test_make_buffer_same_as_file(self):
+        for eccmapname in eccmap.EccMapNames():
+            myeccmap = eccmap.eccmap(eccmapname)
+            for size in (1, 1000, 4 * myeccmap.datasegments, 4 * myeccmap.datasegments * 10 + 7, ):
+                data = os.urandom(size)
+                file_dir = tempfile.mkdtemp(dir=self.dir_to_test)
+                buffer_dir = tempfile.mkdtemp(dir=self.dir_to_test)
+                source_filename = os.path.join(self.dir_to_test, 'source')
+                with open(source_filename, 'wb') as f:
+                    f.write(data)
+                result_file = make.do_in_memory(source_filename, eccmapname, 'F1', 5, file_dir)
+                result_buffer = make.do_in_memory_buffer('F1/5', memoryview(data), eccmapname, 'F1', 5, buffer_dir)
+                self.assertEqual(result_file, result_buffer)
+                self.assertEqual(sorted(os.listdir(file_dir)), sorted(os.listdir(buffer_dir)))
+                for filename in os.listdir(file_dir):
+                    self.assertEqual(
+                        open(os.path.join(file_dir, filename), 'rb').read(),
+                        open(os.path.join(buffer_dir, filename), 'rb').read(),
+                        '%s %s' % (eccmapname, filename),
+                    )
@@ -13,6 +13,7 @@ from lib import serialization
 from crypt import key
 from crypt import signed
 from crypt import encrypted
+from crypt import cipher
 
 from userid import my_id
 
@@ -156,3 +157,108 @@ class Test(TestCase):
         data2 = b2.Data()
         self.assertEqual(data1, data2)
         self.assertEqual(raw1, raw2)
+
+    def test_encrypted_block_binary(self):
+        key.InitMyKey()
+        data1 = os.urandom(1024)
+        b1 = encrypted.Block(
+            CreatorID=my_id.getLocalID(),
+            BackupID='BackupABC',
+            BlockNumber=123,
+            SessionKey=key.NewSessionKey(session_key_type=key.SessionKeyType()),
+            SessionKeyType=key.SessionKeyType(),
+            LastBlock=False,
+            Data=data1,
+        )
+        self.assertEqual(b1.GenerateHash(), key.Hash(b1.GenerateHashBase()))
+        raw_json = b1.Serialize()
+        raw_binary = b1.Serialize(block_format=encrypted.BLOCK_FORMAT_BINARY)
+        self.assertLess(len(raw_binary), len(raw_json))
+        for raw in (raw_json, raw_binary, ):
+            b2 = encrypted.Unserialize(raw)
+            self.assertTrue(b2.Valid())
+            self.assertEqual(b2.Data(), data1)
+            self.assertEqual(b2.LastBlock, False)
+            self.assertEqual(b2.BlockNumber, 123)
+        b3 = encrypted.Unserialize(raw_binary)
+        self.assertEqual(b3.Serialize(), raw_json)
+        self.assertEqual(b3.Serialize(block_format=encrypted.BLOCK_FORMAT_BINARY), raw_binary)
+        self.assertEqual(bytes(b3.SerializeToBuffer()), raw_binary)
+        self.assertEqual(bytes(b3.SerializeToBuffer(length_prefix=True)), b'%d:' % len(raw_binary) + raw_binary)
+
+    def test_cipher_binary_envelope(self):
+        session_key = key.NewSessionKey(session_key_type='AES')
+        for size in (0, 1, 15, 16, 17, 1024, 1024 * 64 + 3, ):
+            data1 = os.urandom(size)
+            raw_json = cipher.encrypt_json(data1, session_key, 'AES')
+            raw_binary = cipher.encrypt_json(data1, session_key, 'AES', cipher_format=cipher.CIPHER_FORMAT_BINARY)
+            self.assertEqual(cipher.cipher_format(raw_json), cipher.CIPHER_FORMAT_JSON)
+            self.assertEqual(cipher.cipher_format(raw_binary), cipher.CIPHER_FORMAT_BINARY)
+            self.assertEqual(len(raw_binary), 1 + 16 + (size // 16 + 1) * 16)
+            self.assertEqual(cipher.decrypt_json(raw_json, session_key, 'AES'), data1)
+            self.assertEqual(cipher.decrypt_json(raw_binary, session_key, 'AES'), data1)
+
+    def test_encrypted_block_binary_cipher(self):
+        key.InitMyKey()
+        data1 = os.urandom(1024 * 16 + 5)
+        b1 = encrypted.Block(
+            CreatorID=my_id.getLocalID(),
+            BackupID='BackupABC',
+            BlockNumber=1,
+            SessionKey=key.NewSessionKey(session_key_type=key.SessionKeyType()),
+            SessionKeyType=key.SessionKeyType(),
+            LastBlock=True,
+            Data=data1,
+            CipherFormat=cipher.CIPHER_FORMAT_BINARY,
+        )
+        raw_binary = b1.Serialize(block_format=encrypted.BLOCK_FORMAT_BINARY)
+        self.assertLess(len(raw_binary), len(data1) + 1024)
+        self.assertRaises(ValueError, b1.Serialize)
+        b2 = encrypted.Unserialize(raw_binary)
+        self.assertTrue(b2.Valid())
+        self.assertEqual(b2.Data(), data1)
+
+    def test_cipher_stream(self):
+        session_key = key.NewSessionKey(session_key_type='AESGCM')
+        for size in (0, 1, 1023, 1024, 1025, 4096, 4096 + 7, ):
+            data1 = os.urandom(size)
+            encryptor = cipher.StreamEncryptor(session_key, chunk_size=1024)
+            pos = 0
+            while pos < size:
+                encryptor.write(data1[pos:pos + 300])
+                pos += 300
+            self.assertEqual(encryptor.length, size)
+            raw_stream = encryptor.finish()
+            self.assertEqual(cipher.cipher_format(raw_stream), cipher.CIPHER_FORMAT_STREAM)
+            self.assertEqual(cipher.decrypt_json(raw_stream, session_key, 'AESGCM'), data1)
+            self.assertEqual(cipher.encrypt_json(data1, session_key, 'AESGCM')[:1], raw_stream[:1])
+        raw_stream = cipher.encrypt_stream(os.urandom(4096), session_key, chunk_size=1024)
+        modified = bytearray(raw_stream)
+        modified[100] ^= 1
+        self.assertRaises(ValueError, cipher.decrypt_stream, bytes(modified), session_key)
+        # truncated exactly at the chunk boundary
+        self.assertRaises(ValueError, cipher.decrypt_stream, raw_stream[:-(1024 + 16)], session_key)
+        self.assertRaises(ValueError, cipher.decrypt_stream, raw_stream[:-1], session_key)
+
+    def test_encrypted_block_stream_cipher(self):
+        key.InitMyKey()
+        data1 = os.urandom(1024 * 160 + 5)
+        session_key = key.NewSessionKey(session_key_type='AESGCM')
+        encryptor = cipher.StreamEncryptor(session_key)
+        encryptor.write(data1[:1000])
+        encryptor.write(data1[1000:])
+        b1 = encrypted.Block(
+            CreatorID=my_id.getLocalID(),
+            BackupID='BackupABC',
+            BlockNumber=1,
+            SessionKey=session_key,
+            SessionKeyType='AESGCM',
+            LastBlock=True,
+            EncryptedData=encryptor.finish(),
+            Length=encryptor.length,
+        )
+        raw_binary = b1.Serialize(block_format=encrypted.BLOCK_FORMAT_BINARY)
+        self.assertRaises(ValueError, b1.Serialize)
+        b2 = encrypted.Unserialize(raw_binary)
+        self.assertTrue(b2.Valid())
+        self.assertEqual(b2.Data(), data1)
@@ -0,0 +1,61 @@
+import time
+
+from twisted.trial.unittest import TestCase
+from twisted.internet import reactor  # @UnresolvedImport
+from twisted.internet.defer import Deferred
+
+from transport import timeouts
+
+
+class TestTimeouts(TestCase):
+
+    def setUp(self):
+        timeouts.init()
+
+    def tearDown(self):
+        timeouts.shutdown()
+
+    def test_fire_in_order(self):
+        fired = []
+        result = Deferred()
+
+        def _on_timeout(key):
+            fired.append(key)
+            if key == 'c':
+                result.callback(fired)
+
+        started = time.time()
+        timeouts.register('c', 0.3, _on_timeout, 'c')
+        timeouts.register('a', 0.1, _on_timeout, 'a')
+        timeouts.register('b', 0.2, _on_timeout, 'b')
+        timeouts.register('x', 0.15, _on_timeout, 'x')
+        self.assertEqual(timeouts.pending(), 4)
+        self.assertTrue(timeouts.unregister('x'))
+        self.assertFalse(timeouts.unregister('x'))
+
+        def _check(fired):
+            self.assertEqual(fired, ['a', 'b', 'c', ])
+            self.assertLess(time.time() - started, 1.0)
+            counters = timeouts.counters()
+            self.assertEqual(counters['pending'], 0)
+            self.assertEqual(counters['fired'], 3)
+            self.assertEqual(counters['cancelled'], 1)
+            return None
+
+        result.addCallback(_check)
+        return result
+
+    def test_register_again(self):
+        fired = []
+        result = Deferred()
+        timeouts.register('a', 5, fired.append, 'first')
+        timeouts.register('a', 0.05, fired.append, 'second')
+        self.assertEqual(timeouts.pending(), 1)
+
+        def _check():
+            self.assertEqual(fired, ['second', ])
+            self.assertFalse(timeouts.is_registered('a'))
+            result.callback(None)
+
+        reactor.callLater(0.2, _check)  # @UndefinedVariable
+        return result
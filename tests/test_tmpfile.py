@@ -0,0 +1,44 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from system import tmpfile
+
+
+class TestTmpFile(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        tmpfile._TempDirPath = None
+        tmpfile.init(temp_dir_path=self.temp_dir)
+
+    def tearDown(self):
+        tmpfile.shutdown()
+        tmpfile._TempDirPath = None
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_in_memory_file(self):
+        data = os.urandom(5000)
+        filename = tmpfile.make_in_memory('outbox', data, extension='.out')
+        self.assertTrue(filename.startswith(tmpfile.subdir('outbox')))
+        self.assertTrue(filename.endswith('.out'))
+        self.assertFalse(os.path.exists(filename))
+        self.assertTrue(tmpfile.is_in_memory(filename))
+        self.assertTrue(tmpfile.exists(filename))
+        self.assertEqual(tmpfile.getsize(filename), 5000)
+        reader = tmpfile.open_for_reading(filename)
+        self.assertTrue(tmpfile.release_in_memory(filename))
+        self.assertFalse(tmpfile.release_in_memory(filename))
+        self.assertFalse(tmpfile.exists(filename))
+        self.assertEqual(reader.read(1000) + reader.read(), data)
+
+    def test_file_on_disk(self):
+        fd, filename = tmpfile.make('outbox', extension='.out')
+        os.write(fd, b'abcd')
+        os.close(fd)
+        self.assertFalse(tmpfile.is_in_memory(filename))
+        self.assertTrue(tmpfile.exists(filename))
+        self.assertEqual(tmpfile.getsize(filename), 4)
+        with tmpfile.open_for_reading(filename) as reader:
+            self.assertEqual(reader.read(), b'abcd')
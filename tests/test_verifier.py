@@ -0,0 +1,99 @@
+import os
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import DeferredList
+
+from logs import lg
+
+from system import bpio
+
+from main import settings
+
+from crypt import key
+from crypt import signed
+from crypt import verifier
+
+from userid import my_id
+
+from tests.test_crypt_signed import _some_priv_key, _some_identity_xml
+
+
+class TestVerifier(TestCase):
+
+    def setUp(self):
+        try:
+            bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+        except Exception:
+            pass
+        lg.set_debug_level(30)
+        settings.init(base_dir='/tmp/.bitdust_tmp')
+        try:
+            os.makedirs('/tmp/.bitdust_tmp/metadata/')
+        except:
+            pass
+        fout = open('/tmp/_some_priv_key', 'w')
+        fout.write(_some_priv_key)
+        fout.close()
+        fout = open(settings.LocalIdentityFilename(), 'w')
+        fout.write(_some_identity_xml)
+        fout.close()
+        self.assertTrue(key.LoadMyKey(keyfilename='/tmp/_some_priv_key'))
+        self.assertTrue(my_id.loadLocalIdentity())
+
+    def tearDown(self):
+        verifier.shutdown()
+        key.ForgetMyKey()
+        my_id.forgetLocalIdentity()
+        settings.shutdown()
+        os.remove('/tmp/_some_priv_key')
+        bpio.rmdir_recursive('/tmp/.bitdust_tmp')
+
+    def _make_packets(self, count):
+        packets = []
+        for i in range(count):
+            packets.append(signed.Packet(
+                'Data',
+                my_id.getLocalID(),
+                my_id.getLocalID(),
+                'SomeID%d' % i,
+                os.urandom(256),
+                my_id.getLocalID(),
+            ))
+        return packets
+
+    def _check(self, results, expected):
+        self.assertEqual([r[1] for r in results], expected)
+        counters = verifier.counters()
+        self.assertEqual(counters['verified'], expected.count(True))
+        self.assertEqual(counters['not_valid'], expected.count(False))
+        self.assertEqual(counters['pending'], 0)
+        self.assertEqual(counters['batches_in_progress'], 0)
+
+    def test_verify_in_worker_threads(self):
+        verifier.init(threads_count=2, batch_size=4)
+        self.assertTrue(verifier.is_running())
+        packets = self._make_packets(10)
+        # break the signature of one packet
+        packets[6].Payload = b'something else'
+        expected = [True, ] * 10
+        expected[6] = False
+        delivered = []
+        defers = []
+        for i, p in enumerate(packets):
+            d = verifier.verify_packet(p)
+            d.addCallback(lambda result, i=i: delivered.append(i) or result)
+            defers.append(d)
+        dl = DeferredList(defers)
+        dl.addCallback(self._check, expected)
+        dl.addCallback(lambda _: self.assertEqual(delivered, list(range(10))))
+        dl.addCallback(lambda _: self.assertEqual(verifier.counters()['batches'], 3))
+        return dl
+
+    def test_verify_in_main_thread(self):
+        verifier.init(threads_count=0)
+        self.assertFalse(verifier.is_running())
+        packets = self._make_packets(3)
+        packets[0].Signature = b'123'
+        dl = DeferredList([verifier.verify_packet(p) for p in packets])
+        dl.addCallback(self._check, [False, True, True, ])
+        return dl
@@ -122,6 +122,7 @@ from contacts import identitycache
 from transport import callback
 from transport import packet_in
 from transport import packet_out
+from transport import timeouts
 
 #------------------------------------------------------------------------------
 
@@ -245,7 +246,7 @@ def start():
             else:
                 if _Debug:
                     lg.out(4, '    %r is ready' % transp)
-    reactor.callLater(5, packets_timeout_loop)  # @UndefinedVariable
+    start_packets_timeout_loop()
     return result
 
 
@@ -271,7 +272,7 @@ def cold_start():
             else:
                 if _Debug:
                     lg.out(4, '    %r is ready, try next one' % transp)
-    reactor.callLater(5, packets_timeout_loop)  # @UndefinedVariable
+    start_packets_timeout_loop()
     return result
 
 #------------------------------------------------------------------------------
@@ -281,9 +282,9 @@ def stop():
     """
     if _Debug:
         lg.out(4, 'gateway.stop')
-    stop_packets_timeout_loop()
     shutdown_all_inbox_packets()
     shutdown_all_outbox_packets()
+    stop_packets_timeout_loop()
     result = []
     for proto, transp in transports().items():
         if settings.transportIsEnabled(proto):
@@ -732,24 +733,22 @@ def shutdown_all_inbox_packets():
 #------------------------------------------------------------------------------
 
 
+def start_packets_timeout_loop():
+    """
+    Packets are registering their deadlines in ``transport.timeouts`` and only expired packets are touched there.
+    The loop here is only running in debug mode to print current state of the queues.
+    """
+    global _PacketsTimeOutTask
+    timeouts.init()
+    if _Debug and not _PacketsTimeOutTask:
+        _PacketsTimeOutTask = reactor.callLater(1, packets_timeout_loop)  # @UndefinedVariable
+
+
 def packets_timeout_loop():
     global _PacketsTimeOutTask
-    # lg.out(18, 'gateway.packets_timeout_loop')
-    delay = 5
-    if _Debug:
-        delay = 1
-    _PacketsTimeOutTask = reactor.callLater(delay, packets_timeout_loop)  # @UndefinedVariable
-    for pkt_in in list(packet_in.inbox_items().values()):
-        if pkt_in.is_timed_out():
-            if _Debug:
-                lg.out(_DebugLevel, 'gateway.packets_timeout_loop %r is timed out: %s' % (pkt_in, pkt_in.timeout))
-            pkt_in.automat('cancel', 'timeout')
-    for pkt_out in packet_out.queue():
-        if pkt_out.is_timed_out():
-            if _Debug:
-                lg.out(_DebugLevel, 'gateway.packets_timeout_loop %r is timed out: %s' % (pkt_out, pkt_out.timeout))
-            pkt_out.automat('cancel', 'timeout')
+    _PacketsTimeOutTask = reactor.callLater(1, packets_timeout_loop)  # @UndefinedVariable
     if _Debug and lg.is_debug(_DebugLevel):
+        lg.out(_DebugLevel, 'gateway.packets_timeout_loop %r' % timeouts.counters())
         monitoring()
 
 
@@ -759,6 +758,8 @@ def stop_packets_timeout_loop():
         if _PacketsTimeOutTask.active():
             _PacketsTimeOutTask.cancel()
         _PacketsTimeOutTask = None
+    # deadlines registered by other modules, for example by io_throttle, must survive network restart
+    timeouts.unregister_owner('packet_out')
 
 #------------------------------------------------------------------------------
 
@@ -84,6 +84,8 @@ from userid import id_url
 from contacts import contactsdb
 from contacts import identitycache
 
+from crypt import signed
+
 from services import driver
 
 from p2p import commands
@@ -103,14 +105,18 @@ def init():
     """
     """
     global _PacketLogFileEnabled
+    from crypt import verifier
     _PacketLogFileEnabled = config.conf().getBool('logs/packet-enabled')
+    verifier.init(threads_count=config.conf().getInt('services/gateway/verify-threads', settings.DefaultVerifyThreads()))
 
 
 def shutdown():
     """
     """
     global _PacketLogFileEnabled
+    from crypt import verifier
     _PacketLogFileEnabled = False
+    verifier.shutdown()
 
 #------------------------------------------------------------------------------
 
@@ -241,8 +247,13 @@ def handle(newpacket, info):
     """
     Actually process incoming packet. Here we can be sure that owner/creator of the packet is identified.
     """
-    from transport import packet_out
-    handled = False
+    from crypt import verifier
+    if verifier.is_running():
+        # signature will be verified in a worker thread, packet is handled later in the main thread
+        d = verifier.verify_packet(newpacket)
+        d.addCallback(lambda is_signature_valid: on_signature_verified(newpacket, info, is_signature_valid))
+        d.addErrback(lg.errback)
+        return d
     # check that signed by a contact of ours
     try:
         is_signature_valid = newpacket.Valid(raise_signature_invalid=False)
@@ -250,6 +261,15 @@ def handle(newpacket, info):
         is_signature_valid = False
         # lg.exc('new packet from %s://%s is NOT VALID:\n\n%r\n' % (
         #     info.proto, info.host, newpacket.Serialize()))
+    return on_signature_verified(newpacket, info, is_signature_valid)
+
+
+def on_signature_verified(newpacket, info, is_signature_valid):
+    """
+    Called when signature of the incoming packet was checked, only valid packets are passed further.
+    """
+    from transport import packet_out
+    handled = False
     if not is_signature_valid:
         if _Debug:
             lg.args(_DebugLevel,
@@ -260,6 +280,8 @@ def handle(newpacket, info):
         lg.warn('signature is not valid for %r from %r|%r to %r' % (
             newpacket, newpacket.OwnerID, newpacket.CreatorID, newpacket.RemoteID))
         return None
+    # sender_idurl is not authenticated, so packet format of the peer is remembered only for valid packets
+    signed.RememberPeerPacketFormat(info.sender_idurl, newpacket)
     try:
         for p in packet_out.search_by_response_packet(newpacket, info.proto, info.host):
             p.automat('inbox-packet', (newpacket, info))
@@ -86,6 +86,8 @@ from lib import net_misc
 
 from system import tmpfile
 
+from crypt import signed
+
 from contacts import contactsdb
 from contacts import identitycache
 
@@ -98,11 +100,17 @@ from main import config
 from main import events
 
 from transport import callback
+from transport import timeouts
 
 #------------------------------------------------------------------------------
 
 _OutboxQueue = []
+_OutboxByPacketID = {}
+_OutboxByFilename = {}
+_OutboxByTransferID = {}
+_OutboxByRemoteID = {}
 _PacketsCounter = 0
+_InMemoryLimit = None
 
 #------------------------------------------------------------------------------
 
@@ -110,14 +118,29 @@ def init():
     """
     """
     global _PacketLogFileEnabled
+    global _InMemoryLimit
     _PacketLogFileEnabled = config.conf().getBool('logs/packet-enabled')
+    _InMemoryLimit = config.conf().getInt('services/gateway/outbox-in-memory-limit', settings.DefaultOutboxInMemoryLimit())
+    events.add_subscriber(on_identity_url_changed, 'identity-url-changed')
 
 
 def shutdown():
     """
     """
     global _PacketLogFileEnabled
+    global _InMemoryLimit
+    events.remove_subscriber(on_identity_url_changed, 'identity-url-changed')
     _PacketLogFileEnabled = False
+    _InMemoryLimit = None
+
+
+def in_memory_limit():
+    """
+    Outgoing packets up to that size are not written to disk but passed to the transports from memory.
+    """
+    if _InMemoryLimit is None:
+        return settings.DefaultOutboxInMemoryLimit()
+    return _InMemoryLimit
 
 #------------------------------------------------------------------------------
 
@@ -149,16 +172,70 @@ def create(outpacket, wide, callbacks, target=None, route=None, response_timeout
             outpacket.Command, outpacket.PacketID, target, route, list(callbacks.keys())))
     p = PacketOut(outpacket, wide, callbacks, target, route, response_timeout, keep_alive, skip_ack=skip_ack)
     queue().append(p)
+    index_packet(p)
     p.automat('run')
     return p
 
 #------------------------------------------------------------------------------
 
+def _remote_key(idurl):
+    return id_url.field(idurl).to_bin()
 
-def search(proto, host, filename, remote_idurl=None):
-    for p in queue():
-        if p.filename != filename:
+
+def index_packet(p):
+    """
+    Register outgoing packet in the lookup indexes, called right after it was added to the queue.
+    """
+    _OutboxByPacketID.setdefault(p.outpacket.PacketID.lower(), []).append(p)
+    _OutboxByRemoteID.setdefault(p.remote_key, []).append(p)
+    if p.filename:
+        _OutboxByFilename[p.filename] = p
+
+
+def unindex_packet(p):
+    """
+    Remove outgoing packet from all lookup indexes, called when it is removed from the queue.
+    """
+    for index, key in (
+        (_OutboxByPacketID, p.outpacket.PacketID.lower()),
+        (_OutboxByRemoteID, p.remote_key),
+    ):
+        packets = index.get(key)
+        if packets is None:
             continue
+        if p in packets:
+            packets.remove(p)
+        if not packets:
+            index.pop(key)
+    if p.filename and _OutboxByFilename.get(p.filename) is p:
+        _OutboxByFilename.pop(p.filename)
+    for transfer_id in p.transfer_ids:
+        if _OutboxByTransferID.get(transfer_id) is p:
+            _OutboxByTransferID.pop(transfer_id)
+    p.transfer_ids.clear()
+
+
+def rebuild_remote_index():
+    """
+    Remote idurls are indexed by the latest known revision, so after any identity rotation
+    the keys must be calculated again.
+    """
+    global _OutboxByRemoteID
+    _OutboxByRemoteID = {}
+    for p in queue():
+        p.remote_key = _remote_key(p.remote_idurl)
+        _OutboxByRemoteID.setdefault(p.remote_key, []).append(p)
+
+
+def on_identity_url_changed(evt):
+    rebuild_remote_index()
+
+#------------------------------------------------------------------------------
+
+
+def search(proto, host, filename, remote_idurl=None):
+    p = _OutboxByFilename.get(filename)
+    if p is not None:
         for i in p.items:
             if i.proto == proto:
                 if not remote_idurl:
@@ -201,10 +278,19 @@ def search_many(proto=None,
                 packet_id=None,
                 ):
     results = []
-    for p in queue():
+    remote_key = _remote_key(remote_idurl) if remote_idurl else None
+    if packet_id:
+        candidates = _OutboxByPacketID.get(packet_id.lower(), [])
+    elif filename:
+        candidates = [_OutboxByFilename[filename], ] if filename in _OutboxByFilename else []
+    elif remote_key:
+        candidates = _OutboxByRemoteID.get(remote_key, [])
+    else:
+        candidates = queue()
+    for p in list(candidates):
         # TODO: to be checked later - need to make sure we identify users correctly
         # if remote_idurl and p.remote_idurl.to_bin() != remote_idurl.to_bin():
-        if remote_idurl and id_url.field(p.remote_idurl).to_bin() != id_url.field(remote_idurl).to_bin():
+        if remote_key and p.remote_key != remote_key:
             continue
         if filename and p.filename != filename:
             continue
@@ -226,7 +312,8 @@ def search_many(proto=None,
 
 
 def search_by_transfer_id(transfer_id):
-    for p in queue():
+    p = _OutboxByTransferID.get(transfer_id)
+    if p is not None:
         for i in p.items:
             if i.transfer_id and i.transfer_id == transfer_id:
                 return p, i
@@ -238,15 +325,14 @@ def search_by_response_packet(newpacket, proto=None, host=None):
     incoming_owner_idurl = newpacket.OwnerID
     incoming_creator_idurl = newpacket.CreatorID
     incoming_remote_idurl = newpacket.RemoteID
+    incoming_to_me = my_id.getLocalID().to_bin() == incoming_remote_idurl.to_bin()
+    incoming_from_me = my_id.getLocalID().to_bin() == incoming_owner_idurl.to_bin()
     if _Debug:
         lg.out(_DebugLevel, 'packet_out.search_by_response_packet for incoming [%s/%s/%s]:%s(%s) from [%s://%s] :\n%s' % (
             nameurl.GetName(incoming_owner_idurl), nameurl.GetName(incoming_creator_idurl), nameurl.GetName(incoming_remote_idurl),
             newpacket.Command, newpacket.PacketID, proto, host, ('\n'.join([strng.to_text(p.outpacket) for p in queue()]))))
-    for p in queue():
-        # TODO: investigate 
-        if p.outpacket.PacketID.lower() != newpacket.PacketID.lower():
-            # PacketID of incoming packet not matching with that outgoing packet
-            continue
+    # only packets with same PacketID (case insensitive) can be matching with the incoming packet
+    for p in list(_OutboxByPacketID.get(newpacket.PacketID.lower(), [])):
         if p.outpacket.PacketID != newpacket.PacketID:
             lg.err('packet ID in queue "almost" matching with incoming: %s ~ %s' % (
                 p.outpacket.PacketID, newpacket.PacketID, ))
@@ -261,15 +347,15 @@ def search_by_response_packet(newpacket, proto=None, host=None):
                 # outgoing packet was addressed to another node, so that means we need to expect response from another node also
                 expected_recipient.append(id_url.field(p.remote_idurl))
         matched = False
-        if incoming_owner_idurl in expected_recipient and my_id.getLocalID().to_bin() == incoming_remote_idurl.to_bin():
+        if incoming_owner_idurl in expected_recipient and incoming_to_me:
             if _Debug:
                 lg.out(_DebugLevel, 'packet_out.search_by_response_packet    matched with incoming owner: %s' % expected_recipient)
             matched = True
-        if incoming_creator_idurl in expected_recipient and my_id.getLocalID().to_bin() == incoming_remote_idurl.to_bin():
+        if incoming_creator_idurl in expected_recipient and incoming_to_me:
             if _Debug:
                 lg.out(_DebugLevel, 'packet_out.search_by_response_packet    matched with incoming creator: %s' % expected_recipient)
             matched = True
-        if incoming_remote_idurl in expected_recipient and my_id.getLocalID().to_bin() == incoming_owner_idurl.to_bin() and newpacket.Command == commands.Data():
+        if incoming_remote_idurl in expected_recipient and incoming_from_me and newpacket.Command == commands.Data():
             if _Debug:
                 lg.out(_DebugLevel, 'packet_out.search_by_response_packet    matched my own incoming Data with incoming remote: %s' % expected_recipient)
             matched = True
@@ -370,6 +456,7 @@ class PacketOut(automat.Automat):
             self.remote_idurl = self.outpacket.RemoteID
         if not self.remote_idurl:
             raise ValueError('outgoing packet %r did not define remote idurl' % outpacket)
+        self.remote_key = _remote_key(self.remote_idurl)
         self.remote_name = nameurl.GetName(self.outpacket.RemoteID)
         if id_url.to_bin(self.remote_idurl) != self.outpacket.RemoteID.to_bin():
             self.label = 'out_%d_%s_%s_via_%s' % (
@@ -431,6 +518,7 @@ class PacketOut(automat.Automat):
         self.packetdata = None
         self.filename = None
         self.filesize = None
+        self.transfer_ids = set()
         self.items = []
         self.results = []
         self.response_packet = None
@@ -655,22 +743,27 @@ class PacketOut(automat.Automat):
         """
         Action method.
         """
-        # serialize and write packet on disk
+        # serialize packet and keep it in memory, only big packets are written on disk
         a_packet = self.outpacket
         if self.route:
             a_packet = self.route['packet']
         try:
-            fileno, self.filename = tmpfile.make('outbox', extension='.out')
-            self.packetdata = a_packet.Serialize()
-            os.write(fileno, self.packetdata)
-            os.close(fileno)
+            self.packetdata = a_packet.Serialize(packet_format=signed.PeerPacketFormat(self.remote_idurl))
             self.filesize = len(self.packetdata)
+            if self.filesize <= in_memory_limit():
+                self.filename = tmpfile.make_in_memory('outbox', self.packetdata, extension='.out')
+            else:
+                fileno, self.filename = tmpfile.make('outbox', extension='.out')
+                os.write(fileno, self.packetdata)
+                os.close(fileno)
+            _OutboxByFilename[self.filename] = self
             if self.filesize < 1024 * 10:
                 self.timeout = 10
             elif self.filesize > 1024 * 1024:
                 self.timeout = int(self.filesize / float(settings.SendingSpeedLimit()))
             else:
                 self.timeout = 300
+            timeouts.register(('packet_out', self, ), max(0, self.time + self.timeout - time.time()), self._on_timeout)
 #             self.timeout = min(
 #                 settings.SendTimeOut() * 3,
 #                 max(int(self.filesize/(settings.SendingSpeedLimit()/len(queue()))),
@@ -707,6 +800,8 @@ class PacketOut(automat.Automat):
         for i in range(len(self.items)):
             if self.items[i].proto == proto:  # and self.items[i].host == host:
                 self.items[i].transfer_id = transfer_id
+                self.transfer_ids.add(transfer_id)
+                _OutboxByTransferID[transfer_id] = self
                 if _Debug:
                     lg.out(_DebugLevel, 'packet_out.doSetTransferID  %r:%r = %r' % (proto, host, transfer_id))
                 ok = True
@@ -887,6 +982,8 @@ class PacketOut(automat.Automat):
                 remote_id=self.outpacket.RemoteID,
             ))
         queue().remove(self)
+        unindex_packet(self)
+        timeouts.unregister(('packet_out', self, ))
         if self not in self.outpacket.Packets:
             lg.warn('packet_out not connected to the packet')
         else:
@@ -897,6 +994,8 @@ class PacketOut(automat.Automat):
             self.caching_deferred.cancel()
         self.caching_deferred = None
         self.callbacks.clear()
+        if self.filename:
+            tmpfile.release_in_memory(self.filename)
         self.destroy()
 
     def _on_remote_identity_cached(self, xmlsrc):
@@ -1083,6 +1182,14 @@ class PacketOut(automat.Automat):
         lg.warn('no supported protocols with %s : %s %s %s, byproto:%s' % (
             self.remote_idurl, tcp_contact, udp_contact, working_protos, str(byproto)))
 
+    def _on_timeout(self):
+        if self.state == 'RESPONSE?':
+            # waiting for the response is controlled by "response-timeout" timer
+            return
+        if _Debug:
+            lg.out(_DebugLevel, 'packet_out._on_timeout %r is timed out: %s' % (self, self.timeout))
+        self.automat('cancel', 'timeout')
+
     def _pop(self, packet_args):
         self.popped_item = None
         if len(packet_args) == 4:
@@ -47,7 +47,6 @@ _DebugLevel = 10
 
 #------------------------------------------------------------------------------
 
-import os
 import time
 
 from twisted.protocols import basic  # @UnresolvedImport
@@ -58,6 +57,8 @@ from logs import lg
 
 from automats import automat
 
+from system import tmpfile
+
 from lib import strng
 from lib import net_misc
 
@@ -469,13 +470,13 @@ class TCPConnection(automat.Automat, basic.Int32StringReceiver):
             # we have a queue of files to be sent
             # somehow file may be removed before we start sending it
             # so we check it here and skip not existed files
-            if not os.path.isfile(filename):
+            if not tmpfile.exists(filename):
                 self.failed_outbox_queue_item(filename, description, 'file not exist')
                 if not (keep_alive or self.force_keep_alive):
                     self.automat('shutdown')
                 continue
             try:
-                filesize = os.path.getsize(filename)
+                filesize = tmpfile.getsize(filename)
             except:
                 self.failed_outbox_queue_item(filename, description, 'can not get file size')
                 if not (keep_alive or self.force_keep_alive):
@@ -28,7 +28,6 @@
 #------------------------------------------------------------------------------
 
 from __future__ import absolute_import
-from io import open
 from io import BytesIO
 
 #------------------------------------------------------------------------------
@@ -451,7 +450,7 @@ class OutboxFile():
         self.bytes_out = 0
         self.started = time.time()
         self.timeout = max(int(self.size / settings.SendingSpeedLimit()), 6)
-        self.fout = open(self.filename, 'rb')
+        self.fout = tmpfile.open_for_reading(self.filename)
         if _Debug:
             lg.out(
                 _DebugLevel, '>>>TCP-OUT %s with %d bytes reading from %s' %
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# timeouts.py
+#
+# Copyright (C) 2008 Veselin Penev, https://bitdust.io
+#
+# This file (timeouts.py) is part of BitDust Software.
+#
+# BitDust is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BitDust Software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with BitDust Software.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Please contact us if you have any questions at bitdust.io@gmail.com
+
+"""
+..
+
+module:: timeouts
+
+Deadlines scheduler for incoming and outgoing packets.
+
+Packet state machines register a deadline here when they start and remove it
+when they are finished. All deadlines are kept in a heap ordered by time and
+only one ``reactor.callLater()`` is active at any moment - pointing to the
+nearest deadline. So only expired packets are touched when the timer fires.
+
+Removed deadlines are not searched in the heap, they are just forgotten and
+skipped later when reaching the top of the heap.
+
+Keys are tuples starting with the name of the module which registered the deadline:
+``('packet_out', ...)``, ``('io_throttle', ...)``. This way every module can drop only its own
+deadlines with ``unregister_owner()`` when it stops.
+"""
+
+#------------------------------------------------------------------------------
+
+from __future__ import absolute_import
+
+#------------------------------------------------------------------------------
+
+_Debug = False
+_DebugLevel = 12
+
+#------------------------------------------------------------------------------
+
+import time
+import heapq
+
+from twisted.internet import reactor  # @UnresolvedImport
+
+#------------------------------------------------------------------------------
+
+from logs import lg
+
+#------------------------------------------------------------------------------
+
+_Heap = []
+_Deadlines = {}
+_Sequence = 0
+_NextCall = None
+_Counters = {
+    'registered': 0,
+    'cancelled': 0,
+    'fired': 0,
+    'last_fired': 0,
+    'max_late': 0.0,
+}
+
+#------------------------------------------------------------------------------
+
+
+def init():
+    """
+    Reset the counters, deadlines can be registered at any moment.
+    """
+    if _Debug:
+        lg.out(_DebugLevel, 'timeouts.init')
+    for name in _Counters.keys():
+        _Counters[name] = 0
+    _Counters['max_late'] = 0.0
+
+
+def shutdown():
+    """
+    Forget all registered deadlines and stop the timer.
+    """
+    global _Heap
+    if _Debug:
+        lg.out(_DebugLevel, 'timeouts.shutdown with %d pending deadlines' % len(_Deadlines))
+    _Deadlines.clear()
+    _Heap = []
+    _stop_timer()
+
+#------------------------------------------------------------------------------
+
+
+def register(key, timeout, callback_method, *args):
+    """
+    Call ``callback_method(*args)`` after ``timeout`` seconds unless ``unregister(key)`` was called before.
+
+    Registering same key again will replace the previous deadline.
+    """
+    global _Sequence
+    _Sequence += 1
+    deadline = time.time() + timeout
+    _Deadlines[key] = (deadline, _Sequence, callback_method, args, )
+    heapq.heappush(_Heap, (deadline, _Sequence, key, ))
+    _Counters['registered'] += 1
+    if _Debug:
+        lg.args(_DebugLevel, key=key, timeout=timeout, pending=len(_Deadlines))
+    _compact()
+    _schedule()
+    return deadline
+
+
+def unregister(key):
+    """
+    Remove the deadline registered for given key, return False if it was not found.
+    """
+    if _Deadlines.pop(key, None) is None:
+        return False
+    _Counters['cancelled'] += 1
+    if not _Deadlines:
+        _stop_timer()
+    return True
+
+
+def unregister_owner(owner):
+    """
+    Remove all deadlines registered with keys like ``(owner, ...)``, deadlines of other modules are kept.
+    Returns number of removed deadlines.
+    """
+    keys = [key for key in _Deadlines.keys() if isinstance(key, tuple) and key and key[0] == owner]
+    for key in keys:
+        _Deadlines.pop(key)
+    _Counters['cancelled'] += len(keys)
+    if not _Deadlines:
+        _stop_timer()
+    if _Debug:
+        lg.args(_DebugLevel, owner=owner, removed=len(keys), pending=len(_Deadlines))
+    return len(keys)
+
+
+def is_registered(key):
+    return key in _Deadlines
+
+
+def pending():
+    """
+    Return number of registered deadlines which are not fired yet.
+    """
+    return len(_Deadlines)
+
+
+def counters():
+    """
+    Return current statistics of the scheduler.
+    """
+    result = dict(_Counters)
+    result['pending'] = len(_Deadlines)
+    result['heap_size'] = len(_Heap)
+    result['next_deadline'] = None
+    if _NextCall and _NextCall.active():
+        result['next_deadline'] = max(0.0, _NextCall.getTime() - reactor.seconds())  # @UndefinedVariable
+    return result
+
+#------------------------------------------------------------------------------
+
+
+def _stop_timer():
+    global _NextCall
+    if _NextCall and _NextCall.active():
+        _NextCall.cancel()
+    _NextCall = None
+
+
+def _schedule():
+    global _NextCall
+    while _Heap:
+        deadline, seq, key = _Heap[0]
+        item = _Deadlines.get(key)
+        if item is None or item[1] != seq:
+            # this deadline was removed or replaced, skip it
+            heapq.heappop(_Heap)
+            continue
+        delay = max(0.0, deadline - time.time())
+        if _NextCall and _NextCall.active():
+            if abs(_NextCall.getTime() - reactor.seconds() - delay) < 0.001:  # @UndefinedVariable
+                return
+            _NextCall.reset(delay)
+        else:
+            _NextCall = reactor.callLater(delay, _on_timer)  # @UndefinedVariable
+        return
+    _stop_timer()
+
+
+def _compact():
+    global _Heap
+    # removed deadlines are still in the heap, do not let it grow too much
+    if len(_Heap) > 2 * len(_Deadlines) + 64:
+        _Heap = [(d[0], d[1], key, ) for key, d in _Deadlines.items()]
+        heapq.heapify(_Heap)
+
+
+def _on_timer():
+    global _NextCall
+    _NextCall = None
+    now = time.time()
+    expired = []
+    while _Heap and _Heap[0][0] <= now:
+        deadline, seq, key = heapq.heappop(_Heap)
+        item = _Deadlines.get(key)
+        if item is None or item[1] != seq:
+            continue
+        _Deadlines.pop(key)
+        expired.append((key, deadline, item[2], item[3], ))
+    _Counters['last_fired'] = len(expired)
+    _Counters['fired'] += len(expired)
+    for key, deadline, callback_method, args in expired:
+        _Counters['max_late'] = max(_Counters['max_late'], now - deadline)
+        if _Debug:
+            lg.out(_DebugLevel, 'timeouts._on_timer %r is timed out, %0.3f seconds late' % (key, now - deadline))
+        try:
+            callback_method(*args)
+        except:
+            lg.exc()
+    _schedule()
@@ -27,7 +27,6 @@
 #------------------------------------------------------------------------------
 
 from __future__ import absolute_import
-from io import open
 from io import StringIO
 
 #------------------------------------------------------------------------------
@@ -151,11 +150,11 @@ class FileQueue:
             # we have a queue of files to be sent
             # somehow file may be removed before we start sending it
             # so I check it here and skip not existed files
-            if not os.path.isfile(filename):
+            if not tmpfile.exists(filename):
                 self.on_failed_outbox_queue_item(filename, description, 'file not exist', result_defer, keep_alive)
                 continue
             try:
-                filesize = os.path.getsize(filename)
+                filesize = tmpfile.getsize(filename)
             except:
                 self.on_failed_outbox_queue_item(filename, description, 'can not get file size', result_defer, keep_alive)
                 continue
@@ -560,7 +559,7 @@ class OutboxFile():
         self.status = None
         self.error_message = ''
         self.started = time.time()
-        self.fileobj = open(self.filename, 'rb')
+        self.fileobj = tmpfile.open_for_reading(self.filename)
         if _Debug:
             lg.out(18, 'udp_file_queue.OutboxFile.__init__ {%s} [%d] to %s with %d bytes' % (
                 os.path.basename(self.filename), self.stream_id, str(self.queue.session.peer_address), self.size))
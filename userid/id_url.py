@@ -56,6 +56,7 @@ _DebugLevel = 12
 import os
 import sys
 import tempfile
+import weakref
 
 #------------------------------------------------------------------------------
 
@@ -66,38 +67,61 @@ from system import local_fs
 
 from lib import strng
 from lib import nameurl
+from lib import jsn
+
+from crypt import hashes
 
 from main import settings
 
 #------------------------------------------------------------------------------
 
 _IdentityHistoryDir = None
+_IdentityHistoryIndexFile = None
+_IdentityHistoryIndexVersion = 1
+# index file is written with a small delay after changes, so many updates are saved at once
+_IdentityHistoryIndexSaveDelay = 10
+_SaveTask = None
 # TODO: if this dictionary grow too much use CodernityDB instead of in-memory storage
 _KnownUsers = {}
 _KnownIDURLs = {}
 _MergedIDURLs = {}
+_HistoryIndex = {}
+_UnverifiedUsers = set()
 _Ready = False
+# all ID_URL_FIELD objects created via field() are interned here, key is original IDURL
+_Fields = weakref.WeakValueDictionary()
+# increased every time when known IDURL is assigned to another public key, cached public keys are dropped then
+_FieldsGeneration = 0
 
 #------------------------------------------------------------------------------
 
 def init():
     """
+    Loads all known identities from the local identity history.
+    Items which are present in the index file and were not modified since are not parsed,
+    those users are verified later when their IDURL is used first time.
     """
     global _IdentityHistoryDir
-    global _KnownUsers
-    global _KnownIDURLs
-    global _MergedIDURLs
+    global _IdentityHistoryIndexFile
+    global _HistoryIndex
+    global _UnverifiedUsers
     global _Ready
-    from userid import identity
     if _Debug:
         lg.out(_DebugLevel, "id_url.init")
     if not _IdentityHistoryDir:
         _IdentityHistoryDir = settings.IdentityHistoryDir()
+    if not _IdentityHistoryIndexFile:
+        _IdentityHistoryIndexFile = settings.IdentityHistoryIndexFilename()
     if not os.path.exists(_IdentityHistoryDir):
         bpio._dir_make(_IdentityHistoryDir)
         lg.info('created new folder %r' % _IdentityHistoryDir)
     else:
         lg.info('using existing folder %r' % _IdentityHistoryDir)
+    known_index = load_history_index()
+    _HistoryIndex = {}
+    _UnverifiedUsers = set()
+    modified = False
+    parsed = 0
     for one_user_dir in os.listdir(_IdentityHistoryDir):
         one_user_dir_path = os.path.join(_IdentityHistoryDir, one_user_dir)
         one_user_identity_files = []
@@ -110,49 +134,34 @@ def init():
             one_user_identity_files.append(one_ident_number)
         if _Debug:
             lg.out(_DebugLevel, 'id_url.init   found %d historical records in %r' % (len(one_user_identity_files), one_user_dir_path, ))
+        known_user_items = known_index.get(one_user_dir, {})
+        user_items = {}
         for one_ident_file in one_user_identity_files:
             one_ident_path = os.path.join(one_user_dir_path, strng.to_text(one_ident_file))
+            known_item = known_user_items.get(one_ident_file)
+            if known_item and _is_history_item_actual(known_item, one_ident_path):
+                user_items[one_ident_file] = known_item
+                _UnverifiedUsers.add(known_item['pub_key'])
+                continue
+            modified = True
+            parsed += 1
             try:
-                xmlsrc = local_fs.ReadTextFile(one_ident_path)
-                known_id_obj = identity.identity(xmlsrc=xmlsrc)
-                if not known_id_obj.isCorrect():
-                    raise Exception('identity history in %r is broken, identity is not correct: %r' % (
-                        one_user_dir, one_ident_path))
-                if not known_id_obj.Valid():
-                    raise Exception('identity history in %r is broken, identity is not valid: %r' % (
-                        one_user_dir, one_ident_path))
+                user_items[one_ident_file] = _read_history_item(one_user_dir, one_ident_path)
             except:
                 lg.exc()
                 continue
-            one_pub_key = known_id_obj.getPublicKey()
-            one_revision = known_id_obj.getRevisionValue()
-            if one_pub_key not in _KnownUsers:
-                _KnownUsers[one_pub_key] = one_user_dir_path
-            known_sources = known_id_obj.getSources(as_originals=True)
-            for known_idurl in reversed(known_sources):
-                if known_idurl not in _KnownIDURLs:
-                    _KnownIDURLs[known_idurl] = known_id_obj.getPublicKey()
-                    if _Debug:
-                        lg.out(_DebugLevel, '    new IDURL added: %r' % known_idurl)
-                else:
-                    if _KnownIDURLs[known_idurl] != known_id_obj.getPublicKey():
-                        _KnownIDURLs[known_idurl] = known_id_obj.getPublicKey()
-                        lg.warn('another user had same identity source: %r' % known_idurl)
-                if one_pub_key not in _MergedIDURLs:
-                    _MergedIDURLs[one_pub_key] = {}
-                    if _Debug:
-                        lg.out(_DebugLevel, '    new Public Key added: %s...' % one_pub_key[-10:])
-                if one_revision in _MergedIDURLs[one_pub_key]:
-                    if _MergedIDURLs[one_pub_key][one_revision] != known_idurl:
-                        if _MergedIDURLs[one_pub_key][one_revision] not in known_sources:
-                            lg.warn('rewriting existing identity revision %d : %r -> %r' % (
-                                one_revision, _MergedIDURLs[one_pub_key][one_revision], known_idurl))
-                    _MergedIDURLs[one_pub_key][one_revision] = known_idurl
-                else:
-                    _MergedIDURLs[one_pub_key][one_revision] = known_idurl
-                    if _Debug:
-                        lg.out(_DebugLevel, '        revision %d merged with other %d known items' % (
-                            one_revision, len(_MergedIDURLs[one_pub_key])))
+        if set(user_items.keys()) != set(known_user_items.keys()):
+            modified = True
+        if not user_items:
+            continue
+        _HistoryIndex[one_user_dir] = user_items
+    if set(_HistoryIndex.keys()) != set(known_index.keys()):
+        modified = True
+    _rebuild_known()
+    if modified:
+        save_history_index()
+    if _Debug:
+        lg.args(_DebugLevel, users=len(_HistoryIndex), parsed=parsed, unverified=len(_UnverifiedUsers), modified=modified)
     _Ready = True
 
 
@@ -160,18 +169,245 @@ def shutdown():
     """
     """
     global _IdentityHistoryDir
+    global _IdentityHistoryIndexFile
     global _KnownIDURLs
     global _KnownUsers
     global _Ready
     global _MergedIDURLs
+    global _HistoryIndex
+    global _UnverifiedUsers
+    global _Fields
+    global _FieldsGeneration
+    if _SaveTask:
+        save_history_index()
     _IdentityHistoryDir = None
+    _IdentityHistoryIndexFile = None
+    _Fields = weakref.WeakValueDictionary()
+    _FieldsGeneration += 1
     _KnownUsers = {}
     _KnownIDURLs = {}
     _MergedIDURLs = {}
+    _HistoryIndex = {}
+    _UnverifiedUsers = set()
     _Ready = False
 
 #------------------------------------------------------------------------------
 
+def load_history_index():
+    """
+    Reads identity history index from the file and returns a dictionary like that:
+
+        {user_dir: {file_number: {'size': , 'mtime': , 'pub_key': , 'revision': , 'sources': [], }, }, }
+
+    Returns empty dictionary if index file not exist or its content is not matching the checksum,
+    in that case whole index will be rebuilt from the identity history files.
+    """
+    if not _IdentityHistoryIndexFile or not os.path.isfile(_IdentityHistoryIndexFile):
+        return {}
+    try:
+        json_index = jsn.loads_text(local_fs.ReadTextFile(_IdentityHistoryIndexFile))
+        if json_index.get('version') != _IdentityHistoryIndexVersion:
+            raise Exception('unknown version %r' % json_index.get('version'))
+        json_items = json_index['items']
+        if _history_index_checksum(json_items) != json_index['checksum']:
+            raise Exception('checksum not matching')
+        result = {}
+        for user_dir, user_items in json_items.items():
+            result[user_dir] = {}
+            for file_number, item in user_items.items():
+                result[user_dir][int(file_number)] = {
+                    'size': int(item['size']),
+                    'mtime': float(item['mtime']),
+                    'pub_key': strng.to_bin(item['pub_key']),
+                    'revision': int(item['revision']),
+                    'sources': [strng.to_bin(idurl) for idurl in item['sources']],
+                }
+    except:
+        lg.exc()
+        lg.warn('identity history index %r is broken and will be rebuilt' % _IdentityHistoryIndexFile)
+        return {}
+    return result
+
+
+def save_history_index():
+    """
+    Writes current identity history index to the file, together with the checksum of its content.
+    """
+    global _SaveTask
+    if _SaveTask and _SaveTask.active():
+        _SaveTask.cancel()
+    _SaveTask = None
+    if not _IdentityHistoryIndexFile:
+        return False
+    json_items = {}
+    for user_dir, user_items in _HistoryIndex.items():
+        json_items[user_dir] = {}
+        for file_number, item in user_items.items():
+            json_items[user_dir][strng.to_text(file_number)] = {
+                'size': item['size'],
+                'mtime': item['mtime'],
+                'pub_key': strng.to_text(item['pub_key']),
+                'revision': item['revision'],
+                'sources': [strng.to_text(idurl) for idurl in item['sources']],
+            }
+    index_dir = os.path.dirname(_IdentityHistoryIndexFile)
+    if not os.path.isdir(index_dir):
+        bpio._dirs_make(index_dir)
+    return local_fs.WriteTextFile(_IdentityHistoryIndexFile, jsn.dumps({
+        'version': _IdentityHistoryIndexVersion,
+        'checksum': _history_index_checksum(json_items),
+        'items': json_items,
+    }))
+
+
+def _schedule_save_history_index():
+    global _SaveTask
+    if not _IdentityHistoryIndexFile:
+        return
+    if _SaveTask is None or not _SaveTask.active():
+        from twisted.internet import reactor  # @UnresolvedImport
+        _SaveTask = reactor.callLater(_IdentityHistoryIndexSaveDelay, save_history_index)  # @UndefinedVariable
+
+
+def _history_index_checksum(json_items):
+    return strng.to_text(hashes.sha256(strng.to_bin(jsn.dumps(json_items, sort_keys=True, separators=(',', ':'))), hexdigest=True))
+
+
+def _is_history_item_actual(item, identity_file_path):
+    try:
+        st = os.stat(identity_file_path)
+    except:
+        return False
+    return item['size'] == st.st_size and item['mtime'] == st.st_mtime
+
+
+def _read_history_item(user_dir, identity_file_path):
+    """
+    Reads and fully verifies one identity file from the history and returns index item for it.
+    """
+    from userid import identity
+    xmlsrc = local_fs.ReadTextFile(identity_file_path)
+    known_id_obj = identity.identity(xmlsrc=xmlsrc)
+    if not known_id_obj.isCorrect():
+        raise Exception('identity history in %r is broken, identity is not correct: %r' % (
+            user_dir, identity_file_path))
+    if not known_id_obj.Valid():
+        raise Exception('identity history in %r is broken, identity is not valid: %r' % (
+            user_dir, identity_file_path))
+    return _make_history_item(known_id_obj, identity_file_path)
+
+
+def _make_history_item(id_obj, identity_file_path):
+    st = os.stat(identity_file_path)
+    return {
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'pub_key': id_obj.getPublicKey(),
+        'revision': id_obj.getRevisionValue(),
+        'sources': id_obj.getSources(as_originals=True),
+    }
+
+
+def _update_history_item(new_id_obj, identity_file_path):
+    user_dir = os.path.basename(os.path.dirname(identity_file_path))
+    if user_dir not in _HistoryIndex:
+        _HistoryIndex[user_dir] = {}
+    _HistoryIndex[user_dir][int(os.path.basename(identity_file_path))] = _make_history_item(new_id_obj, identity_file_path)
+    _schedule_save_history_index()
+
+
+def _merge_history_item(user_dir_path, one_pub_key, one_revision, known_sources):
+    if one_pub_key not in _KnownUsers:
+        _KnownUsers[one_pub_key] = user_dir_path
+    for known_idurl in reversed(known_sources):
+        if known_idurl not in _KnownIDURLs:
+            _KnownIDURLs[known_idurl] = one_pub_key
+            if _Debug:
+                lg.out(_DebugLevel, '    new IDURL added: %r' % known_idurl)
+        else:
+            if _KnownIDURLs[known_idurl] != one_pub_key:
+                _KnownIDURLs[known_idurl] = one_pub_key
+                lg.warn('another user had same identity source: %r' % known_idurl)
+        if one_pub_key not in _MergedIDURLs:
+            _MergedIDURLs[one_pub_key] = {}
+            if _Debug:
+                lg.out(_DebugLevel, '    new Public Key added: %s...' % one_pub_key[-10:])
+        if one_revision in _MergedIDURLs[one_pub_key]:
+            if _MergedIDURLs[one_pub_key][one_revision] != known_idurl:
+                if _MergedIDURLs[one_pub_key][one_revision] not in known_sources:
+                    lg.warn('rewriting existing identity revision %d : %r -> %r' % (
+                        one_revision, _MergedIDURLs[one_pub_key][one_revision], known_idurl))
+            _MergedIDURLs[one_pub_key][one_revision] = known_idurl
+        else:
+            _MergedIDURLs[one_pub_key][one_revision] = known_idurl
+            if _Debug:
+                lg.out(_DebugLevel, '        revision %d merged with other %d known items' % (
+                    one_revision, len(_MergedIDURLs[one_pub_key])))
+
+
+def _rebuild_known():
+    """
+    Fills in-memory dictionaries of all known users and IDURLs from the identity history index.
+    """
+    global _KnownUsers
+    global _KnownIDURLs
+    global _MergedIDURLs
+    global _FieldsGeneration
+    _KnownUsers = {}
+    _KnownIDURLs = {}
+    _MergedIDURLs = {}
+    for user_dir in sorted(_HistoryIndex.keys()):
+        user_dir_path = os.path.join(_IdentityHistoryDir, user_dir)
+        user_items = _HistoryIndex[user_dir]
+        for file_number in sorted(user_items.keys()):
+            item = user_items[file_number]
+            _merge_history_item(user_dir_path, item['pub_key'], item['revision'], item['sources'])
+    _FieldsGeneration += 1
+    _refresh_fields()
+
+
+def _refresh_fields(pub_key=None):
+    """
+    Updates latest known IDURL of interned fields which belong to given user, or all of them.
+    """
+    for f in list(_Fields.values()):
+        if pub_key is None or _KnownIDURLs.get(f.current) == pub_key:
+            f.refresh(replace_original=False)
+
+
+def _verify_user(pub_key):
+    """
+    Identity history files of that user were loaded from the index and were not verified yet.
+    Now all of them are parsed and checked, broken items are removed from the index.
+    """
+    _UnverifiedUsers.discard(pub_key)
+    user_dir = os.path.basename(_KnownUsers.get(pub_key, ''))
+    user_items = _HistoryIndex.get(user_dir, {})
+    broken = []
+    for file_number, item in user_items.items():
+        identity_file_path = os.path.join(_IdentityHistoryDir, user_dir, strng.to_text(file_number))
+        try:
+            verified_item = _read_history_item(user_dir, identity_file_path)
+            if verified_item != item:
+                raise Exception('identity history in %r is broken, file %r is not matching with the index' % (
+                    user_dir, identity_file_path))
+        except:
+            lg.exc()
+            broken.append(file_number)
+    if _Debug:
+        lg.args(_DebugLevel, user_dir=user_dir, verified=len(user_items), broken=len(broken))
+    if not broken:
+        return True
+    for file_number in broken:
+        user_items.pop(file_number)
+    if not user_items:
+        _HistoryIndex.pop(user_dir, None)
+    _rebuild_known()
+    _schedule_save_history_index()
+    return False
+
+#------------------------------------------------------------------------------
+
 def identity_cached(new_id_obj):
     """
     After receiving identity file of another user we need to check his identity sources.
@@ -188,6 +424,7 @@ def identity_cached(new_id_obj):
     global _KnownUsers
     global _KnownIDURLs
     global _MergedIDURLs
+    global _FieldsGeneration
     from userid import identity
     pub_key = new_id_obj.getPublicKey()
     user_name = new_id_obj.getIDName()
@@ -201,10 +438,13 @@ def identity_cached(new_id_obj):
         _KnownUsers[pub_key] = user_path
         first_identity_file_path = os.path.join(user_path, '0')
         local_fs.WriteBinaryFile(first_identity_file_path, new_id_obj.serialize())
+        _update_history_item(new_id_obj, first_identity_file_path)
         if _Debug:
             lg.out(_DebugLevel, 'id_url.identity_cached wrote first item for user %r in identity history: %r' % (
                 user_name, first_identity_file_path))
     else:
+        # all history files of that user are verified below anyway
+        _UnverifiedUsers.discard(pub_key)
         user_path = _KnownUsers[pub_key]
         user_identity_files = sorted(map(int, os.listdir(user_path)))
         if len(user_identity_files) == 0:
@@ -246,6 +486,7 @@ def identity_cached(new_id_obj):
             new_sources = new_id_obj.getSources(as_originals=True)
             if latest_sources == new_sources:
                 local_fs.WriteBinaryFile(latest_identity_file_path, new_id_obj.serialize())
+                _update_history_item(new_id_obj, latest_identity_file_path)
                 if _Debug:
                     lg.out(_DebugLevel, 'id_url.identity_cached latest identity sources for user %r did not changed, updated file %r' % (
                         user_name, latest_identity_file_path))
@@ -253,21 +494,27 @@ def identity_cached(new_id_obj):
                 next_identity_file = user_identity_files[-1] + 1
                 next_identity_file_path = os.path.join(user_path, strng.to_text(next_identity_file))
                 local_fs.WriteBinaryFile(next_identity_file_path, new_id_obj.serialize())
+                _update_history_item(new_id_obj, next_identity_file_path)
                 is_identity_rotated = True
                 if _Debug:
                     lg.out(_DebugLevel, 'id_url.identity_cached identity sources for user %r changed, wrote new item in the history: %r' % (
                         user_name, next_identity_file_path))
     new_revision = new_id_obj.getRevisionValue()
     new_sources = new_id_obj.getSources(as_originals=True)
+    merged_before = dict(_MergedIDURLs.get(pub_key, {}))
+    known_changed = False
     for new_idurl in reversed(new_sources):
         if new_idurl not in _KnownIDURLs:
             _KnownIDURLs[new_idurl] = new_id_obj.getPublicKey()
+            known_changed = True
             if _Debug:
                 lg.out(_DebugLevel, 'id_url.identity_cached new IDURL added: %r' % new_idurl)
         else:
             if _KnownIDURLs[new_idurl] != new_id_obj.getPublicKey():
                 lg.warn('another user had same identity source: %r' % new_idurl)
                 _KnownIDURLs[new_idurl] = new_id_obj.getPublicKey()
+                _FieldsGeneration += 1
+                known_changed = True
         if pub_key not in _MergedIDURLs:
             _MergedIDURLs[pub_key] = {}
             if _Debug:
@@ -285,6 +532,8 @@ def identity_cached(new_id_obj):
             if _Debug:
                 lg.out(_DebugLevel, 'id_url.identity_cached added new revision %d for user %r, total revisions %d: %r -> %r' % (
                     new_revision, user_name, len(_MergedIDURLs[pub_key]), prev_idurl, new_idurl))
+    if known_changed or merged_before != _MergedIDURLs[pub_key]:
+        _refresh_fields(pub_key)
     if _Debug:
         lg.args(_DebugLevel, is_identity_rotated=is_identity_rotated, latest_id_obj=bool(latest_id_obj))
     if is_identity_rotated and latest_id_obj is not None:
@@ -338,6 +587,7 @@ def field(idurl):
     """
     Translates string into `ID_URL_FIELD` object.
     Also we try to read from local identity cache folder if do not know given "idurl".
+    Objects are interned: same IDURL always gives same `ID_URL_FIELD` object while it is in use.
     """
     global _KnownIDURLs
     if isinstance(idurl, ID_URL_FIELD):
@@ -345,7 +595,11 @@ def field(idurl):
     if idurl in [None, 'None', '', b'None', b'', False, ]:
         return ID_URL_FIELD(idurl)
     idurl = strng.to_bin(idurl.strip())
-    if idurl not in _KnownIDURLs:
+    if idurl in _KnownIDURLs:
+        f = _Fields.get(idurl)
+        if f is not None:
+            return f
+    else:
         if _Debug:
             lg.out(_DebugLevel, 'id_url.field   will try to find %r in local identity cache' % idurl)
         from contacts import identitydb
@@ -358,7 +612,11 @@ def field(idurl):
                 modul = os.path.basename(cod.co_filename).replace('.py', '')
                 caller = cod.co_name
                 lg.warn('unknown yet idurl %s, call from %s.%s' % (idurl, modul, caller, ))
-    return ID_URL_FIELD(idurl)
+    f = _Fields.get(idurl)
+    if f is None:
+        f = ID_URL_FIELD(idurl)
+        _Fields[idurl] = f
+    return f
 
 
 def fields_list(idurl_list):
@@ -547,6 +805,11 @@ def get_latest_revision(idurl):
     if idurl_bin not in _KnownIDURLs:
         return latest_idurl, latest_rev
     pub_key = _KnownIDURLs[idurl_bin]
+    if pub_key in _UnverifiedUsers:
+        if not _verify_user(pub_key):
+            if idurl_bin not in _KnownIDURLs:
+                return latest_idurl, latest_rev
+            pub_key = _KnownIDURLs[idurl_bin]
     if pub_key not in _MergedIDURLs:
         lg.warn('idurl %r does not have any known revisions' % idurl_bin)
         return latest_idurl, latest_rev
@@ -576,8 +839,17 @@ def idurl_to_id(idurl_text):
 #------------------------------------------------------------------------------
 
 class ID_URL_FIELD(object):
-    
+
+    __slots__ = (
+        'current', 'current_as_string', 'current_id',
+        'latest', 'latest_as_string', 'latest_id', 'latest_revision',
+        '_pub_key', '_hash', '_generation', '__weakref__',
+    )
+
     def __init__(self, idurl):
+        self._pub_key = None
+        self._hash = None
+        self._generation = -1
         self.current = b''
         self.current_as_string = ''
         self.current_id = ''
@@ -703,8 +975,9 @@ class ID_URL_FIELD(object):
         # if idurl1 and idurl2 are different sources of same identity they both must be matching
         # so it must never happen like that: (idurl1 in some_dictionary) and (idurl2 in some_dictionary)
         # same check you can do in a different way: `id_url.is_in(idurl, some_dictionary)`
-        pub_key = self.to_public_key()
-        hsh = pub_key.__hash__()
+        if self._generation == _FieldsGeneration:
+            return self._hash
+        hsh = self.to_public_key().__hash__()
         if _Debug:
             lg.args(_DebugLevel * 2, current=self.current, latest=self.latest, hash=hsh)
         return hsh
@@ -736,7 +1009,7 @@ class ID_URL_FIELD(object):
 
     def refresh(self, replace_original=True):
         _latest, _latest_revision = get_latest_revision(self.current)
-        if self.latest and self.latest == _latest:
+        if self.latest and self.latest == _latest and (not replace_original or self.current == self.latest):
             if _Debug:
                 lg.args(_DebugLevel, latest=self.latest_as_string, refreshed=False)
             return False
@@ -748,6 +1021,10 @@ class ID_URL_FIELD(object):
         self.latest_as_string = strng.to_text(self.latest)
         self.latest_id = idurl_to_id(self.latest)
         if replace_original:
+            if self.current != self.latest and _Fields.get(self.current) is self:
+                # object is shared, but now it points to another original IDURL
+                del _Fields[self.current]
+            self._generation = -1
             self.current = self.latest
             self.current_as_string = self.latest_as_string
             self.current_id = self.latest_id
@@ -799,6 +1076,8 @@ class ID_URL_FIELD(object):
         global _KnownIDURLs
         if _Debug:
             lg.args(_DebugLevel * 2, latest=self.latest, current=self.current)
+        if self._generation == _FieldsGeneration:
+            return self._pub_key
         if not self.current:
             return b''
         if self.current not in _KnownIDURLs:
@@ -813,4 +1092,7 @@ class ID_URL_FIELD(object):
             lg.exc(msg='called from %s.%s()' % (caller_modul, caller_method), exc_value=exc)
             raise exc
         pub_key = _KnownIDURLs[self.current]
+        self._pub_key = pub_key
+        self._hash = pub_key.__hash__()
+        self._generation = _FieldsGeneration
         return pub_key
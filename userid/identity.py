@@ -143,8 +143,9 @@ _DebugLevel = 10
 import os
 import sys
 
-from xml.dom import minidom, Node
+from xml.dom import Node
 from xml.dom.minidom import getDOMImplementation
+from xml.parsers import expat
 
 #------------------------------------------------------------------------------
 
@@ -345,15 +346,17 @@ class identity(object):
         Don't include certificate - so identity server can just add it.
         """
         sep = b'-'
-        hsh = b''
-        hsh += sep + sep.join(map(lambda s: s.original(), self.sources))
-        hsh += sep + sep.join(self.contacts)
-        # hsh += sep + sep.join(self.certificates)
-        hsh += sep + sep.join(self.scrubbers)
-        hsh += sep + self.postage
-        hsh += sep + self.date.replace(b' ', b'_')
-        hsh += sep + self.version
-        hsh += sep + self.revision
+        hsh = sep.join((
+            b'',
+            sep.join([s.original() for s in self.sources]),
+            sep.join(self.contacts),
+            # sep.join(self.certificates),
+            sep.join(self.scrubbers),
+            self.postage,
+            self.date.replace(b' ', b'_'),
+            self.version,
+            self.revision,
+        ))
         # lg.out(12, "identity.makehash: %r" % hsh)
         hashcode = key.Hash(hsh)
         return hashcode
@@ -412,14 +415,15 @@ class identity(object):
     def unserialize(self, xmlsrc):
         """
         A smart method to load object fields data from XML content.
+        XML is parsed directly with expat, DOM tree is not created.
         """
         try:
-            doc = minidom.parseString(strng.to_bin(xmlsrc))
+            fields = read_xml_fields(xmlsrc)
         except:
             lg.exc("xmlsrc=%r" % xmlsrc)
             return
         self.clear_data()
-        self.from_xmlobj(doc.documentElement)
+        self.from_xmlfields(fields)
 
     def unserialize_object(self, xmlobject):
         """
@@ -449,10 +453,11 @@ class identity(object):
         A method to generate XML content for that identity object.
 
         Used to save identity on disk or transfer over network.
+        Output is exactly the same as ``toxml()`` gives, but DOM tree is not created.
         """
         if as_text:
-            return strng.to_text(self.toxml()[0].strip())
-        return self.toxml()[0].strip()
+            return strng.to_text(write_xml_fields(self).strip())
+        return write_xml_fields(self).strip()
 
     def serialize_object(self):
         """
@@ -546,6 +551,27 @@ class identity(object):
         xmlsrc = doc.toprettyxml(indent="  ", newl="\n", encoding="utf-8")
         return xmlsrc, root, doc
 
+    def from_xmlfields(self, fields):
+        """
+        This is to load identity fields from the result of ``read_xml_fields()`` - used during ``unserialize`` procedure.
+        """
+        try:
+            for source in fields.get('sources', []):
+                self.sources.append(id_url.ID_URL_FIELD(source))
+            self.contacts.extend(fields.get('contacts', []))
+            self.certificates.extend(fields.get('certificates', []))
+            self.scrubbers.extend(fields.get('scrubbers', []))
+            self.postage = fields.get('postage', self.postage)
+            self.date = fields.get('date', self.date)
+            self.version = fields.get('version', self.version)
+            self.revision = fields.get('revision', self.revision)
+            self.publickey = fields.get('publickey', self.publickey)
+            self.signature = fields.get('signature', self.signature)
+        except:
+            lg.exc()
+            return False
+        return True
+
     def from_xmlobj(self, root_node):
         """
         This is to load identity fields from DOM object - used during ``unserialize`` procedure.
@@ -847,7 +873,8 @@ class identity(object):
         """
         self.sources = []
         for source in sources_list:
-            self.sources.append(id_url.field(source))
+            # identity keeps own copies, interned fields returned by id_url.field() are shared
+            self.sources.append(id_url.ID_URL_FIELD(id_url.field(source)))
 
     def setContacts(self, contacts_list):
         """
@@ -999,6 +1026,96 @@ class identity(object):
         del self.contacts[i]
         self.contacts.insert(0, contact)
 
+#------------------------------------------------------------------------------
+
+_XMLListFields = {
+    'sources': 'source',
+    'contacts': 'contact',
+    'certificates': 'certificate',
+    'scrubbers': 'scrubber',
+}
+_XMLValueFields = ('postage', 'date', 'version', 'revision', 'publickey', 'signature', )
+
+
+class _XMLFieldsReader(object):
+    """
+    Collects identity fields from expat events.
+    For every element only the first continuous text block is taken, same as ``identity.from_xmlobj()`` does.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.section = None
+        # for every opened element: [text chunks, text block finished]
+        self.stack = []
+
+    def start_element(self, name, attrs):
+        if self.stack and self.stack[-1][0]:
+            self.stack[-1][1] = True
+        if len(self.stack) == 1:
+            self.section = name
+        self.stack.append([[], False, ])
+
+    def end_element(self, name):
+        chunks = self.stack.pop()[0]
+        if not chunks:
+            return
+        if len(self.stack) == 1:
+            if self.section in _XMLValueFields:
+                self.fields[self.section] = strng.to_bin(''.join(chunks).strip())
+        elif len(self.stack) == 2:
+            if self.section == 'sources':
+                self.fields.setdefault('sources', []).append(''.join(chunks).strip())
+            elif self.section in _XMLListFields:
+                self.fields.setdefault(self.section, []).append(strng.to_bin(''.join(chunks).strip()))
+
+    def character_data(self, data):
+        if not self.stack[-1][1]:
+            self.stack[-1][0].append(data)
+
+
+def read_xml_fields(xmlsrc):
+    """
+    Parse identity XML content and return a dictionary with fields values.
+    """
+    reader = _XMLFieldsReader()
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = reader.start_element
+    parser.EndElementHandler = reader.end_element
+    parser.CharacterDataHandler = reader.character_data
+    parser.Parse(strng.to_bin(xmlsrc), True)
+    return reader.fields
+
+
+def _xml_text(value):
+    return strng.to_text(value).replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
+
+def write_xml_fields(ident):
+    """
+    Generate XML content for given identity object, result is the same as ``identity.toxml()`` makes with minidom.
+    """
+    out = ['<?xml version="1.0" encoding="utf-8"?>\n<identity>\n', ]
+    for section, items in (
+        ('sources', [s.original() for s in ident.sources]),
+        ('contacts', ident.contacts),
+        ('certificates', ident.certificates),
+        ('scrubbers', ident.scrubbers),
+    ):
+        if not items:
+            out.append('  <%s/>\n' % section)
+            continue
+        out.append('  <%s>\n' % section)
+        item_tag = _XMLListFields[section]
+        for item in items:
+            out.append('    <%s>%s</%s>\n' % (item_tag, _xml_text(item), item_tag))
+        out.append('  </%s>\n' % section)
+    for section in _XMLValueFields:
+        out.append('  <%s>%s</%s>\n' % (section, _xml_text(getattr(ident, section)), section))
+    out.append('</identity>\n')
+    return ''.join(out).encode('utf-8')
+
 
 #-------------------------------------------------------------------------------
 